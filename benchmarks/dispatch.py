@@ -0,0 +1,225 @@
+"""
+Measures instructions per second, peak memory and frame allocations of the interpreter's execution loop.
+
+Usage:
+    python benchmarks/dispatch.py [--workload NAME] [--engine NAME] [--iterations N] [--repeat R] [--against REV] [--hooks] [--metrics]
+
+Workloads:
+    loop    a 35 loop with a mix of arithmetic commands, N iterations
+    cells   straight-line code which creates N cells with 41 and updates each of them
+
+With --against, the `src` directory of the given git revision is extracted into a
+temporary directory and measured with the same workload (always with the reference
+interpreter), so the old and the new execution paths can be compared side by side.
+
+Frames are the execution frames created during a run: a loop which allocates a frame per
+iteration shows N of them, a loop which reuses its frame shows a constant number.
+
+Hooks (see src/hooks.py) cost nothing while a run has none: the default loop is the same.
+Compare it with a revision before the hooks with --against, and measure the instrumented loop with
+--hooks, which registers a callback of every kind doing nothing (the interpreter engine only).
+
+--metrics runs the workload with counters of the run (see src/metrics.py), which go through
+the counted loop of the engine: compare it with a run without them to see what the counting costs.
+"""
+
+import argparse, contextlib, importlib, io, json, os, subprocess, sys, tarfile, tempfile, time, tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# engine name -> (module, class)
+ENGINES = {
+    "interpreter":  ("interpreter", "Interpreter"),
+    "compiled":     ("compiler", "CompiledInterpreter"),
+}
+
+# the loop body of the workload, a line with 42 is executed only on the last iteration
+BODY = """
+09 -1
+26 -5 -1
+39 -5 -2
+05 -3 -5
+40 -5 -2
+24 -6 1
+30 -5 -1
+13 -1 -2
+42
+"""
+
+SETUP = """
+41 -1 0
+41 -2 0
+41 -3 0
+41 -4 1
+41 -5 0
+41 -6 0
+04 -2 {iterations}
+04 -4 "body"
+35 -4
+"""
+
+
+def make_loop_workload(iterations: int) -> tuple[str, int]:
+
+    """
+    Returns the source of the loop workload and the number of instructions it executes
+    """
+
+    source = f"#1 main\n{SETUP.format(iterations = iterations)}#0\n\n#1 body\n{BODY}#0\n"
+
+    setup_count = len([line for line in SETUP.splitlines() if line])
+    body_count  = len([line for line in BODY.splitlines() if line]) - 1
+
+    return source, setup_count + body_count * iterations + 1
+
+
+def make_cells_workload(count: int) -> tuple[str, int]:
+
+    """
+    Returns the source of the cells workload and the number of instructions it executes
+    """
+
+    lines = [f"41 -{i} 0" for i in range(1, count + 1)]
+    lines += [f"04 -{i} {i}" for i in range(1, count + 1)]
+    lines += [f"05 -{i} -{i - 1}" for i in range(2, count + 1)]
+    lines += [f"09 -{i}" for i in range(1, count + 1)]
+
+    return "#1 main\n" + "\n".join(lines) + "\n#0\n", len(lines)
+
+
+WORKLOADS = {
+    "loop":     make_loop_workload,
+    "cells":    make_cells_workload,
+}
+
+
+def measure(src: str, engine: str, workload: str, iterations: int, repeat: int, is_hooked: bool = False, is_counted: bool = False) -> dict:
+
+    """
+    Runs the workload with the engine from `src` and returns the best time and the peak memory,
+    with callbacks doing nothing for every hook if `is_hooked` is true and with metrics if `is_counted` is true
+    """
+
+    sys.path.insert(0, src)
+    module, name = ENGINES[engine]
+    Interpreter = getattr(importlib.import_module(module), name)
+
+    hooks = None
+    if is_hooked:
+        hooks = importlib.import_module("hooks").Hooks()
+        for callbacks in (hooks.on_instruction, hooks.on_block_enter, hooks.on_block_exit, hooks.on_cell_write, hooks.on_error):
+            callbacks.append(lambda event: None)
+
+    source, instructions = WORKLOADS[workload](iterations)
+    timings = []
+
+    def run(is_traced: bool = False) -> float:
+        output = io.StringIO()
+
+        # the interpreter is created inside the redirection, so its output sink writes into `output` too
+        with contextlib.redirect_stdout(output), contextlib.suppress(SystemExit):
+            C42 = Interpreter(source)
+            if hooks is not None:
+                C42.set_hooks(hooks)
+            if is_counted:
+                C42.set_metrics(importlib.import_module("metrics").Metrics())
+
+            # only the memory allocated during execution (cells, frames) is traced, not the parsed program
+            if is_traced:
+                tracemalloc.start()
+
+            start = time.perf_counter()
+            try:
+                C42.interpret()
+            finally:
+                elapsed = time.perf_counter() - start
+
+        return elapsed
+
+    for _ in range(repeat):
+        timings.append(run())
+
+    # frames are counted by a subclass put in place of the one the interpreter creates
+    frames = 0
+    interpreter = importlib.import_module("interpreter")
+    ExecutionFrame = interpreter.ExecutionFrame
+
+    class CountedFrame(ExecutionFrame):
+        __slots__ = ()
+
+        def __init__(self, *args) -> None:
+            nonlocal frames
+            frames += 1
+            super().__init__(*args)
+
+    interpreter.ExecutionFrame = CountedFrame
+    try:
+        run()
+    finally:
+        interpreter.ExecutionFrame = ExecutionFrame
+
+    # tracemalloc slows everything down, so the memory is measured in a separate run
+    run(True)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(timings)
+    return {"instructions": instructions, "seconds": best, "ips": instructions / best, "peak": peak, "frames": frames}
+
+
+def measure_revision(revision: str, workload: str, iterations: int, repeat: int) -> dict:
+
+    """
+    Extracts `src` of a git revision and measures it in a separate process
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive = subprocess.run(
+            ["git", "archive", revision, "src"], cwd = ROOT, check = True, capture_output = True
+        ).stdout
+        with tarfile.open(fileobj = io.BytesIO(archive)) as tar:
+            tar.extractall(directory)
+
+        result = subprocess.run(
+            [sys.executable, __file__, "--src", os.path.join(directory, "src"), "--json",
+             "--workload", workload, "--iterations", str(iterations), "--repeat", str(repeat)],
+            check = True, capture_output = True, text = True
+        )
+    return json.loads(result.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", choices = list(WORKLOADS), default = "loop", help = "workload to run")
+    parser.add_argument("--engine", choices = list(ENGINES), default = "interpreter", help = "engine to measure")
+    parser.add_argument("--iterations", type = int, default = 100_000, help = "size of the workload")
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs to take the best time from")
+    parser.add_argument("--against", metavar = "REV", help = "git revision to compare with")
+    parser.add_argument("--hooks", action = "store_true", help = "measure the instrumented loop of a run with hooks")
+    parser.add_argument("--metrics", action = "store_true", help = "measure a run which counts its metrics")
+    parser.add_argument("--src", default = os.path.join(ROOT, "src"), help = argparse.SUPPRESS)
+    parser.add_argument("--json", action = "store_true", help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    current = measure(args.src, args.engine, args.workload, args.iterations, args.repeat, args.hooks, args.metrics)
+    if args.json:
+        print(json.dumps(current))
+        return
+
+    print(f"{'engine':<12}{'instructions':>14}{'seconds':>10}{'instr/sec':>14}{'peak KiB':>12}{'frames':>10}")
+    print(
+        f"{args.engine:<12}{current['instructions']:>14}{current['seconds']:>10.3f}{current['ips']:>14,.0f}"
+        f"{current['peak'] / 1024:>12,.0f}{current['frames']:>10}"
+    )
+
+    if args.against:
+        old = measure_revision(args.against, args.workload, args.iterations, args.repeat)
+        print(
+            f"{args.against:<12}{old['instructions']:>14}{old['seconds']:>10.3f}{old['ips']:>14,.0f}"
+            f"{old['peak'] / 1024:>12,.0f}{old['frames']:>10}"
+        )
+        print(f"speedup: {current['ips'] / old['ips']:.2f}x, memory: {current['peak'] / old['peak']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
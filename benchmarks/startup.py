@@ -0,0 +1,136 @@
+"""
+Measures the startup of the command line: how long `python src/main.py run <program>` takes for a short
+program and what it imports, from the report of `python -X importtime`.
+
+Usage:
+    python benchmarks/startup.py [--program PATH] [--repeat R] [--top N] [--budget MS] [--against REV]
+
+The program is a hello world by default, so nearly all the time is the start of python and the imports.
+The wall-clock time is the best of R runs, the import time is the sum of the own times of the modules
+in the best of R runs with -X importtime, and the slowest N imports are listed by their own time.
+
+The run of a short program mustn't import the modules in AVOIDED: they belong to the other commands
+and engines, to the options of `run` (hooks, metrics, checkpoints, record and replay) or to the error path. The benchmark exits with status 1 if the run imports any of them
+or if its import time is over --budget milliseconds, so it gates startup regressions.
+With --against, the `src` directory of the given git revision is measured the same way.
+"""
+
+import argparse, io, os, subprocess, sys, tarfile, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HELLO = '#1 main\n41 -1 1\n04 -1 "Hello, world!"\n02 -1\n#0\n'
+
+# modules a run of a program without errors and without the options of `run` doesn't need
+AVOIDED = (
+    "click", "colorama", "asyncio", "concurrent.futures", "multiprocessing", "socket", "json",
+    "compiler", "async_interpreter", "transpiler", "profiler", "batch", "server",
+    "hooks", "metrics", "checkpoint", "replay", "random",
+)
+
+
+def parse_importtime(report: str) -> dict[str, int]:
+
+    """
+    Returns the own import time of every module in microseconds from the report of -X importtime
+    """
+
+    modules: dict[str, int] = {}
+    for line in report.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        own, _, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            modules[name.strip()] = int(own)
+
+    return modules
+
+def measure(src: str, program: str, repeat: int) -> dict:
+
+    """
+    Runs the program with main.py from `src` and returns the best wall-clock time and the imports of the fastest run
+    """
+
+    command = [sys.executable, os.path.join(src, "main.py"), "run", program]
+
+    # the first run writes the cache of the program, the others load it as a user's runs do
+    subprocess.run(command, stdin = subprocess.DEVNULL, capture_output = True, check = True)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdin = subprocess.DEVNULL, capture_output = True, check = True)
+        timings.append(time.perf_counter() - start)
+
+    imports: dict[str, int] | None = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", *command[1:]],
+            stdin = subprocess.DEVNULL, capture_output = True, text = True, check = True
+        )
+        modules = parse_importtime(result.stderr)
+        if imports is None or sum(modules.values()) < sum(imports.values()):
+            imports = modules
+
+    return {"seconds": min(timings), "import_seconds": sum(imports.values()) / 1e6, "imports": imports}
+
+def extract_revision(revision: str, directory: str) -> str:
+
+    """
+    Extracts `src` of a git revision into the directory and returns its path
+    """
+
+    archive = subprocess.run(
+        ["git", "archive", revision, "src"], cwd = ROOT, check = True, capture_output = True
+    ).stdout
+    with tarfile.open(fileobj = io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+
+    return os.path.join(directory, "src")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--program", help = "program to run, a hello world by default")
+    parser.add_argument("--repeat", type = int, default = 10, help = "runs to take the best time from")
+    parser.add_argument("--top", type = int, default = 10, help = "slowest imports to list")
+    parser.add_argument("--budget", type = float, help = "most milliseconds the imports can take")
+    parser.add_argument("--against", metavar = "REV", help = "git revision to compare with")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        program = args.program
+        if program is None:
+            program = os.path.join(directory, "hello.cft")
+            with open(program, "w", encoding = "utf-8") as file:
+                file.write(HELLO)
+
+        current = measure(os.path.join(ROOT, "src"), program, args.repeat)
+        old = measure(extract_revision(args.against, directory), program, args.repeat) if args.against else None
+
+    print(f"{'revision':<12}{'wall ms':>10}{'imports ms':>12}{'modules':>10}")
+    for name, result in (("current", current), (args.against, old)):
+        if result is not None:
+            print(f"{name:<12}{result['seconds'] * 1000:>10.1f}{result['import_seconds'] * 1000:>12.1f}{len(result['imports']):>10}")
+    if old is not None:
+        print(f"speedup: {old['seconds'] / current['seconds']:.2f}x")
+
+    print("\nslowest imports (own ms):")
+    for name, own in sorted(current["imports"].items(), key = lambda item: -item[1])[:args.top]:
+        print(f"  {name:<32}{own / 1000:>8.2f}")
+
+    avoided = [name for name in AVOIDED if name in current["imports"]]
+    is_over_budget = args.budget is not None and current["import_seconds"] * 1000 > args.budget
+
+    if avoided:
+        print(f"\nimported by a short run: {', '.join(avoided)}")
+    if is_over_budget:
+        print(f"\nimports take {current['import_seconds'] * 1000:.1f} ms, over the budget of {args.budget:g} ms")
+
+    if avoided or is_over_budget:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
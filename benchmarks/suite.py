@@ -0,0 +1,188 @@
+"""
+Runs the benchmark corpus (benchmarks/corpus/*.cft) and compares the results with a stored baseline.
+
+Usage:
+    python benchmarks/suite.py [--engine NAME] [--repeat R] [--workload NAME ...] [--baseline PATH] [--save] [--threshold T]
+
+For every workload the suite reports the parse time, the number of executed instructions,
+instructions per second and the peak memory of the execution. The programs run headless:
+the input comes from <name>.in next to the program (empty if there is no such file) and
+34 SLEEP doesn't sleep, so the numbers depend only on the interpreter.
+
+Results are compared with the baseline of the same engine, a workload whose instructions per
+second dropped by more than the threshold is a regression and the suite exits with status 1.
+A workload which executes another number of instructions than its baseline has changed, it isn't
+compared and the suite exits with status 1 too, until the baseline is saved again.
+--save writes the current results into the baseline instead.
+"""
+
+import argparse, asyncio, contextlib, glob, json, os, sys, time, tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(ROOT, "benchmarks", "corpus")
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import exception
+
+from interpreter import Interpreter
+from compiler import CompiledInterpreter
+from async_interpreter import AsyncInterpreter
+from output import CapturedOutput
+from inputs import IterableInput
+from cfttypes import Instruction
+from cell import StringCell
+
+ENGINES = {
+    "interpreter":  Interpreter,
+    "compiled":     CompiledInterpreter,
+    "async":        AsyncInterpreter,
+}
+
+
+def headless(Engine: type[Interpreter]) -> type[Interpreter]:
+
+    """
+    Returns a subclass of the engine whose 34 command checks its cell but doesn't sleep
+    """
+
+    def command_sleep(self, instruction: Instruction) -> None:
+        if type(self.get_cell(instruction, 0)) is StringCell:
+            self.handle_error("CFTE6", instruction.line_number, instruction.text)
+
+    return type(f"Headless{Engine.__name__}", (Engine,), {"command_sleep": command_sleep})
+
+class CountingInterpreter(Interpreter):
+    """
+    Reference interpreter which counts executed lines of the source (without the optimizer),
+    the count is the same for every engine.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.count = 0
+        super().__init__(*args, **kwargs)
+
+    def get_handlers(self):
+        def counted(handler):
+            def handle(instruction):
+                self.count += 1
+                return handler(instruction)
+            return handle
+
+        return [counted(handler) for handler in super().get_handlers()]
+
+
+def execute(C42: Interpreter) -> None:
+    with contextlib.suppress(exception.ProgramExit):
+        if isinstance(C42, AsyncInterpreter):
+            asyncio.run(C42.interpret())
+        else:
+            C42.interpret()
+
+def measure(path: str, engine: str, repeat: int) -> dict:
+
+    """
+    Returns parse time, instructions, best time, instructions per second and peak memory of a program
+    """
+
+    with open(path, "r", encoding = "utf-8") as file:
+        source = file.read()
+
+    input_path = os.path.splitext(path)[0] + ".in"
+    lines = open(input_path, encoding = "utf-8").read().splitlines() if os.path.isfile(input_path) else []
+
+    parse_time = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        blocks = Interpreter.parse(source)
+        parse_time = min(parse_time, time.perf_counter() - start)
+
+    counter = headless(CountingInterpreter)(source, None, CapturedOutput(), IterableInput(lines), optimize = False)
+    execute(counter)
+
+    Engine = headless(ENGINES[engine])
+
+    def run(is_traced: bool = False) -> float:
+        C42 = Engine(source, Interpreter.parse(source), CapturedOutput(), IterableInput(lines))
+
+        # only the memory allocated during execution is traced, not the parsed program
+        if is_traced:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        execute(C42)
+        return time.perf_counter() - start
+
+    seconds = min(run() for _ in range(repeat))
+
+    run(True)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "parse_seconds":    round(parse_time, 6),
+        "instructions":     counter.count,
+        "seconds":          round(seconds, 6),
+        "ips":              round(counter.count / seconds),
+        "peak":             peak,
+    }
+
+
+def main() -> None:
+    workloads = {os.path.splitext(os.path.basename(path))[0]: path for path in sorted(glob.glob(os.path.join(CORPUS, "*.cft")))}
+
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices = list(ENGINES), default = "interpreter", help = "engine to measure")
+    parser.add_argument("--repeat", type = int, default = 5, help = "runs to take the best time from")
+    parser.add_argument("--workload", choices = list(workloads), action = "append", help = "workload to run, all by default")
+    parser.add_argument("--baseline", default = BASELINE, help = "baseline JSON file")
+    parser.add_argument("--save", action = "store_true", help = "save the results as the baseline of the engine")
+    parser.add_argument("--threshold", type = float, default = 0.25, help = "allowed drop of instructions per second")
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, "r", encoding = "utf-8") as file:
+            baselines = json.load(file)
+    baseline = baselines.get(args.engine, {})
+
+    print(f"{'workload':<20}{'parse ms':>10}{'instructions':>14}{'seconds':>10}{'instr/sec':>14}{'peak KiB':>10}{'baseline':>10}")
+
+    results, regressions, changed = {}, [], []
+    for name in args.workload or workloads:
+        result = results[name] = measure(workloads[name], args.engine, args.repeat)
+
+        change = ""
+        if name in baseline and result["instructions"] != baseline[name]["instructions"]:
+            changed.append(name)
+            change = "changed"
+        elif name in baseline:
+            ratio = result["ips"] / baseline[name]["ips"]
+            change = f"{ratio:.2f}x"
+            if ratio < 1 - args.threshold:
+                regressions.append(name)
+                change += " !"
+
+        print(
+            f"{name:<20}{result['parse_seconds'] * 1000:>10.3f}{result['instructions']:>14}{result['seconds']:>10.3f}"
+            f"{result['ips']:>14,.0f}{result['peak'] / 1024:>10,.0f}{change:>10}"
+        )
+
+    if args.save:
+        baselines[args.engine] = {**baseline, **results}
+        with open(args.baseline, "w", encoding = "utf-8") as file:
+            json.dump(baselines, file, indent = 4, sort_keys = True)
+            file.write("\n")
+        print(f"baseline saved into {args.baseline}")
+
+    elif regressions or changed:
+        if regressions:
+            print(f"regressions (more than {args.threshold:.0%} slower): {', '.join(regressions)}")
+        if changed:
+            print(f"workloads changed since the baseline (save it again with --save): {', '.join(changed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import asyncio, sys, time
+
+from typing import Awaitable
+
+import exception
+
+from constants import *
+from cfttypes import *
+
+from cell import *
+from interpreter import Interpreter
+from hooks import Hooks
+from output import Output
+from inputs import Input
+
+
+class AsyncInput(Input):
+    """
+    Base class of input sources which have to be awaited, the 03 command of an async program waits
+    for a line without blocking other programs in the event loop.
+    """
+
+    async def readline(self) -> str | None:
+        raise NotImplementedError
+
+    def is_ready(self) -> bool:
+        return False
+
+class StreamInput(AsyncInput):
+    """
+    Reads lines from an asyncio stream (a socket or a pipe of the session).
+    """
+
+    def __init__(self, reader: asyncio.StreamReader) -> None:
+        self.reader = reader
+
+    async def readline(self) -> str | None:
+        line = await self.reader.readline()
+        if not line:
+            return None
+
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+class QueueInput(AsyncInput):
+    """
+    Takes lines from an asyncio queue, None put into the queue ends the input.
+    """
+
+    def __init__(self, queue: asyncio.Queue) -> None:
+        self.queue = queue
+
+    async def readline(self) -> str | None:
+        return await self.queue.get()
+
+    def is_ready(self) -> bool:
+        return not self.queue.empty()
+
+
+class StreamOutput(Output):
+    """
+    Writes the text into an asyncio stream, the interpreter waits for the stream
+    to be drained when the program waits for input, sleeps or gives the event loop to others.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, buffer_size: int = 8192) -> None:
+        self.writer = writer
+        self.buffer_size = buffer_size
+
+        self.__buffer: list[str] = []   # text which isn't written into the stream yet
+        self.__size: int = 0            # length of the text in the buffer
+
+    def write(self, text: str) -> None:
+        self.__buffer.append(text)
+        self.__size += len(text)
+
+        if self.__size >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.__buffer:
+            self.writer.write(self.encode("".join(self.__buffer)))
+            self.__buffer.clear()
+            self.__size = 0
+
+    def encode(self, text: str) -> bytes:
+
+        """
+        Returns the bytes written into the stream for the text
+        """
+
+        return text.encode("utf-8")
+
+    async def drain(self) -> None:
+        self.flush()
+        await self.writer.drain()
+
+
+class AsyncInterpreter(Interpreter):
+    """
+    Interpreter which runs a program as a coroutine, so one event loop can execute a lot of programs at once.
+
+    The parser, the blocks and the commands are the same as in the interpreter, only 03 and 34
+    commands are awaited instead of blocking the thread. A CPU-bound program gives the event loop
+    to others after every `yield_interval` executed lines (checked when a block or an iteration of a loop is finished).
+    """
+
+    def __init__(
+            self,
+            source: str,
+            blocks: dict[str, BlockData] | None = None,
+            output: Output | None = None,
+            input: Input | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            optimize: bool = True,
+            limits: Limits | None = None,
+            yield_interval: int = 1000,
+            prepared: PreparedCode | None = None):
+        super().__init__(source, blocks, output, input, on_eof, optimize, limits, prepared)
+
+        self.yield_interval: int                = yield_interval # lines executed between two yields to the event loop
+
+    def reset(
+            self,
+            output: Output | None = None,
+            input: Input | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            limits: Limits | None = None) -> None:
+        super().reset(output, input, on_eof, limits)
+
+        self.__pending: Awaitable | None        = None  # i/o of the current command, awaited by the main loop
+
+    def set_hooks(self, hooks: Hooks | None) -> None:
+
+        # the lines of an async program are executed by its own loop, which doesn't call the hooks
+        if hooks is not None and not hooks.is_empty():
+            raise ValueError("hooks work only with the interpreter engine")
+
+    # region Interpretation
+    async def interpret(self) -> None:
+
+        self.execute_block(ENTER_BLOCK, False, 0)
+
+        # the end of the program (and every error) raises ProgramExit, which mustn't leave
+        # the coroutine: asyncio would stop the whole event loop because of a SystemExit
+        try:
+            try:
+                await self.execute_stack_async()
+            finally:
+                self.output.flush()
+
+            self.cft_exit()
+
+        except exception.ProgramExit:
+            pass
+
+        await self.drain()
+
+    async def execute_stack_async(self) -> None:
+
+        """
+        Executes blocks from the execution stack until it's empty, awaiting i/o of commands
+        """
+
+        metrics = self.metrics
+        executed = 0
+        next_yield = self.yield_interval
+        next_check = self.check_limits(executed) if self.limits is not None or metrics is not None else sys.maxsize
+        frame, start = None, 0
+        started = time.perf_counter()
+
+        try:
+            while self.execution_stack:
+                frame = self.enter_frame()
+                if metrics is not None:
+                    self.count_block(frame, len(self.execution_stack) + 1)
+
+                while True:
+
+                    # a handler of an i/o command interrupts the block, the rest of it is executed after the i/o is done
+                    while True:
+                        start = frame.index
+                        self.execute_lines(frame)
+                        executed += frame.index - start - self.skipped
+                        self.skipped = 0
+
+                        if self.__pending is None:
+                            break
+
+                        pending, self.__pending = self.__pending, None
+                        await pending
+
+                    is_restarted = self.leave_frame(frame)
+                    start = frame.index
+
+                    if is_restarted and metrics is not None:
+                        metrics.loop_iterations += 1
+
+                    if executed >= next_check:
+                        next_check = self.check_limits(executed)
+
+                    # checked on every iteration of a loop too, so an endless loop doesn't hold the event loop
+                    if executed >= next_yield:
+                        next_yield = executed + self.yield_interval
+                        await self.drain()
+                        await asyncio.sleep(0)
+
+                    if not is_restarted:
+                        break
+
+        # the program can stop in the middle of a block (01, an error or a time limit of awaited i/o)
+        finally:
+            if metrics is not None:
+                self.finish_metrics(executed + (frame.index - start - self.skipped if frame is not None else 0), started)
+
+    async def drain(self) -> None:
+
+        """
+        Waits until the output is written if it's an asyncio stream
+        """
+
+        if isinstance(self.output, StreamOutput):
+            await self.output.drain()
+        else:
+            self.output.flush()
+    #endregion
+
+    #region Commands
+    def command_input(self, instruction: Instruction) -> bool:
+        cell = self.get_cell(instruction, 0)
+        self.__pending = self.read_input(instruction, cell)
+        return True
+
+    def command_sleep(self, instruction: Instruction) -> bool:
+        cell = self.get_cell(instruction, 0)
+
+        if type(cell) is StringCell:
+            self.handle_error("CFTE6", instruction.line_number, instruction.text)
+
+        self.__pending = self.sleep(instruction, cell.value)
+        return True
+
+    async def read_input(self, instruction: Instruction, cell: Cell) -> None:
+
+        # the prompt has to be visible before the program waits for the user
+        if not self.input.is_ready():
+            await self.drain()
+
+        start = time.perf_counter()
+        if isinstance(self.input, AsyncInput):
+            value = await self.wait(instruction, self.input.readline())
+        else:
+            value = self.input.readline()
+
+        if self.metrics is not None:
+            self.metrics.input_seconds += time.perf_counter() - start
+
+        self.store_input(instruction, cell, value)
+
+    async def sleep(self, instruction: Instruction, seconds: int | float) -> None:
+        await self.drain()
+
+        start = time.perf_counter()
+        try:
+            # the same as in the interpreter: a sleep by the virtual clock of a replay is cut by the time limit too
+            time_left = self.get_time_left()
+            if time_left is not None and seconds > time_left:
+                await asyncio.sleep(self.clock.take(max(time_left, 0)))
+                self.handle_error("CFTE15", instruction.line_number, instruction.text, limit = self.limits.seconds)
+
+            await asyncio.sleep(self.clock.take(seconds))
+        finally:
+            if self.metrics is not None:
+                self.metrics.sleep_seconds += time.perf_counter() - start
+
+    async def wait(self, instruction: Instruction, awaitable: Awaitable):
+
+        """
+        Awaits the i/o of a command, with a time limit the program stops with CFTE15 when the time is over
+        """
+
+        time_left = self.get_time_left()
+        if time_left is None:
+            return await awaitable
+
+        try:
+            return await asyncio.wait_for(awaitable, max(time_left, 0))
+        except TimeoutError:
+            self.handle_error("CFTE15", instruction.line_number, instruction.text, limit = self.limits.seconds)
+    #endregion
@@ -0,0 +1,157 @@
+"""
+Runs many C42 programs in parallel in a pool of worker processes.
+
+Every worker process lives for the whole batch and executes programs one by one, so the
+startup of python and the imports are paid once per worker, not once per program.
+A program is executed with its output captured and the report of it is a plain dict
+(see run_program), which the `batch` command prints as JSON lines.
+"""
+
+import glob, os, signal, time
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+from interpreter import Interpreter
+from program import Program
+from output import CapturedOutput
+from inputs import BufferedInput, IterableInput, Input
+from cfttypes import EOFPolicy, Limits
+
+
+SOURCE_EXTENSION    = ".cft"
+INPUT_EXTENSION     = ".in"
+
+# statuses of a finished program in reports
+FINISHED    = "finished"    # the program has finished without errors
+ERROR       = "error"       # the program has been stopped by a CFTE error
+TIMEOUT     = "timeout"     # the program has run longer than the timeout
+CRASHED     = "crashed"     # the interpreter has raised an unexpected exception
+
+
+class ProgramTimeout(BaseException):
+    """
+    Raised in a worker by the timer when the program runs longer than its timeout.
+    It isn't an Exception, so no handler in the interpreter can swallow it.
+    """
+
+
+def find_programs(paths: list[str]) -> list[str]:
+
+    """
+    Returns .cft files from the paths, a path can be a file, a directory or a glob pattern.
+    A file given by its path is taken whatever its extension is, the others have to be .cft files
+    """
+
+    programs = []
+
+    for path in paths:
+        if os.path.isfile(path):
+            programs.append(path)
+            continue
+
+        if os.path.isdir(path):
+            matches = glob.glob(os.path.join(glob.escape(path), "*" + SOURCE_EXTENSION))
+        else:
+            matches = glob.glob(path, recursive = True)
+
+        # a pattern matches inputs, caches and directories too
+        programs += sorted(match for match in matches if match.endswith(SOURCE_EXTENSION) and os.path.isfile(match))
+
+    return programs
+
+def find_input(program: str, inputs: str | None) -> str | None:
+
+    """
+    Returns the input file of a program: <name>.in from the inputs directory (or next to the program)
+    """
+
+    name = os.path.splitext(os.path.basename(program))[0] + INPUT_EXTENSION
+    path = os.path.join(inputs if inputs is not None else os.path.dirname(program), name)
+    return path if os.path.isfile(path) else None
+
+
+def on_timeout(signal_number, frame) -> None:
+    raise ProgramTimeout()
+
+def run_program(
+        program: str,
+        input_path: str | None,
+        engine: type[Interpreter],
+        timeout: float | None,
+        cache: bool = True,
+        on_eof: EOFPolicy = EOFPolicy.ERROR,
+        limits: Limits | None = None) -> dict:
+
+    """
+    Executes a program in the current process and returns its report:
+    program, status, error (a CFTE code or None), output and seconds
+    """
+
+    output = CapturedOutput()
+    input: Input | None = None
+    status, error_number = FINISHED, None
+    start = time.perf_counter()
+
+    # the timer interrupts the program in the worker itself, so the worker stays usable for the next programs
+    has_timer = timeout is not None
+    if has_timer:
+        signal.signal(signal.SIGALRM, on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    try:
+        try:
+            input = BufferedInput(open(input_path, "rb")) if input_path is not None else IterableInput(())
+            result = Program.load(program, cache, engine = engine).run(input, output, on_eof = on_eof, limits = limits, is_reporting = True)
+
+            if result.error is not None:
+                status, error_number = ERROR, result.error.error_number
+
+        # the timer is stopped before anything else runs: if it fires right after the program has ended,
+        # before it's stopped, the exception is caught below like a timeout in the program
+        finally:
+            if has_timer:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+
+    except ProgramTimeout:
+        status = TIMEOUT
+    except Exception as error:
+        status = CRASHED
+        output.write(f"\n{type(error).__name__}: {error}\n")
+
+    finally:
+        if isinstance(input, BufferedInput):
+            input.stream.close()
+
+    return {
+        "program":  program,
+        "status":   status,
+        "error":    error_number,
+        "output":   output.getvalue(),
+        "seconds":  round(time.perf_counter() - start, 6),
+    }
+
+def run_batch(
+        programs: list[str],
+        inputs: str | None,
+        engine: type[Interpreter],
+        jobs: int | None = None,
+        timeout: float | None = None,
+        cache: bool = True,
+        on_eof: EOFPolicy = EOFPolicy.ERROR,
+        limits: Limits | None = None) -> Iterator[dict]:
+
+    """
+    Executes the programs in a pool of `jobs` worker processes and yields their reports in the order of the programs.
+    The timeout needs signal.setitimer, so it isn't supported on Windows. The limits are checked by the interpreter
+    itself, a program over them is reported as an error with its CFTE code, and the worker goes on
+    """
+
+    with ProcessPoolExecutor(max_workers = jobs) as executor:
+        futures = [
+            executor.submit(run_program, program, find_input(program, inputs), engine, timeout, cache, on_eof, limits)
+            for program in programs
+        ]
+
+        for future in futures:
+            yield future.result()
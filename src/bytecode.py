@@ -0,0 +1,219 @@
+"""
+Binary format of compiled C42 programs (.c42c) and the on-disk cache of them.
+
+Layout (little-endian), every section is aligned to 4 bytes:
+
+    header          HEADER (magic, format version, source hash, layout key, checksum, section sizes)
+    string offsets  (strings + 1) * u32, string i is blob[offsets[i]:offsets[i + 1]]
+    string blob     utf-8 bytes of every string of the program (names, arguments, line texts)
+    blocks          blocks * BLOCK (name, first instruction, instructions count)
+    instructions    instructions * INSTRUCTION (opcode, arguments count, line number, text, arguments, tokens)
+    tokens          tokens * u32, string ids of the tokens of every line (for BlockData.data)
+
+The file is loaded through mmap: the tables are read in place from a memoryview of the mapping,
+only the strings are copied out when they become python objects.
+
+FORMAT_VERSION has to be bumped with every change of the layout. The layout key is a hash of what else the
+decoded lines depend on (the constants of the commands, the fields of Instruction and the tables above),
+so a file written by another version of the interpreter is rebuilt even if the bump is forgotten.
+"""
+
+import gc, hashlib, mmap, os, struct, sys, zlib
+
+import constants
+
+from typing import Callable
+
+from cfttypes import *
+from files import write_atomically
+
+
+MAGIC           = b"C42C"
+FORMAT_VERSION  = 2
+EXTENSION       = ".c42c"
+
+HEADER      = struct.Struct("<4sHH32s16sIIIIII")    # magic, format version, reserved, sha256 of source, layout key,
+                                                    # crc32 of the payload, strings, blob size, blocks, instructions, tokens
+BLOCK       = struct.Struct("<III")                 # name, first instruction, instructions count
+INSTRUCTION = struct.Struct("<HHIIIIII")            # opcode, arguments count, line number, text, first argument,
+                                                    # second argument, first token, tokens count
+NO_ARGUMENT = 0xFFFFFFFF
+
+LAYOUT_KEY  = hashlib.blake2b(repr((
+    FORMAT_VERSION, HEADER.format, BLOCK.format, INSTRUCTION.format, Instruction.__slots__,
+    [(name, value) for name, value in vars(constants).items() if name.isupper()],
+)).encode("utf-8"), digest_size = 16).digest()
+
+
+class CorruptedFileError(ValueError):
+    """
+    Raised when a .c42c file can't be loaded
+    """
+
+
+def get_source_hash(source: str) -> bytes:
+    return hashlib.sha256(source.encode("utf-8")).digest()
+
+def get_cache_path(filename: str) -> str:
+    return os.path.splitext(filename)[0] + EXTENSION
+
+def align(size: int) -> int:
+    return (size + 3) & ~3
+
+def get_u32_array(view: memoryview, start: int, count: int) -> memoryview | tuple[int, ...]:
+
+    """
+    Returns a table of u32 numbers from the file, in place if the machine is little-endian
+    """
+
+    if sys.byteorder == "little":
+        return view[start:start + count * 4].cast("I")
+    return struct.unpack_from(f"<{count}I", view, start)
+
+
+def dump(blocks: dict[str, BlockData], source_hash: bytes) -> bytes:
+
+    """
+    Serializes parsed blocks into the .c42c format
+    """
+
+    strings: dict[str, int] = {}
+    def intern(string: str) -> int:
+        return strings.setdefault(string, len(strings))
+
+    block_table, instruction_table, tokens = bytearray(), bytearray(), []
+    count = 0
+
+    for name, block in blocks.items():
+        block_table += BLOCK.pack(intern(name), count, len(block.code))
+
+        for instruction, (_, line_tokens) in zip(block.code, block.data):
+            args = [intern(arg) for arg in instruction.args] + [NO_ARGUMENT] * (2 - len(instruction.args))
+            instruction_table += INSTRUCTION.pack(
+                instruction.opcode, len(instruction.args), instruction.line_number, intern(instruction.text),
+                *args, len(tokens), len(line_tokens)
+            )
+            tokens.extend(intern(token) for token in line_tokens)
+            count += 1
+
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets, position = [], 0
+    for string in encoded:
+        offsets.append(position)
+        position += len(string)
+    offsets.append(position)
+
+    blob = b"".join(encoded)
+    payload = b"".join((
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        blob.ljust(align(len(blob)), b"\0"),
+        bytes(block_table),
+        bytes(instruction_table),
+        struct.pack(f"<{len(tokens)}I", *tokens),
+    ))
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0, source_hash, LAYOUT_KEY,
+        zlib.crc32(payload), len(strings), len(blob), len(blocks), count, len(tokens)
+    )
+    return header + payload
+
+
+def load(view: memoryview, source_hash: bytes) -> dict[str, BlockData]:
+
+    """
+    Loads blocks from a .c42c file mapped into memory, raises CorruptedFileError if the file
+    is damaged or was built from another source or by another version of the interpreter
+    """
+
+    try:
+        (magic, format_version, _, file_hash, layout_key, checksum,
+         strings_count, blob_size, blocks_count, instructions_count, tokens_count) = HEADER.unpack_from(view)
+    except struct.error:
+        raise CorruptedFileError("truncated header")
+
+    if magic != MAGIC or format_version != FORMAT_VERSION or layout_key != LAYOUT_KEY:
+        raise CorruptedFileError("unsupported format")
+    if file_hash != source_hash:
+        raise CorruptedFileError("stale file")
+
+    offsets_start   = HEADER.size
+    blob_start      = offsets_start + (strings_count + 1) * 4
+    blocks_start    = blob_start + align(blob_size)
+    code_start      = blocks_start + blocks_count * BLOCK.size
+    tokens_start    = code_start + instructions_count * INSTRUCTION.size
+    end             = tokens_start + tokens_count * 4
+
+    if len(view) != end or zlib.crc32(view[HEADER.size:]) != checksum:
+        raise CorruptedFileError("damaged payload")
+
+    offsets = get_u32_array(view, offsets_start, strings_count + 1)
+
+    # the loader creates a lot of objects without reference cycles, so collections would only waste time
+    is_gc_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        strings = [
+            str(view[blob_start + offsets[i]:blob_start + offsets[i + 1]], "utf-8")
+            for i in range(strings_count)
+        ]
+        tokens = [strings[i] for i in get_u32_array(view, tokens_start, tokens_count)]
+        code = [
+            (opcode, tuple(strings[arg] for arg in (arg1, arg2)[:args_count]), line_number, strings[text], token, token + count)
+            for opcode, args_count, line_number, text, arg1, arg2, token, count
+            in INSTRUCTION.iter_unpack(view[code_start:tokens_start])
+        ]
+
+        blocks: dict[str, BlockData] = {}
+        for name, first, count in BLOCK.iter_unpack(view[blocks_start:code_start]):
+            blocks[strings[name]] = BlockData(
+                [(line_number, tokens[start:stop]) for _, _, line_number, _, start, stop in code[first:first + count]]
+            )
+            blocks[strings[name]].code = [
+                Instruction(opcode, args, line_number, text) for opcode, args, line_number, text, _, _ in code[first:first + count]
+            ]
+
+    # the error is raised outside of the handler, so its traceback doesn't keep views of the mapping alive
+    except (IndexError, UnicodeDecodeError, struct.error) as error:
+        message = str(error)
+    else:
+        return blocks
+
+    finally:
+        if is_gc_enabled:
+            gc.enable()
+
+        # views of the mapping have to be released before it's closed
+        if isinstance(offsets, memoryview):
+            offsets.release()
+
+    raise CorruptedFileError(message)
+
+
+def load_program(filename: str, source: str, parse: Callable[[str], dict[str, BlockData]]) -> dict[str, BlockData]:
+
+    """
+    Returns the blocks of a program from its .c42c file next to the source.
+    If the file is missing, stale or corrupted, the source is parsed with `parse` and the file is rebuilt
+    """
+
+    source_hash = get_source_hash(source)
+    cache_path = get_cache_path(filename)
+
+    try:
+        with open(cache_path, "rb") as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as mapping:
+            with memoryview(mapping) as view:
+                return load(view, source_hash)
+    except (OSError, ValueError):
+        pass
+
+    blocks = parse(source)
+
+    # the cache is an optimization only, a read-only directory just leaves the program uncached
+    try:
+        write_atomically(cache_path, dump(blocks, source_hash))
+    except OSError:
+        pass
+
+    return blocks
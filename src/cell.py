@@ -1,7 +1,6 @@
-import re
-
-
 class Cell:
+    __slots__ = ("value",)
+
     def __init__(self, default: int | float | str) -> None:
         self.value = default
 
@@ -12,19 +11,102 @@ class Cell:
             return True
         except ValueError:
             return False
+
+    @staticmethod
+    def decode_number(s: str) -> tuple[int | None, float | None]:
+
+        """
+        Returns the text as an int and as a float, None where it isn't such a number ("1.5" is only a float)
+        """
+
+        try:
+            real = float(s)
+        except ValueError:
+            return None, None
+
+        try:
+            return int(s), real
+        except ValueError:
+            return None, real
     
     @staticmethod
     def is_name_correct(name: str) -> bool:
-        return bool(re.match(r"^-[1-9][0-9]*$", name))
 
+        # a minus and a number without leading zeros, checked without a regex as 41 checks every cell it creates
+        digits = name[1:]
+        return name[:1] == "-" and digits[:1] not in ("", "0") and digits.isascii() and digits.isdigit()
+
+# cells are created by the thousands, so they keep only the value in slots and set it without calling super()
 class IntegerCell(Cell):
+    __slots__ = ()
+
     def __init__(self) -> None:
-        super().__init__(0)
+        self.value = 0
 
 class FloatCell(Cell):
+    __slots__ = ()
+
     def __init__(self) -> None:
-        super().__init__(0.0)
+        self.value = 0.0
 
 class StringCell(Cell):
+    """
+    A string cell is a builder: appended text is kept in pieces which are joined only when the value is read
+    (by 02, a comparison, ...), so building a string with 24 or 05 commands in a loop takes linear time.
+    The length is counted without joining the pieces.
+    """
+
+    __slots__ = ("text", "pieces", "length")
+
     def __init__(self) -> None:
-        super().__init__("")
\ No newline at end of file
+        self.text: str                  = ""    # the value without the pieces appended after it was last read
+        self.pieces: list[str] | None   = None  # the text and the appended pieces, None if nothing is appended
+        self.length: int                = 0
+
+    @property
+    def value(self) -> str:
+        if self.pieces is not None:
+            self.text = "".join(self.pieces)
+            self.pieces = None
+
+        return self.text
+
+    @value.setter
+    def value(self, value: str) -> None:
+        self.text = value
+        self.pieces = None
+
+        # 21 and 28 can write a number into a string cell, it isn't counted as a string
+        self.length = len(value) if type(value) is str else 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def append(self, text: str) -> None:
+        if self.pieces is None:
+            self.pieces = [self.text, text]
+        else:
+            self.pieces.append(text)
+
+        self.length += len(text)
+
+    def delete(self, index: int) -> None:
+
+        """
+        Deletes the character at the index, an index outside the string leaves it as it is
+        """
+
+        if not 0 <= index < self.length:
+            return
+
+        # a character of the last appended piece (e.g. a backspace after 24) is deleted without joining the string
+        pieces = self.pieces
+        if pieces is not None and index >= self.length - len(pieces[-1]):
+            piece = pieces[-1]
+            index -= self.length - len(piece)
+            pieces[-1] = piece[:index] + piece[index + 1:]
+            self.length -= 1
+            return
+
+        value = self.value
+        self.value = value[:index] + value[index + 1:]
\ No newline at end of file
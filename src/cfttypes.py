@@ -1,6 +1,8 @@
+import time
+
 from dataclasses import dataclass
 from enum import Enum
-from typing import Union
+from typing import Mapping, Union
 
 
 class CellDataType(Enum):
@@ -20,16 +22,76 @@ class UpdateMode(Enum):
     WRITE   = "w"
     ADD     = "a"
 
-class LineArgument(Enum):
+class EOFPolicy(Enum):
+    """
+    Enum defining what a 03 command does when the input is over.
+    """
+
+    ERROR   = "error"   # the program stops with CFTE13
+    EMPTY   = "empty"   # the cell gets the empty value of its type ("", 0 or 0.0)
+
+class ExitReason(Enum):
+    """
+    Enum defining why a program has stopped.
+    """
+
+    FINISHED    = "finished"    # the main block is over
+    EXITED      = "exited"      # a 01 command has ended the program
+    ERROR       = "error"       # the program has been stopped by a CFTE error
+    LIMIT       = "limit"       # the program has gone over a resource limit (CFTE14-CFTE18)
+    SUSPENDED   = "suspended"   # the state of the program has been saved into a snapshot and it has stopped (see checkpoint.py)
+
+@dataclass(slots=True)
+class ProgramError:
+    """
+    Represents the error which has stopped a program at run time.
+    """
+
+    error_number: str           # code of the error (e.g. "CFTE8")
+    message: str                # formatted message of the error
+    line_number: int | None     # line number in the source code, None if the error isn't caused by a line
+    text: str | None            # the whole line in string version
+
+@dataclass(slots=True)
+class Limits:
+    """
+    Represents the resource limits of a run, None means no limit. A program over a limit stops with its CFTE error.
+    """
+
+    instructions: int | None = None     # lines executed in all blocks (CFTE14)
+    seconds: float | None = None        # wall-clock time of the execution (CFTE15)
+    string_length: int | None = None    # total length of the strings in all cells, in characters (CFTE16)
+    cells: int | None = None            # cells created (CFTE17)
+    depth: int | None = None            # blocks on the execution stack, waiting for the called ones (CFTE18)
+    check_interval: int = 4096          # lines executed between two checks of the instructions, the time and the strings
+
+@dataclass(slots=True)
+class Checkpoints:
+    """
+    Represents where and how often the state of a run is saved (see checkpoint.py).
+    """
+
+    path: str                       # file of the snapshot, every new snapshot replaces it
+    interval: int | None = None     # lines executed between two snapshots, None saves them only on request
+
+class Clock:
     """
-    Enum defines the numbers of arguments to search in line
+    Time of a run: 34 commands sleep by it and the time limit is measured by it. This one is the real time,
+    a recorded run and a replay have their own clocks (see replay.py).
     """
 
-    COMMAND     = 0
-    FIRST       = 1
-    SECOND      = 2
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def take(self, seconds: float) -> float:
+
+        """
+        Returns how long a 34 command has to really sleep for the `seconds` it sleeps
+        """
+
+        return seconds
 
-@dataclass
+@dataclass(slots=True)
 class ExecutionFrame:
     """
     Represents an execution frame, storing metadata about the current block being executed in the interpreter.
@@ -39,6 +101,31 @@ class ExecutionFrame:
     is_looping: bool    # is block looping? (true if only the block's called from a 35 command)
     index: int          # current index in the block
 
+@dataclass(slots=True)
+class Instruction:
+    """
+    Represents a pre-decoded line of a block, the command is resolved to its opcode once at load time.
+    """
+
+    opcode: int             # numeric opcode of the command (see ARGUMENTS_COUNT in constants)
+    args: tuple[str, ...]   # arguments of the command, trimmed to the count the command takes
+    line_number: int        # line number in the source code
+    text: str               # the whole line in string version, used in error messages
+    cells: tuple[int, ...] = () # slots of the cell arguments in the cells table, filled by the interpreter
+    operands: tuple = ()        # values prepared by the optimizer for a superinstruction (fused lines, a converted constant),
+                                # a 04 or 24 command has its value from the constant pool (see Interpreter.resolve)
+
+@dataclass(slots=True)
+class Diagnostic:
+    """
+    Represents an error found in a program before execution: the line fails with it whenever it's executed.
+    """
+
+    error_number: str       # code of the error (e.g. "CFTE7")
+    line_number: int        # line number in the source code
+    text: str               # the whole line in string version
+    message: str            # formatted message of the error
+
 class BlockData:
     """
     Represents a structured data block containing nested lists of integers and string lists.
@@ -49,9 +136,22 @@ class BlockData:
         Initializes a BlockData object with the given nested list structure.
         """
         self.data = data if data is not None else []
+        self.code: list[Instruction] = []  # decoded version of data, filled by the interpreter
 
     def __repr__(self) -> str:
         """
         Returns a string representation of the BlockData object.
         """
-        return f"BlockData({self.data})"
\ No newline at end of file
+        return f"BlockData({self.data})"
+
+@dataclass(slots=True)
+class PreparedCode:
+    """
+    Represents the code of a program ready to run: resolved cells, the constant pool and the optimized blocks.
+    Runs don't change it, so the interpreters of one program can share it (see Interpreter.get_prepared).
+    """
+
+    blocks: Mapping[str, BlockData]                                 # code with superinstructions and typed commands
+    symbols: dict[str, int]                                         # slots of cells in the cells table by their names
+    constants: dict[str, tuple[int | None, float | None, str]]      # values of 04 and 24 commands decoded once
+    is_optimized: bool                                              # true if the blocks are optimized
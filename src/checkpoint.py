@@ -0,0 +1,201 @@
+"""
+Snapshots of running C42 programs (.c42s): the cells, the execution stack and the counters of a run,
+so a long program can be stopped and continued later from the same place.
+
+Layout (little-endian):
+
+    header      HEADER (magic, format version, flags, source hash, interpreter version, checksum, counts)
+    cells       cells * CELL (class, kind of value), then the value: i64, f64, or u32 size + utf-8
+                (a string, or the decimal digits of an integer which doesn't fit into i64)
+    frames      frames * (u32 size + utf-8 name of the block, FRAME (is looping, index))
+    random      625 * u32 state of the generator of 36 commands, RANDOM_TAIL (has gauss_next, gauss_next)
+
+A snapshot is taken between two lines, when no command is half-done. It's bound to the source and
+to the optimization of the code, because the indexes in the frames are indexes of the optimized lines.
+"""
+
+import struct, zlib
+
+from dataclasses import dataclass
+
+from constants import VERSION
+from bytecode import get_source_hash
+from files import write_atomically
+from cfttypes import *
+from cell import *
+
+
+MAGIC           = b"C42S"
+FORMAT_VERSION  = 1
+EXTENSION       = ".c42s"
+
+HEADER      = struct.Struct("<4sHH32s16sIIIQII")    # magic, format version, flags, sha256 of source, interpreter version,
+                                                    # crc32 of the payload, cells, frames, executed lines, created cells, read lines
+CELL        = struct.Struct("<BB")                  # class of the cell, kind of the value
+FRAME       = struct.Struct("<BI")                  # is looping, index of the next line
+SIZE        = struct.Struct("<I")
+INTEGER     = struct.Struct("<q")
+FLOAT       = struct.Struct("<d")
+RANDOM      = struct.Struct("<625I")
+RANDOM_TAIL = struct.Struct("<Bd")
+
+IS_OPTIMIZED        = 1 # flag: the frames index the optimized code
+WILL_SKIP_NEXT_LINE = 2 # flag: a condition at the end of a block has skipped the next executed line
+
+CELL_CLASSES = [None, IntegerCell, FloatCell, StringCell]
+
+NO_VALUE, SMALL_INTEGER, BIG_INTEGER, FLOAT_VALUE, STRING_VALUE = range(5)
+
+
+class SnapshotError(ValueError):
+    """
+    Raised when a snapshot can't be loaded or belongs to another program
+    """
+
+
+@dataclass(slots=True)
+class Snapshot:
+    """
+    Represents the state of a run between two lines.
+    """
+
+    cells: list[Cell | None]            # the cells table
+    frames: list[ExecutionFrame]        # the execution stack, the next block to run is the last one
+    is_optimized: bool                  # true if the frames index the optimized code
+    will_skip_next_line: bool           # a skip left by a condition at the end of a block
+    executed: int                       # lines executed before the snapshot, counted with limits or checkpoints
+    created_cells: int                  # cells created by 41 commands, counted with the cells limit
+    lines_read: int                     # lines read by 03 commands, a resumed run skips them in its input
+    random_state: tuple                 # state of the generator of 36 commands (random.getstate())
+
+
+def dump(snapshot: Snapshot, source_hash: bytes) -> bytes:
+
+    """
+    Serializes a snapshot into the .c42s format
+    """
+
+    payload = bytearray()
+
+    for cell in snapshot.cells:
+        if cell is None:
+            payload += CELL.pack(0, NO_VALUE)
+            continue
+
+        kind = CELL_CLASSES.index(type(cell))
+        value = cell.value
+
+        if type(value) is str:
+            encoded = value.encode("utf-8", "surrogatepass")
+            payload += CELL.pack(kind, STRING_VALUE) + SIZE.pack(len(encoded)) + encoded
+        elif type(value) is float:
+            payload += CELL.pack(kind, FLOAT_VALUE) + FLOAT.pack(value)
+        elif -2 ** 63 <= value < 2 ** 63:
+            payload += CELL.pack(kind, SMALL_INTEGER) + INTEGER.pack(value)
+        else:
+            digits = str(value).encode("ascii")
+            payload += CELL.pack(kind, BIG_INTEGER) + SIZE.pack(len(digits)) + digits
+
+    for frame in snapshot.frames:
+        name = frame.block_name.encode("utf-8")
+        payload += SIZE.pack(len(name)) + name + FRAME.pack(frame.is_looping, frame.index)
+
+    _, state, gauss_next = snapshot.random_state
+    payload += RANDOM.pack(*state)
+    payload += RANDOM_TAIL.pack(gauss_next is not None, gauss_next or 0.0)
+
+    flags = (IS_OPTIMIZED if snapshot.is_optimized else 0) | (WILL_SKIP_NEXT_LINE if snapshot.will_skip_next_line else 0)
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, flags, source_hash, VERSION.encode("utf-8"), zlib.crc32(payload),
+        len(snapshot.cells), len(snapshot.frames), snapshot.executed, snapshot.created_cells, snapshot.lines_read
+    )
+    return header + bytes(payload)
+
+
+def load(data: bytes, source_hash: bytes) -> Snapshot:
+
+    """
+    Loads a snapshot, raises SnapshotError if the file is damaged or was made from another source
+    or by another version of the interpreter
+    """
+
+    try:
+        (magic, format_version, flags, file_hash, version, checksum,
+         cells_count, frames_count, executed, created_cells, lines_read) = HEADER.unpack_from(data)
+    except struct.error:
+        raise SnapshotError("truncated header")
+
+    if magic != MAGIC or format_version != FORMAT_VERSION or version.rstrip(b"\0") != VERSION.encode("utf-8"):
+        raise SnapshotError("unsupported format")
+    if file_hash != source_hash:
+        raise SnapshotError("the snapshot was made from another program")
+    if zlib.crc32(data[HEADER.size:]) != checksum:
+        raise SnapshotError("damaged payload")
+
+    position = HEADER.size
+
+    def read(structure: struct.Struct) -> tuple:
+        nonlocal position
+        values = structure.unpack_from(data, position)
+        position += structure.size
+        return values
+
+    def read_bytes() -> bytes:
+        nonlocal position
+        size, = read(SIZE)
+        position += size
+        return data[position - size:position]
+
+    try:
+        cells: list[Cell | None] = []
+        for _ in range(cells_count):
+            kind, value_kind = read(CELL)
+            if value_kind == NO_VALUE:
+                cells.append(None)
+                continue
+
+            cell = CELL_CLASSES[kind]()
+            if value_kind == SMALL_INTEGER:
+                cell.value, = read(INTEGER)
+            elif value_kind == BIG_INTEGER:
+                cell.value = int(read_bytes())
+            elif value_kind == FLOAT_VALUE:
+                cell.value, = read(FLOAT)
+            elif value_kind == STRING_VALUE:
+                cell.value = read_bytes().decode("utf-8", "surrogatepass")
+            else:
+                raise SnapshotError("damaged payload")
+            cells.append(cell)
+
+        frames: list[ExecutionFrame] = []
+        for _ in range(frames_count):
+            name = read_bytes().decode("utf-8")
+            is_looping, index = read(FRAME)
+            frames.append(ExecutionFrame(name, bool(is_looping), index))
+
+        state = read(RANDOM)
+        has_gauss_next, gauss_next = read(RANDOM_TAIL)
+
+    except (IndexError, TypeError, ValueError, struct.error) as error:
+        raise SnapshotError(f"damaged payload: {error}")
+
+    if position != len(data):
+        raise SnapshotError("damaged payload")
+
+    return Snapshot(
+        cells, frames, bool(flags & IS_OPTIMIZED), bool(flags & WILL_SKIP_NEXT_LINE),
+        executed, created_cells, lines_read, (3, state, gauss_next if has_gauss_next else None),
+    )
+
+
+def save(path: str, snapshot: Snapshot, source_hash: bytes) -> None:
+
+    """
+    Writes a snapshot into a file, the previous snapshot stays whole until the new one is written
+    """
+
+    write_atomically(path, dump(snapshot, source_hash), is_durable = True)
+
+def load_file(path: str, source_hash: bytes) -> Snapshot:
+    with open(path, "rb") as file:
+        return load(file.read(), source_hash)
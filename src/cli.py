@@ -0,0 +1,323 @@
+"""
+Commands of the command line (main.py is the entry point). Only the modules every command needs
+are imported here, the others are imported by the commands which use them: `run` doesn't pay
+for asyncio, multiprocessing, sockets or the other engines (see benchmarks/startup.py).
+"""
+
+import functools, importlib, os, signal, time
+
+import click
+
+from interpreter import Interpreter
+from program import Program
+from output import BlockBufferedOutput, LineBufferedOutput, get_default_output
+from inputs import BufferedInput
+from cfttypes import Checkpoints, EOFPolicy, ExitReason, Limits
+from constants import DEFAULT_PROGRAM
+
+# engine name -> (module, class), the module is imported when the engine is used
+ENGINES = {
+    "interpreter":  ("interpreter", "Interpreter"),                 # reference interpreter, executes the decoded lines one by one
+    "compiled":     ("compiler", "CompiledInterpreter"),            # compiles every block into closures before execution
+    "async":        ("async_interpreter", "AsyncInterpreter"),      # runs the program as a coroutine in an event loop
+}
+
+OUTPUTS = {
+    "auto":         get_default_output,     # line-buffered for a terminal, block-buffered for files and pipes
+    "line":         LineBufferedOutput,
+    "block":        BlockBufferedOutput,
+}
+
+EXIT_SUSPENDED = 75 # exit status of a program stopped after its state is saved (EX_TEMPFAIL, the run can be resumed)
+
+def get_engine(name: str) -> type[Interpreter]:
+    module, engine = ENGINES[name]
+    return getattr(importlib.import_module(module), engine)
+
+def limits_options(command):
+
+    """
+    Adds the options of the resource limits to a command, they are passed as the `limits` argument
+    """
+
+    options = [
+        click.option("--max-instructions", type=click.IntRange(0), help="Stop the program with CFTE14 after this many executed lines."),
+        click.option("--max-seconds", type=click.FloatRange(0, min_open=True), help="Stop the program with CFTE15 after this many seconds."),
+        click.option("--max-string-length", type=click.IntRange(0), help="Stop the program with CFTE16 when its strings are longer in total."),
+        click.option("--max-cells", type=click.IntRange(0), help="Stop the program with CFTE17 when it creates more cells."),
+        click.option("--max-depth", type=click.IntRange(1), help="Stop the program with CFTE18 when more blocks wait on the execution stack."),
+    ]
+
+    def wrapper(max_instructions, max_seconds, max_string_length, max_cells, max_depth, **kwargs):
+        values = (max_instructions, max_seconds, max_string_length, max_cells, max_depth)
+        limits = Limits(*values) if any(value is not None for value in values) else None
+        return command(limits = limits, **kwargs)
+
+    wrapper = functools.update_wrapper(wrapper, command)
+    for option in reversed(options):
+        wrapper = option(wrapper)
+    return wrapper
+
+@click.group()
+def cli():
+    """C42 Interpretator"""
+
+@cli.command()
+@click.argument("filename", default=DEFAULT_PROGRAM, required=False, type=click.Path(exists=True, readable=True))
+@click.option("--engine", type=click.Choice(list(ENGINES)), default="interpreter", show_default=True, help="Execution engine.")
+@click.option("--cache/--no-cache", default=True, show_default=True, help="Keep the parsed program in a .c42c file next to the source.")
+@click.option("--lazy", is_flag=True, help="Map the file into memory and tokenize a block when it first runs, for very large programs. Such a program isn't cached and is optimized without the types of cells.")
+@click.option("--reachable-only", is_flag=True, help="Parse only the blocks the program can call from the main block (all of them if it makes names of blocks at run time).")
+@click.option("--buffering", type=click.Choice(list(OUTPUTS)), default="auto", show_default=True, help="Buffering of the program's output.")
+@click.option("--input", "input_file", type=click.File("rb"), default="-", help="File to read the program's input from, stdin by default.")
+@click.option("--on-eof", type=click.Choice([policy.value for policy in EOFPolicy]), default=EOFPolicy.ERROR.value, show_default=True, help="What 03 does when the input is over: stop with CFTE13 or read an empty value.")
+@click.option("--profile", is_flag=True, help="Print time and hit counts per line, command and block into stderr (the interpreter engine only).")
+@click.option("--profile-output", type=click.File("w"), help="Write the profile in the collapsed stacks format of flamegraph tools into a file.")
+@click.option("-O", "optimization", type=click.IntRange(0, 1), default=1, show_default=True, help="-O0 turns off the optimizer of the interpreter engines.")
+@click.option("--dump-optimized", is_flag=True, help="Print the optimized code instead of running the program.")
+@click.option("--verify", is_flag=True, help="Check the program before running it and don't run it if a line always fails.")
+@click.option("--checkpoint", "checkpoint_path", type=click.Path(dir_okay=False), help="Save the state of the program into this file on SIGUSR1, and save it and stop on SIGTERM (the interpreter engine only). The file is removed when the program ends.")
+@click.option("--checkpoint-every", type=click.IntRange(1), help="Save the state of the program every N executed lines too.")
+@click.option("--resume", is_flag=True, help="Continue the program from the --checkpoint file if it exists. The lines it has read are skipped in the input, so give it the same input again.")
+@click.option("--stats", is_flag=True, help="Print the metrics of the run (executed lines, blocks, loop iterations, peak depth, cells...) as JSON into stderr at the end.")
+@click.option("--prometheus", "prometheus_path", type=click.Path(dir_okay=False), help="Write the metrics of the run into this file in the Prometheus text format (for the textfile collector of node_exporter).")
+@click.option("--record", "record_path", type=click.Path(dir_okay=False), help="Record the input, the random choices and the sleeps of the run into a trace file.")
+@click.option("--replay", "replay_path", type=click.Path(exists=True, dir_okay=False), help="Run the program with the input, the random choices and the sleeps of a trace file instead of the input. The sleeps don't wait.")
+@limits_options
+def run(filename, engine, cache, lazy, reachable_only, buffering, input_file, on_eof, profile, profile_output, optimization, dump_optimized, verify, checkpoint_path, checkpoint_every, resume, stats, prometheus_path, record_path, replay_path, limits):
+    """Runs a C42 program"""
+
+    profile = profile or profile_output is not None
+    if profile and engine != "interpreter":
+        raise click.UsageError("--profile works only with the interpreter engine")
+    if checkpoint_path is None and (checkpoint_every is not None or resume):
+        raise click.UsageError("--checkpoint-every and --resume need --checkpoint")
+    if checkpoint_path is not None and engine != "interpreter":
+        raise click.UsageError("--checkpoint works only with the interpreter engine")
+    if checkpoint_path is not None and (lazy or reachable_only):
+        raise click.UsageError("--checkpoint works only with the whole program parsed")
+    if record_path is not None and replay_path is not None:
+        raise click.UsageError("--record and --replay can't be used together")
+    if (record_path is not None or replay_path is not None) and (checkpoint_path is not None or lazy):
+        raise click.UsageError("--record and --replay don't work with --checkpoint and --lazy")
+
+    if profile:
+        from profiler import ProfiledInterpreter
+
+    # the compiled engine and the profiler always take the lines as they are written
+    program = Program.load(
+        filename, cache, lazy, reachable_only,
+        engine = ProfiledInterpreter if profile else get_engine(engine), optimize = optimization > 0,
+    )
+
+    if verify and not check_program(program.blocks):
+        raise SystemExit(1)
+
+    if dump_optimized:
+        from optimizer import dump
+        click.echo(dump(Interpreter(program.source, program.blocks, optimize = optimization > 0).blocks))
+        return
+
+    checkpoints, snapshot = None, None
+    if checkpoint_path is not None:
+        import checkpoint
+        checkpoints = Checkpoints(checkpoint_path, checkpoint_every)
+
+        if resume and os.path.exists(checkpoint_path):
+            try:
+                snapshot = checkpoint.load_file(checkpoint_path, checkpoint.get_source_hash(program.source))
+            except (OSError, checkpoint.SnapshotError) as error:
+                raise click.ClickException(f"can't resume from {checkpoint_path}: {error}")
+
+            # the lines in the snapshot are the lines of the code it was made with
+            program.optimize = snapshot.is_optimized
+
+        # the snapshot is taken by the interpreter at the next check, between two lines
+        signal.signal(signal.SIGUSR1, lambda *_: program.interpreter.request_snapshot())
+        signal.signal(signal.SIGTERM, lambda *_: program.interpreter.request_snapshot(is_suspending = True))
+
+    recording, replaying = None, None
+    if record_path is not None or replay_path is not None:
+        import replay
+        from bytecode import get_source_hash
+
+        if record_path is not None:
+            recording = replay.Trace()
+        else:
+            try:
+                replaying = replay.load_file(replay_path, get_source_hash(program.source))
+            except (OSError, replay.TraceError) as error:
+                raise click.ClickException(f"can't replay {replay_path}: {error}")
+
+    metrics = None
+    if stats or prometheus_path is not None:
+        from metrics import Metrics, summary, write_textfile
+        metrics = Metrics()
+    result = None
+
+    try:
+        result = program.run(
+            BufferedInput(input_file), OUTPUTS[buffering](), on_eof = EOFPolicy(on_eof), limits = limits,
+            is_reporting = True, checkpoints = checkpoints, snapshot = snapshot, metrics = metrics,
+            recording = recording, replaying = replaying,
+        )
+
+    # the profile, the metrics and the trace are written even if the program is interrupted
+    finally:
+        if profile:
+            click.echo(program.interpreter.profile.report(), err=True)
+        if profile_output is not None:
+            profile_output.write(program.interpreter.profile.collapsed())
+        if stats:
+            reason = result.reason.value if result is not None else "interrupted"
+            import json
+            click.echo(json.dumps(summary(metrics, program = filename, engine = engine, reason = reason)), err=True)
+        if prometheus_path is not None:
+            write_textfile(prometheus_path, metrics, {"program": os.path.basename(filename)})
+
+        # a trace is started when the run starts
+        if recording is not None and recording.random_state is not None:
+            replay.save(record_path, recording, get_source_hash(program.source))
+
+    if checkpoint_path is not None:
+        if result.reason is ExitReason.SUSPENDED:
+            click.echo(f"the program is saved into {checkpoint_path}", err=True)
+            raise SystemExit(EXIT_SUSPENDED)
+
+        # the state of a finished program mustn't be resumed
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+@cli.command()
+@click.argument("paths", nargs=-1, required=True)
+@click.option("--inputs", type=click.Path(exists=True, file_okay=False), help="Directory with input files <name>.in, the directory of each program by default.")
+@click.option("--engine", type=click.Choice(list(ENGINES)), default="interpreter", show_default=True, help="Execution engine.")
+@click.option("-j", "--jobs", type=click.IntRange(1), help="Number of worker processes, the number of CPUs by default.")
+@click.option("--timeout", type=click.FloatRange(0, min_open=True), help="Time limit of a program in seconds.")
+@click.option("--cache/--no-cache", default=True, show_default=True, help="Keep the parsed programs in .c42c files next to the sources.")
+@click.option("--on-eof", type=click.Choice([policy.value for policy in EOFPolicy]), default=EOFPolicy.ERROR.value, show_default=True, help="What 03 does when the input is over.")
+@limits_options
+def batch(paths, inputs, engine, jobs, timeout, cache, on_eof, limits):
+    """Runs many C42 programs in parallel and prints a JSON line per program"""
+
+    import json
+    from batch import find_programs, run_batch
+
+    programs = find_programs(paths)
+    if not programs:
+        raise click.UsageError("no programs found")
+
+    for report in run_batch(programs, inputs, get_engine(engine), jobs, timeout, cache, EOFPolicy(on_eof), limits):
+        click.echo(json.dumps(report, ensure_ascii=False))
+
+@cli.command()
+@click.option("--socket", "socket_path", help="Path of the Unix socket to listen on, c42-<uid>.sock in the temporary directory by default.")
+@click.option("-w", "--workers", type=click.IntRange(1), default=os.cpu_count() or 1, show_default=True, help="Number of worker processes, each of them runs many programs at once.")
+@click.option("--cache-size", type=click.IntRange(1), default=256, show_default=True, help="Parsed programs kept in memory by every worker.")
+@click.option("-O", "optimization", type=click.IntRange(0, 1), default=1, show_default=True, help="-O0 turns off the optimizer.")
+@click.option("--prometheus", "prometheus_path", type=click.Path(dir_okay=False), help="Count the runs and write the metrics into this file in the Prometheus text format, a file per worker.")
+@limits_options
+def serve(socket_path, workers, cache_size, optimization, prometheus_path, limits):
+    """Runs programs sent by `submit` over a Unix socket, the limits are the most a program can get"""
+
+    from server import DEFAULT_SOCKET, Server, serve as serve_forever
+    socket_path = socket_path or DEFAULT_SOCKET
+
+    click.echo(f"serving on {socket_path} with {workers} workers", err=True)
+    try:
+        serve_forever(socket_path, Server(cache_size, optimization > 0, limits, metrics_path = prometheus_path), workers)
+    except OSError as error:
+        raise click.ClickException(str(error))
+
+@cli.command()
+@click.argument("filename", type=click.Path(exists=True, readable=True))
+@click.option("--socket", "socket_path", help="Path of the server's Unix socket, c42-<uid>.sock in the temporary directory by default.")
+@click.option("--input", "input_file", type=click.File("r", encoding="utf-8"), help="File with the program's input, no input by default.")
+@click.option("--send-source", is_flag=True, help="Send the code itself instead of its path (for a server which can't read the file).")
+@click.option("--seed", type=int, help="Seed of the random choices of 36 commands.")
+@click.option("--on-eof", type=click.Choice([policy.value for policy in EOFPolicy]), default=EOFPolicy.ERROR.value, show_default=True, help="What 03 does when the input is over.")
+@click.option("--stats", is_flag=True, help="Print the latency of the run into stderr.")
+@limits_options
+def submit(filename, socket_path, input_file, send_source, seed, on_eof, stats, limits):
+    """Runs a C42 program on a server started with `serve`"""
+
+    from dataclasses import asdict
+    from server import DEFAULT_SOCKET, submit as submit_request
+    socket_path = socket_path or DEFAULT_SOCKET
+
+    if send_source:
+        with open(filename, "r", encoding="utf-8") as file:
+            request = {"source": file.read()}
+    else:
+        request = {"path": os.path.abspath(filename)}
+
+    request.update(input = input_file.read() if input_file is not None else "", on_eof = on_eof)
+    if seed is not None:
+        request["seed"] = seed
+    if limits is not None:
+        request["limits"] = {name: value for name, value in asdict(limits).items() if value is not None}
+
+    start = time.perf_counter()
+    try:
+        for message in submit_request(socket_path, request):
+            if "output" in message:
+                click.echo(message["output"], nl=False)
+            elif "rejected" in message:
+                raise click.ClickException(f"the server has rejected the program: {message['rejected']}")
+            elif stats:
+                times = message["stats"]
+                click.echo(
+                    f"{message['reason']}, {'cached' if times['cached'] else 'parsed'} in {times['parse_ms']} ms, "
+                    f"run {times['run_ms']} ms, server {times['total_ms']} ms, "
+                    f"round trip {(time.perf_counter() - start) * 1000:.3f} ms",
+                    err=True,
+                )
+    except OSError as error:
+        raise click.ClickException(f"no server on {socket_path}: {error}")
+
+@cli.command()
+@click.argument("filename", type=click.Path(exists=True, readable=True))
+def check(filename):
+    """Finds the lines of a C42 program which fail whenever they run, without running it"""
+
+    with open(filename, "r", encoding="utf-8") as file:
+        code = file.read()
+
+    if not check_program(Interpreter.parse(code)):
+        raise SystemExit(1)
+    click.echo(f"{filename}: no errors found")
+
+def check_program(blocks):
+
+    """
+    Prints the errors found by the verifier, returns true if there are none
+    """
+
+    Interpreter.resolve(blocks)
+    from verifier import verify, report
+
+    diagnostics = verify(blocks)
+    report(diagnostics)
+
+    return not diagnostics
+
+@cli.command()
+@click.argument("filename", type=click.Path(exists=True, readable=True))
+@click.option("-o", "--output", type=click.Path(dir_okay=False, writable=True), help="Path of the module, FILENAME with .py by default.")
+def build(filename, output):
+    """Translates a C42 program into a standalone Python module"""
+
+    with open(filename, "r", encoding="utf-8") as file:
+        code = file.read()
+
+    from transpiler import Transpiler
+
+    output = output or os.path.splitext(filename)[0] + ".py"
+    module = Transpiler(Interpreter.parse(code), os.path.basename(filename)).transpile()
+
+    with open(output, "w", encoding="utf-8") as file:
+        file.write(module)
+    click.echo(f"{filename} -> {output}")
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,308 @@
+import operator, sys, time
+
+from typing import Callable, Mapping
+
+from constants import *
+from cfttypes import *
+
+from cell import *
+from interpreter import Interpreter
+from hooks import Hooks
+from lexer import LazyBlocks
+from optimizer import CONDITIONS # conditions are compiled into direct branches with these comparisons
+from output import Output
+from inputs import Input
+
+
+# a compiled line is a closure without arguments which returns the index of the next line to execute
+CompiledLine = Callable[[], int]
+
+CALLED      = sys.maxsize       # returned by a line which has started a new block (23 and 35 commands)
+RETURNED    = sys.maxsize - 1   # returned by a line with a 42 command
+
+# arithmetic which is compiled inline when both cells have the same numeric type
+ARITHMETIC: dict[int, Callable] = {
+    int(SUM_CELLS):             operator.add,
+    int(SUBTRACT_CELLS):        operator.sub,
+    int(MULTIPLY_CELLS):        operator.mul,
+    int(MODULO_CELLS):          operator.mod,
+}
+
+NUMBER_CELLS = (IntegerCell, FloatCell)
+
+
+class CompiledInterpreter(Interpreter):
+    """
+    Interpreter which compiles every block into a list of closures before execution.
+
+    Each closure captures the cells table, the slots of its cells and the index of the next line,
+    so executing a line is a single call. Conditions jump straight to the right line instead of
+    setting a flag for the main loop. Lines without a compiled fast path (and every error path)
+    fall back to the interpreter's command handlers, so the output and the errors are the same.
+    """
+
+    def __init__(
+            self,
+            source: str,
+            blocks: dict[str, BlockData] | None = None,
+            output: Output | None = None,
+            input: Input | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            limits: Limits | None = None):
+        # the compiler makes its own fast paths, so it takes the lines as they are written
+        super().__init__(source, blocks, output, input, on_eof, optimize = False, limits = limits)
+
+        # the blocks of a lazily parsed program are compiled when they first run
+        self.compiled: Mapping[str, list[CompiledLine]] = (
+            LazyBlocks(self.blocks, lambda name: self.compile_block(self.blocks[name]))
+            if isinstance(self.blocks, LazyBlocks) else
+            {name: self.compile_block(block) for name, block in self.blocks.items()}
+        )
+
+    def reset(
+            self,
+            output: Output | None = None,
+            input: Input | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            limits: Limits | None = None) -> None:
+        super().reset(output, input, on_eof, limits)
+
+        self.__will_skip_next_line: bool        = False # set by a condition at the end of a block, skips the next executed line
+        self.__resume_index: int                = 0     # index to continue the current block from after a new block is finished
+
+    def set_hooks(self, hooks: Hooks | None) -> None:
+
+        # compiled lines run without the main loop, there is nothing to call the hooks from
+        if hooks is not None and not hooks.is_empty():
+            raise ValueError("hooks work only with the interpreter engine")
+
+    # region Interpretation
+    def execute_stack(self) -> None:
+
+        # executed lines are counted only with limits or metrics, by the index a block has run to
+        metrics = self.metrics
+        is_counted = self.limits is not None or metrics is not None
+        executed = 0
+        next_check = self.check_limits(executed) if is_counted else sys.maxsize
+
+        index = start = 0
+        is_running = False # true while the lines of a block run, the program can stop in the middle of them
+        started = time.perf_counter()
+
+        try:
+            while self.execution_stack:
+                frame = self.execution_stack.pop()
+
+                # ------
+                if frame.block_name not in self.compiled:
+
+                    # if enter block doesn't exists
+                    if frame.block_name == ENTER_BLOCK:
+                        self.handle_error("CFTE11")
+
+                    # else if it's another block called from code and it doesn't exists
+                    else:
+                        self.handle_error("CFTE10", name = frame.block_name)
+                # ------
+
+                if metrics is not None:
+                    self.count_block(frame, len(self.execution_stack) + 1)
+
+                lines = self.compiled[frame.block_name]
+                length = len(lines)
+                index = frame.index
+
+                # a looped block starts its next iteration here, in the same frame
+                while True:
+                    start = index
+                    is_running = True
+
+                    # a condition at the end of the previous block (or iteration) skips the first line executed here
+                    if self.__will_skip_next_line and index < length:
+                        self.__will_skip_next_line = False
+                        self.skipped += 1
+                        index += 1
+
+                    while index < length:
+                        index = lines[index]()
+
+                    is_running = False
+                    if is_counted:
+                        executed += (index if index <= length else self.__resume_index) - start - self.skipped
+                        self.skipped = 0
+                        if executed >= next_check:
+                            next_check = self.check_limits(executed)
+
+                    if index == RETURNED or not frame.is_looping:
+                        break
+                    index = 0
+                    if metrics is not None:
+                        metrics.loop_iterations += 1
+
+                # the same rules as in the interpreter: a looped block starts again (above),
+                # a block which has called another one continues after the new block is finished,
+                # the frame is put under the new block
+                if index == CALLED and self.__resume_index < length:
+                    frame.index = self.__resume_index
+                    self.execution_stack.append(self.execution_stack[-1])
+                    self.execution_stack[-2] = frame
+
+        # the line which has stopped the program is counted too
+        finally:
+            if metrics is not None:
+                self.finish_metrics(executed + (index - start + 1 - self.skipped if is_running else 0), started)
+    #endregion
+
+    #region Compiler
+    def compile_block(self, block: BlockData) -> list[CompiledLine]:
+
+        """
+        Compiles every line of the block into a closure
+        """
+
+        length = len(block.code)
+        return [self.compile_line(instruction, index, length) for index, instruction in enumerate(block.code)]
+
+    def compile_line(self, instruction: Instruction, index: int, length: int) -> CompiledLine:
+
+        """
+        Returns a closure that executes the instruction and returns the index of the next line
+        """
+
+        opcode = instruction.opcode
+
+        if opcode in CONDITIONS:
+            return self.compile_condition(instruction, index, length)
+        if opcode in ARITHMETIC:
+            return self.compile_arithmetic(instruction, index)
+        if opcode == int(INCREMENT_CELL) or opcode == int(DECREMENT_CELL):
+            return self.compile_step(instruction, index)
+        if opcode == int(COPY_CELL):
+            return self.compile_copy(instruction, index)
+        if opcode == int(CALL_BLOCK) or opcode == int(START_LOOP):
+            return self.compile_call(instruction, index)
+        if opcode == int(RETURN):
+            return self.compile_return(index)
+
+        return self.compile_generic(instruction, index)
+
+    def compile_generic(self, instruction: Instruction, index: int) -> CompiledLine:
+        execute = self.execute_instruction
+        next_index = index + 1
+
+        def line() -> int:
+            execute(instruction)
+            return next_index
+
+        return line
+
+    def compile_condition(self, instruction: Instruction, index: int, length: int) -> CompiledLine:
+        compare = CONDITIONS[instruction.opcode]
+        cells, execute = self.cells, self.execute_instruction
+        slot1, slot2 = instruction.cells
+        next_index, skip_index = index + 1, index + 2
+
+        # the condition is the last line of the block, so a false result skips a line of the next executed block
+        if skip_index > length:
+            def skip() -> int:
+                self.__will_skip_next_line = True
+                return next_index
+        else:
+            def skip() -> int:
+                self.skipped += 1
+                return skip_index
+
+        def line() -> int:
+            cell1, cell2 = cells[slot1], cells[slot2]
+            if cell1 is None or cell2 is None:
+                execute(instruction)
+
+            return next_index if compare(cell1.value, cell2.value) else skip()
+
+        return line
+
+    def compile_arithmetic(self, instruction: Instruction, index: int) -> CompiledLine:
+        calculate = ARITHMETIC[instruction.opcode]
+        cells, execute = self.cells, self.execute_instruction
+        slot1, slot2 = instruction.cells
+        next_index = index + 1
+
+        def line() -> int:
+            cell1, cell2 = cells[slot1], cells[slot2]
+
+            if type(cell1) is type(cell2) and isinstance(cell1, NUMBER_CELLS):
+                cell1.value = calculate(cell1.value, cell2.value)
+            else:
+                execute(instruction)
+
+            return next_index
+
+        return line
+
+    def compile_step(self, instruction: Instruction, index: int) -> CompiledLine:
+        step = 1 if instruction.opcode == int(INCREMENT_CELL) else -1
+        cells, execute = self.cells, self.execute_instruction
+        slot = instruction.cells[0]
+        next_index = index + 1
+
+        def line() -> int:
+            cell = cells[slot]
+
+            if isinstance(cell, NUMBER_CELLS):
+                cell.value += step
+            else:
+                execute(instruction)
+
+            return next_index
+
+        return line
+
+    def compile_copy(self, instruction: Instruction, index: int) -> CompiledLine:
+        cells, execute = self.cells, self.execute_instruction
+        slot1, slot2 = instruction.cells
+        next_index = index + 1
+
+        def line() -> int:
+            cell1, cell2 = cells[slot1], cells[slot2]
+
+            if cell1 is not None and type(cell1) is type(cell2):
+                cell1.value = cell2.value
+            else:
+                execute(instruction)
+
+            return next_index
+
+        return line
+
+    def compile_return(self, index: int) -> CompiledLine:
+        resume_index = index + 1
+
+        # the index after the 42 is kept only for the count of executed lines
+        def line() -> int:
+            self.__resume_index = resume_index
+            return RETURNED
+
+        return line
+
+    def compile_call(self, instruction: Instruction, index: int) -> CompiledLine:
+        is_looping = instruction.opcode == int(START_LOOP)
+        cells, blocks = self.cells, self.blocks
+        slot = instruction.cells[0]
+        resume_index = index + 1
+
+        def line() -> int:
+            cell = cells[slot]
+            if cell is None:
+                self.execute_instruction(instruction)
+
+            # 23 calls a block by the string version of the cell's value, 35 uses the value as it is
+            block_name = cell.value if is_looping else str(cell.value)
+            if block_name not in blocks:
+                self.handle_error("CFTE10", name = cell.value)
+
+            self.execute_block(block_name, is_looping, 0)
+            self.__resume_index = resume_index
+            return CALLED
+
+        return line
+    #endregion
@@ -1,5 +1,8 @@
 # all constants of C42
 
+VERSION = "1.1o" # version of the interpreter
+DEFAULT_PROGRAM = "src/Examples/testing conditions.cft" # program of the `run` command without FILENAME, and of main.py without arguments
+
 EXIT                = "01" # Завершение программы.
 PRINT               = "02" # Вывод ячейки.
 INPUT               = "03" # Запись пользовательских данных в ячейку.
@@ -47,4 +50,38 @@ RETURN              = "42" # Возвращение из блока.
 START_BLOCK     = "#1"      # start of the block
 END_BLOCK       = "#0"      # end of the block
 ENTER_BLOCK     = "main"    # enter block of program
-COMMENT_SYMBOL  = '$'       # the symbol to start a comment line
\ No newline at end of file
+COMMENT_SYMBOL  = '$'       # the symbol to start a comment line
+
+
+# number of arguments each command takes, extra arguments in a line are ignored
+ARGUMENTS_COUNT: dict[str, int] = {
+    EXIT: 0,                PRINT: 1,               INPUT: 1,               ASSIGN_VALUE: 2,
+    SUM_CELLS: 2,           SUBTRACT_CELLS: 2,      MULTIPLY_CELLS: 2,      DIVIDE_CELLS: 2,
+    INCREMENT_CELL: 1,      DECREMENT_CELL: 1,      MODULO_CELLS: 2,        CLEAR_CONSOLE: 0,
+    EQUAL_CELLS: 2,         NOT_EQUAL_CELLS: 2,     GREATER_THAN_CELLS: 2,  LESS_THAN_CELLS: 2,
+    GREATER_EQUAL_CELLS: 2, LESS_EQUAL_CELLS: 2,    UPPERCASE_CELL: 1,      LOWERCASE_CELL: 1,
+    LENGTH_CELL: 2,         INVERT_CELL: 1,         CALL_BLOCK: 1,          ADD_CONSTANT: 2,
+    SWAP_CELLS: 2,          COPY_CELL: 2,           DELETE_CHAR: 2,         STRING_TO_INT: 2,
+    INT_TO_STRING: 2,       BITWISE_AND: 2,         BITWISE_OR: 2,          BITWISE_XOR: 2,
+    BITWISE_NOT: 1,         SLEEP: 1,               START_LOOP: 1,          RANDOM_CHAR: 2,
+    MAX_CELLS: 2,           MIN_CELLS: 2,           GCD_CELLS: 2,           LCM_CELLS: 2,
+    CREATE_CELL: 2,         RETURN: 0,
+}
+
+# opcodes of decoded lines which aren't real commands
+UNDEFINED_COMMAND   = 0     # the command doesn't exist (CFTE3)
+INVALID_SYNTAX      = 43    # the command has not enough arguments (CFTE12)
+
+# opcodes of superinstructions made by the optimizer (see optimizer.py)
+FUSED_LINES         = 44    # two lines executed by one dispatch
+COMPARE_JUMP        = 45    # a condition with a 42 or 23 line under it
+ASSIGN_CONSTANT     = 46    # a 04 command with the value converted in advance
+STEP_CONDITION      = 47    # a 09 or 10 command with a condition under it
+
+# opcodes of typed commands made by the optimizer when the verifier has proven the types of the cells (see verifier.py)
+TYPED_ARITHMETIC    = 48    # an arithmetic command of two cells without the type checks
+TYPED_STEP          = 49    # 09, 10 or 24 with the step converted to the type of the cell
+TYPED_COPY          = 50    # a 26 command of cells of the same type
+TYPED_CONDITION     = 51    # a condition of two existing cells
+
+OPCODES_COUNT       = 52    # size of the tables indexed by opcode
@@ -1,22 +1,55 @@
-from colorama import Fore
-
 class Exception:
     def __init__(
             self,
             error_number: str,
             message: str,
             line: int | None = None,
-            command_in_string: str | None = None) -> None:
+            command_in_string: str | None = None,
+            file = None) -> None:
+
+        # colorama is imported by the first error, a program without errors doesn't need it
+        from colorama import Fore
 
         if command_in_string is not None:
-            print(f"\n\n  -> {command_in_string}")
+            print(f"\n\n  -> {command_in_string}", file = file)
         if line is not None:
-            print(f"{Fore.CYAN}[{line}] {Fore.RESET}{error_number} : {Fore.RED}{message}{Fore.RESET}")
+            print(f"{Fore.CYAN}[{line}] {Fore.RESET}{error_number} : {Fore.RED}{message}{Fore.RESET}", file = file)
         else:
-            print(f"{error_number} : {Fore.RED}{message}{Fore.RESET}")
+            print(f"{error_number} : {Fore.RED}{message}{Fore.RESET}", file = file)
+
+class ProgramExit(SystemExit):
+    """
+    Raised when a program is finished (by the end of the main block, a 01 command or an error).
+    It's a SystemExit, so the interpreter's process exits if nobody catches it.
+    """
 
+    def __init__(self, error_number: str | None = None) -> None:
+        super().__init__()
+        self.error_number = error_number # code of the error which has stopped the program (e.g. "CFTE8"), None if there was no error
+
+
+# errors of the resource limits (see Limits in cfttypes)
+LIMIT_ERRORS = ("CFTE14", "CFTE15", "CFTE16", "CFTE17", "CFTE18")
 
 ERRORS: dict[str, str] = {
+    # CALL DEPTH LIMIT
+    "CFTE18": "Превышена максимальная глубина вызовов блоков ({limit})",
+
+    # CELLS LIMIT
+    "CFTE17": "Превышено максимальное количество ячеек ({limit})",
+
+    # STRINGS LIMIT
+    "CFTE16": "Превышена максимальная общая длина строк в ячейках ({limit})",
+
+    # TIME LIMIT
+    "CFTE15": "Превышено максимальное время выполнения ({limit} с)",
+
+    # INSTRUCTIONS LIMIT
+    "CFTE14": "Превышено максимальное количество выполненных команд ({limit})",
+
+    # END OF INPUT
+    "CFTE13": "Входные данные закончились",
+
     # INVALID SYNTAX
     "CFTE12": "Недопустимый синтаксис",
 
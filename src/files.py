@@ -0,0 +1,30 @@
+"""
+Files the interpreter writes for later runs and for other programs: the cache of parsed programs (.c42c),
+snapshots (.c42s), traces (.c42r) and the metrics for the textfile collector.
+"""
+
+import os
+
+
+def write_atomically(path: str, data: bytes, is_durable: bool = False) -> None:
+
+    """
+    Writes the data into a temporary file next to the path and puts it in the place of the file at once,
+    so a reader never finds a half-written file and the old file stays whole if the write fails.
+    A durable write is flushed to the disk before the file is replaced. Raises OSError if the file can't be written
+    """
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, "wb") as file:
+            file.write(data)
+            if is_durable:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except OSError:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,101 @@
+"""
+Execution hooks: callbacks of debuggers, tracers and coverage tools, called by the interpreter while a program runs.
+
+    hooks = Hooks()
+    hooks.on_instruction.append(lambda event: print(event.line_number, event.text))
+    hooks.on_cell_write.append(lambda event: print(event.name, "=", event.value))
+    program.run(hooks = hooks)
+
+The interpreter switches to a separate instrumented loop only when a run has hooks (see Interpreter.set_hooks),
+so the loop of a run without them stays the same and costs nothing more. Hooks work with the interpreter engine only.
+
+Every line is reported as it's written: a superinstruction of the optimizer runs its first line, and the second one
+is executed after it as a line of its own. A callback runs between two lines, so it can read the cells of the
+interpreter (`symbols` and `cells`) and block the run (a step debugger waits for the user there), and an exception
+raised by a callback stops the program.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+from constants import *
+from cfttypes import *
+
+from cell import Cell
+
+
+# arguments of the commands which are cells the command writes into
+WRITTEN_CELLS: dict[int, tuple[int, ...]] = {
+    opcode: (0,) for opcode in (
+        int(INPUT), int(ASSIGN_VALUE), int(SUM_CELLS), int(SUBTRACT_CELLS), int(MULTIPLY_CELLS),
+        int(DIVIDE_CELLS), int(INCREMENT_CELL), int(DECREMENT_CELL), int(MODULO_CELLS), int(UPPERCASE_CELL),
+        int(LOWERCASE_CELL), int(LENGTH_CELL), int(INVERT_CELL), int(ADD_CONSTANT), int(COPY_CELL),
+        int(DELETE_CHAR), int(STRING_TO_INT), int(INT_TO_STRING), int(BITWISE_AND), int(BITWISE_OR),
+        int(BITWISE_XOR), int(BITWISE_NOT), int(RANDOM_CHAR), int(MAX_CELLS), int(MIN_CELLS),
+        int(GCD_CELLS), int(LCM_CELLS), int(CREATE_CELL),
+        ASSIGN_CONSTANT, TYPED_ARITHMETIC, TYPED_STEP, TYPED_COPY,
+    )
+}
+WRITTEN_CELLS[int(SWAP_CELLS)] = (0, 1)
+
+# superinstructions of two lines, the instrumented loop runs only their first line (see optimizer.py)
+TWO_LINES = (FUSED_LINES, COMPARE_JUMP, STEP_CONDITION)
+
+
+@dataclass(slots=True)
+class InstructionEvent:
+    """
+    A line which is about to be executed.
+    """
+
+    block_name: str             # block of the line
+    index: int                  # index of the line in the code of the block
+    line_number: int            # line number in the source code
+    text: str                   # the whole line in string version
+    instruction: Instruction    # the decoded line as the interpreter executes it
+
+
+@dataclass(slots=True)
+class BlockEvent:
+    """
+    A block which has started or finished: called by 23, started or restarted by 35, finished at its end or by 42.
+    """
+
+    block_name: str     # name of the block
+    is_looping: bool    # true if the block is the body of a 35 loop (every iteration is entered and finished)
+    depth: int          # blocks waiting for this one on the execution stack
+    is_returned: bool   # true if the block has been finished by 42, always false when a block starts
+
+
+@dataclass(slots=True)
+class CellWriteEvent:
+    """
+    A cell which a line has written into (or created, with 41). The value is read when it's asked for,
+    a callback which doesn't need it doesn't join the text appended to a string cell.
+    """
+
+    name: str           # name of the cell
+    cell: Cell          # the cell after the line
+    line_number: int    # line number in the source code
+    text: str           # the whole line in string version
+
+    @property
+    def value(self) -> int | float | str:
+        return self.cell.value
+
+
+class Hooks:
+    """
+    Callbacks of a run, every list is called in order with the events of its kind.
+    Errors are reported to `on_error` as the ProgramError which stops the program.
+    """
+
+    def __init__(self) -> None:
+        self.on_instruction: list[Callable[[InstructionEvent], None]]   = []
+        self.on_block_enter: list[Callable[[BlockEvent], None]]         = []
+        self.on_block_exit: list[Callable[[BlockEvent], None]]          = []
+        self.on_cell_write: list[Callable[[CellWriteEvent], None]]      = []
+        self.on_error: list[Callable[[ProgramError], None]]             = []
+
+    def is_empty(self) -> bool:
+        return not (self.on_instruction or self.on_block_enter or self.on_block_exit or self.on_cell_write or self.on_error)
@@ -0,0 +1,97 @@
+import codecs, sys
+
+from typing import BinaryIO, Iterable
+
+
+class Input:
+    """
+    Base class of input sources, every value a program reads (03 command) comes from a source.
+    """
+
+    def readline(self) -> str | None:
+
+        """
+        Returns the next line without its line break, None if the input is over
+        """
+
+        raise NotImplementedError
+
+    def is_ready(self) -> bool:
+
+        """
+        Returns true if the next line can be returned without waiting for the stream
+        """
+
+        return True
+
+class BufferedInput(Input):
+    """
+    Reads the stream in large chunks and hands out lines from memory.
+
+    A chunk is whatever the stream has at the moment (up to chunk_size bytes), so reading
+    never waits for more data than the program asked for and interactive input still works.
+    """
+
+    def __init__(self, stream: BinaryIO | None = None, chunk_size: int = 65536) -> None:
+        self.stream = stream if stream is not None else sys.stdin.buffer
+        self.chunk_size = chunk_size
+
+        self.__decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.__lines: list[str] = []    # complete lines which aren't read yet, in reversed order
+        self.__tail: str        = ""    # beginning of the line which isn't finished in the stream yet
+        self.__is_over: bool    = False # true if the stream has no more data
+
+    def readline(self) -> str | None:
+        while not self.__lines:
+            if self.__is_over:
+                return None
+            self.__fill()
+
+        return self.__lines.pop()
+
+    def is_ready(self) -> bool:
+        return bool(self.__lines) or self.__is_over
+
+    def __fill(self) -> None:
+
+        """
+        Reads the next chunk of the stream and splits it into lines
+        """
+
+        read = getattr(self.stream, "read1", self.stream.read)
+        chunk = read(self.chunk_size)
+
+        if chunk:
+            text = self.__tail + self.__decoder.decode(chunk)
+        else:
+            text = self.__tail + self.__decoder.decode(b"", True)
+            self.__is_over = True
+
+            # the last line of the stream doesn't have to end with a line break
+            if text:
+                text += "\n"
+
+        lines = text.split("\n")
+        self.__tail = lines.pop()
+        self.__lines = [line[:-1] if line.endswith("\r") else line for line in reversed(lines)]
+
+class IterableInput(Input):
+    """
+    Hands out lines from an iterable of strings, for embedding the interpreter and for tests.
+    """
+
+    def __init__(self, lines: Iterable[str]) -> None:
+        self.__lines = iter(lines)
+
+    def readline(self) -> str | None:
+        line = next(self.__lines, None)
+        return line.rstrip("\r\n") if line is not None else None
+
+
+def get_default_input() -> Input:
+
+    """
+    Returns a buffered source of the standard input
+    """
+
+    return BufferedInput(sys.stdin.buffer)
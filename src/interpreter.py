@@ -1,534 +1,1093 @@
-import re, os, sys, time, random, math
-import exception
+import sys, time
+import exception, optimizer, lexer
 
-from typing import NoReturn
+from typing import TYPE_CHECKING, Callable, Mapping, NoReturn
 
 from constants import *
 from cfttypes import *
 
 from cell import *
+from output import Output, decode_escapes, get_default_output
+from inputs import Input, get_default_input
+
+# a plain run doesn't need these, they are imported by the methods which use them (see benchmarks/startup.py)
+if TYPE_CHECKING:
+    import random, checkpoint
+    from hooks import Hooks
+    from metrics import Metrics
+    from replay import Trace
 
 
 class Interpreter:
-    def __init__(self, source: str):
+    def __init__(
+            self,
+            source: lexer.Source,
+            blocks: Mapping[str, BlockData] | None = None,
+            output: Output | None = None,
+            input: Input | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            optimize: bool = True,
+            limits: Limits | None = None,
+            prepared: PreparedCode | None = None):
+
+        self.source: lexer.Source                   = source # code of the program, snapshots keep its hash
+
+        if prepared is None:
+            blocks = blocks if blocks is not None else self.parse(source) # blocks can be already parsed (e.g. loaded from a .c42c file)
+
+            self.symbols: dict[str, int]            = {}    # slots of cells in the cells table by their names
+            self.cells: list[Cell | None]           = []    # table of all cells of the program, None until a cell is created
+            self.constants: dict[str, tuple[int | None, float | None, str]] = {} # constant pool: values of 04 and 24 commands decoded once
+            self.blocks: Mapping[str, BlockData]    = self.prepare(blocks, optimize) # code with superinstructions and typed commands (see optimizer.py)
+            self.is_optimized: bool                 = optimize
+
+        # the code prepared by another interpreter of the program is shared, `blocks` and `optimize` aren't used then
+        else:
+            self.symbols                            = prepared.symbols
+            self.cells                              = [None] * len(prepared.symbols)
+            self.constants                          = prepared.constants
+            self.blocks                             = prepared.blocks
+            self.is_optimized                       = prepared.is_optimized
 
-        self.cells: dict[str, Cell]                 = {}    # dict of all cells of the program
         self.execution_stack: list[ExecutionFrame]  = []    # stack of all executing blocks
-        
+        self.is_reporting: bool                     = True  # if false, errors and "[Program Finished]" aren't written into the output (see program.py)
+
+        self.reset(output, input, on_eof, limits)
+
+    def reset(
+            self,
+            output: Output | None = None,
+            input: Input | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            limits: Limits | None = None) -> None:
+
+        """
+        Prepares the interpreter for a new run of the program: empty cells, new streams and limits.
+        The parsed and optimized code stays, so a program can be run many times by one interpreter
+        """
+
+        # the table is cleared in place, compiled code keeps a reference to it
+        self.cells[:] = [None] * len(self.cells)
+        self.execution_stack.clear()
+
+        self.output: Output                         = output if output is not None else get_default_output() # sink of everything the program prints
+        self.input: Input                           = input if input is not None else get_default_input() # source of everything the program reads
+        self.on_eof: EOFPolicy                      = on_eof # what 03 does when the input is over
+        self.limits: Limits | None                  = limits # resource limits of the run, nothing is counted without them
+        self.random: random.Random | None           = None  # source of 36 commands, seeded for reproducible runs, see get_random
+        self.error_number: str | None               = None  # code of the error that has stopped the program
+        self.error: ProgramError | None             = None  # the error that has stopped the program with its line
+        self.exit_reason: ExitReason | None         = None  # why the program has stopped, None while it runs
+        self.checkpoints: Checkpoints | None        = None  # where the state of the run is saved, see set_checkpoints
+        self.hooks: Hooks | None                    = None  # callbacks of a debugger or a tracer, see set_hooks
+        self.metrics: Metrics | None                = None  # counters the run adds to, see set_metrics
+        self.clock: Clock                           = Clock() # time of 34 commands and of the time limit, virtual in a replay (see replay.py)
+        self.skipped: int                           = 0     # lines skipped by false conditions since the last count, they aren't executed
+
         self.__current_frame: ExecutionFrame        = None  # metadata of current block 
         self.__will_skip_next_line: bool            = False # if true, the next line'll be skipped (using only in conditions)
         self.__is_return_called: bool               = False # if true, the current executing block'll be finished
         self.__is_executing_new_block: bool         = False # if true, the program will start executing a new block
-        self.__cls_command: str                     = "cls" if sys.platform == "win32" else "clear -r" # for 12's command
-        self.__current_line: list[str]              = None  # value of current line with command and its args
-        self.__current_line_number: int             = None  # value of line number of current command
-        self.__current_line_str: str                = None  # value of current command in string version
-
-        self.blocks: dict[str, BlockData] = self.parse(source)
+        self.__current_instruction: Instruction     = None  # decoded current command with its args and line number
+        self.__deadline: float | None               = None  # time of the clock when the time limit is over, set by the first check
+        self.__created_cells: int                   = 0     # cells created by 41 commands, counted only with the cells limit
+        self.__max_depth: int                       = limits.depth if limits is not None and limits.depth is not None else sys.maxsize
+        self.__executed: int                        = 0     # lines executed before the run, restored from a snapshot
+        self.__lines_read: int                      = 0     # lines read by 03 commands
+        self.__next_snapshot: int                   = sys.maxsize # executed lines to save the next snapshot at, 0 saves it at the next check
+        self.__is_suspending: bool                  = False # if true, the program stops after the next snapshot
+        self.__handlers: list[Callable]             = self.limit_handlers(self.get_handlers()) # handlers of commands, indexed by opcode
     
     # region Interpretation
     def interpret(self) -> None:
 
-        self.execute_block(ENTER_BLOCK, False, 0)
+        # a run restored from a snapshot goes on with its execution stack
+        if not self.execution_stack:
+            self.execute_block(ENTER_BLOCK, False, 0)
 
-        while self.execution_stack:
-            self.__current_frame = self.execution_stack.pop()
-            current_block: BlockData = self.blocks[self.__current_frame.block_name]
+        # the output is buffered, so it has to be flushed even if the program's crashed
+        try:
+            self.execute_stack()
+        finally:
+            self.output.flush()
+        
+        self.cft_exit()
 
-            # ------
-            if self.__current_frame.block_name not in self.blocks:
+    def execute_stack(self) -> None:
 
-                # if enter block doesn't exists
-                if self.__current_frame.block_name == ENTER_BLOCK:
-                    self.handle_error("CFTE11")
+        """
+        Executes blocks from the execution stack until it's empty
+        """
 
-                # else if it's another block called from code and it doesn't exists
-                else:
-                    self.handle_error("CFTE10", name = self.__current_frame.block_name)
-            # ------
-
-            while self.__current_frame.index < len(current_block.data):
-
-                self.__current_line         = current_block.data[self.__current_frame.index][1]
-                self.__current_line_number  = current_block.data[self.__current_frame.index][0]
-                self.__current_line_str     = " ".join(self.__current_line)
-
-                # if a condition block was called and it returned true, then the next command'll be skipped
-                if self.__will_skip_next_line:
-                    self.__will_skip_next_line = False
-                    self.__current_frame.index += 1
-                    continue
-
-                # interpreting a command
-                self.interpret_line()
-                self.__current_frame.index += 1
-                # ------
-                
-                # if return called (a 42 command) or a new block's started executing, then current block'll break
-                if self.__is_return_called or self.__is_executing_new_block:
-                    break
-            
-            # when the block has ended and the block's looped and the return command's not been called, the block'll start again
-            if self.__current_frame.is_looping and not self.__is_return_called:
-                self.execute_block(self.__current_frame.block_name, self.__current_frame.is_looping, 0)
-
-            # if a new block has started and the current block has not yet finished, the program will add the current block
-            # to the execution stack to execute the remaining instruction in the old block after the new one is finished
-            elif self.__is_executing_new_block and self.__current_frame.index < len(current_block.data):
-                self.execute_block(self.__current_frame.block_name, self.__current_frame.is_looping, self.__current_frame.index)
-                self.execution_stack[-1], self.execution_stack[-2] = self.execution_stack[-2], self.execution_stack[-1]
-
-            self.__is_return_called       = False
-            self.__is_executing_new_block = False
-        
-        self.cft_exit()
+        if self.hooks is not None:
+            return self.execute_stack_hooked()
+        if self.limits is not None or self.checkpoints is not None or self.metrics is not None:
+            return self.execute_stack_counted()
+
+        enter_frame, execute_lines, leave_frame = self.enter_frame, self.execute_lines, self.leave_frame
+        stack = self.execution_stack
+
+        while stack:
+            frame = enter_frame()
+            execute_lines(frame)
+
+            # the next iteration of a loop runs in the same frame, without going through the stack
+            while leave_frame(frame):
+                execute_lines(frame)
+
+    def execute_stack_counted(self) -> None:
+
+        """
+        The same as execute_stack, but counts the executed lines, checks the limits every `check_interval` of them,
+        saves snapshots and fills the metrics. The state is complete after leave_frame, a snapshot is taken there
+        """
+
+        enter_frame, execute_lines, leave_frame = self.enter_frame, self.execute_lines, self.leave_frame
+        stack = self.execution_stack
+        metrics = self.metrics
+
+        executed = self.__executed
+        next_check = self.check_limits(executed) if self.limits is not None or metrics is not None else sys.maxsize
+        frame, start = None, 0 # the lines of the frame from `start` aren't counted yet
+        started = time.perf_counter()
+
+        try:
+            while stack:
+                frame = enter_frame()
+                start = frame.index
+                if metrics is not None:
+                    self.count_block(frame, len(stack) + 1)
+
+                while True:
+                    execute_lines(frame)
+                    executed += frame.index - start - self.skipped
+                    self.skipped = 0
+                    is_restarted = leave_frame(frame)
+                    start = frame.index
+
+                    if is_restarted and metrics is not None:
+                        metrics.loop_iterations += 1
+
+                    if executed >= next_check:
+                        next_check = self.check_limits(executed)
+
+                    # read on every iteration, a signal handler can ask for a snapshot at any time.
+                    # A program with nothing left to run is finished, it isn't saved
+                    if executed >= self.__next_snapshot and (stack or is_restarted):
+                        self.save_snapshot(executed, frame if is_restarted else None)
+
+                    if not is_restarted:
+                        break
+
+        # the program can stop in the middle of a block (01 or an error), its lines are counted too
+        finally:
+            if metrics is not None:
+                self.finish_metrics(executed + (frame.index - start - self.skipped if frame is not None else 0) - self.__executed, started)
+
+    def execute_stack_hooked(self) -> None:
+
+        """
+        The same as execute_stack_counted, but the lines run by execute_lines_hooked and the hooks
+        of the blocks are called when a block starts and finishes (see hooks.py)
+        """
+
+        from hooks import BlockEvent
+
+        hooks = self.hooks
+        enter_frame, execute_lines, leave_frame = self.enter_frame, self.execute_lines_hooked, self.leave_frame
+        stack = self.execution_stack
+        metrics = self.metrics
+
+        executed = self.__executed
+        next_check = self.check_limits(executed) if self.limits is not None or metrics is not None else sys.maxsize
+        frame, start = None, 0
+        started = time.perf_counter()
+
+        try:
+            while stack:
+                frame = enter_frame()
+                start = frame.index
+                if metrics is not None:
+                    self.count_block(frame, len(stack) + 1)
+
+                # a block which goes on after a block it has called doesn't start again
+                if frame.index == 0:
+                    for callback in hooks.on_block_enter:
+                        callback(BlockEvent(frame.block_name, frame.is_looping, len(stack), False))
+
+                while True:
+                    execute_lines(frame)
+                    executed += frame.index - start - self.skipped
+                    self.skipped = 0
+
+                    # read before leave_frame resets them
+                    is_finished, is_returned = not self.__is_executing_new_block, self.__is_return_called
+                    is_restarted = leave_frame(frame)
+                    start = frame.index
+
+                    if is_finished:
+                        for callback in hooks.on_block_exit:
+                            callback(BlockEvent(frame.block_name, frame.is_looping, len(stack), is_returned))
+                    if is_restarted:
+                        if metrics is not None:
+                            metrics.loop_iterations += 1
+                        for callback in hooks.on_block_enter:
+                            callback(BlockEvent(frame.block_name, frame.is_looping, len(stack), False))
+
+                    if executed >= next_check:
+                        next_check = self.check_limits(executed)
+
+                    if executed >= self.__next_snapshot and (stack or is_restarted):
+                        self.save_snapshot(executed, frame if is_restarted else None)
+
+                    if not is_restarted:
+                        break
+
+        finally:
+            if metrics is not None:
+                self.finish_metrics(executed + (frame.index - start - self.skipped if frame is not None else 0) - self.__executed, started)
+
+    def enter_frame(self) -> ExecutionFrame:
+
+        """
+        Takes the next block from the execution stack, the block has to exist
+        """
+
+        self.__current_frame = self.execution_stack.pop()
+
+        # ------
+        if self.__current_frame.block_name not in self.blocks:
+
+            # if enter block doesn't exists
+            if self.__current_frame.block_name == ENTER_BLOCK:
+                self.handle_error("CFTE11")
+
+            # else if it's another block called from code and it doesn't exists
+            else:
+                self.handle_error("CFTE10", name = self.__current_frame.block_name)
+        # ------
+
+        return self.__current_frame
+
+    def execute_lines(self, frame: ExecutionFrame) -> None:
+
+        """
+        Executes lines of the block from the frame's index until the block's finished or a handler interrupts it
+        """
+
+        handlers = self.__handlers
+        code: list[Instruction] = self.blocks[frame.block_name].code
+        length = len(code)
+
+        while frame.index < length:
+
+            instruction = code[frame.index]
+            frame.index += 1
+
+            # if a condition block was called and it returned true, then the next command'll be skipped
+            if self.__will_skip_next_line:
+                self.__will_skip_next_line = False
+                self.skipped += 1
+                continue
+
+            # interpreting a command, a handler returns true if return called (a 42 command) or
+            # a new block's started executing, then current block'll break
+            self.__current_instruction = instruction
+            if handlers[instruction.opcode](instruction):
+                break
+
+    def execute_lines_hooked(self, frame: ExecutionFrame) -> None:
+
+        """
+        The same as execute_lines, but calls the hooks of the lines and of the cells they write into.
+        A superinstruction of two lines runs only its first line, the second one is the next line of the block
+        """
+
+        from hooks import InstructionEvent, CellWriteEvent, WRITTEN_CELLS, TWO_LINES
+
+        hooks = self.hooks
+        handlers = self.__handlers
+        cells = self.cells
+        code: list[Instruction] = self.blocks[frame.block_name].code
+        length = len(code)
+
+        while frame.index < length:
+
+            index = frame.index
+            instruction = code[index]
+            frame.index += 1
+
+            if self.__will_skip_next_line:
+                self.__will_skip_next_line = False
+                self.skipped += 1
+                continue
+
+            if instruction.opcode in TWO_LINES:
+                instruction = instruction.operands[0]
+
+            for callback in hooks.on_instruction:
+                callback(InstructionEvent(frame.block_name, index, instruction.line_number, instruction.text, instruction))
+
+            self.__current_instruction = instruction
+            is_interrupted = handlers[instruction.opcode](instruction)
+
+            if hooks.on_cell_write:
+                for argument in WRITTEN_CELLS.get(instruction.opcode, ()):
+                    event = CellWriteEvent(instruction.args[argument], cells[instruction.cells[argument]], instruction.line_number, instruction.text)
+                    for callback in hooks.on_cell_write:
+                        callback(event)
+
+            if is_interrupted:
+                break
+
+    def leave_frame(self, frame: ExecutionFrame) -> bool:
+
+        """
+        Schedules what runs after the block: the rest of it, the next iteration of a loop or nothing.
+        Returns true if the frame is reset for the next iteration of a loop
+        """
+
+        is_restarted = False
+
+        # when the block has ended and the block's looped and the return command's not been called, the block'll start again
+        if frame.is_looping and not self.__is_return_called:
+            frame.index = 0
+            is_restarted = True
+
+        # if a new block has started and the current block has not yet finished, the frame is put under the new block
+        # in the execution stack to execute the remaining instructions after the new one is finished
+        elif self.__is_executing_new_block and frame.index < len(self.blocks[frame.block_name].code):
+            stack = self.execution_stack
+            stack.append(stack[-1])
+            stack[-2] = frame
+
+        self.__is_return_called       = False
+        self.__is_executing_new_block = False
+
+        return is_restarted
     #endregion
     
     #region Commands
-    def interpret_line(self) -> None:
-        _COMMAND = self.get_argument(LineArgument.COMMAND)
+    def get_handlers(self) -> list[Callable[[Instruction], bool | None]]:
 
-        if _COMMAND == EXIT:
-            self.cft_exit()
+        """
+        Returns the table of command handlers indexed by opcode.
+        A handler returns true if the current block has to be interrupted
+        """
+
+        handlers = [self.command_undefined] * OPCODES_COUNT
+        commands = {
+            EXIT:                   self.command_exit,
+            PRINT:                  self.command_print,
+            INPUT:                  self.command_input,
+            ASSIGN_VALUE:           self.command_assign_value,
+            SUM_CELLS:              self.command_sum_cells,
+            SUBTRACT_CELLS:         self.command_subtract_cells,
+            MULTIPLY_CELLS:         self.command_multiply_cells,
+            DIVIDE_CELLS:           self.command_divide_cells,
+            INCREMENT_CELL:         self.command_increment_cell,
+            DECREMENT_CELL:         self.command_decrement_cell,
+            MODULO_CELLS:           self.command_modulo_cells,
+            CLEAR_CONSOLE:          self.command_clear_console,
+            EQUAL_CELLS:            self.command_equal_cells,
+            NOT_EQUAL_CELLS:        self.command_not_equal_cells,
+            GREATER_THAN_CELLS:     self.command_greater_than_cells,
+            LESS_THAN_CELLS:        self.command_less_than_cells,
+            GREATER_EQUAL_CELLS:    self.command_greater_equal_cells,
+            LESS_EQUAL_CELLS:       self.command_less_equal_cells,
+            UPPERCASE_CELL:         self.command_uppercase_cell,
+            LOWERCASE_CELL:         self.command_lowercase_cell,
+            LENGTH_CELL:            self.command_length_cell,
+            INVERT_CELL:            self.command_invert_cell,
+            CALL_BLOCK:             self.command_call_block,
+            ADD_CONSTANT:           self.command_add_constant,
+            SWAP_CELLS:             self.command_swap_cells,
+            COPY_CELL:              self.command_copy_cell,
+            DELETE_CHAR:            self.command_delete_char,
+            STRING_TO_INT:          self.command_string_to_int,
+            INT_TO_STRING:          self.command_int_to_string,
+            BITWISE_AND:            self.command_bitwise_and,
+            BITWISE_OR:             self.command_bitwise_or,
+            BITWISE_XOR:            self.command_bitwise_xor,
+            BITWISE_NOT:            self.command_bitwise_not,
+            SLEEP:                  self.command_sleep,
+            START_LOOP:             self.command_start_loop,
+            RANDOM_CHAR:            self.command_random_char,
+            MAX_CELLS:              self.command_max_cells,
+            MIN_CELLS:              self.command_min_cells,
+            GCD_CELLS:              self.command_gcd_cells,
+            LCM_CELLS:              self.command_lcm_cells,
+            CREATE_CELL:            self.command_create_cell,
+            RETURN:                 self.command_return,
+        }
+
+        for command, handler in commands.items():
+            handlers[int(command)] = handler
+        handlers[INVALID_SYNTAX] = self.command_invalid_syntax
+
+        # superinstructions of the optimizer
+        handlers[FUSED_LINES] = self.command_fused_lines
+        handlers[COMPARE_JUMP] = self.command_compare_jump
+        handlers[ASSIGN_CONSTANT] = self.command_assign_constant
+        handlers[STEP_CONDITION] = self.command_step_condition
+
+        # typed commands of the optimizer
+        handlers[TYPED_ARITHMETIC] = self.command_typed_arithmetic
+        handlers[TYPED_STEP] = self.command_typed_step
+        handlers[TYPED_COPY] = self.command_typed_copy
+        handlers[TYPED_CONDITION] = self.command_typed_condition
+
+        return handlers
+
+    def command_exit(self, instruction: Instruction) -> None:
+        self.cft_exit(reason = ExitReason.EXITED)
         
-        elif _COMMAND == PRINT:
-            cell: Cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            formatted_value = str(cell.value).replace("\\n", "\n")
-            print(formatted_value, end = "", flush = True)
+    def command_print(self, instruction: Instruction) -> None:
+        value = self.get_cell(instruction, 0).value
+        self.output.write(value if type(value) is str else str(value))
 
-        elif _COMMAND == INPUT:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            value = input()
-            self.update_value(cell, value)
+    def command_input(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
 
-        elif _COMMAND == ASSIGN_VALUE:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            value = self.get_argument(LineArgument.SECOND)
-            self.update_value(cell, value)
+        # the prompt has to be visible before the program waits for the user
+        if not self.input.is_ready():
+            self.output.flush()
+
+        start = time.perf_counter()
+        line = self.input.readline()
+        if self.metrics is not None:
+            self.metrics.input_seconds += time.perf_counter() - start
+
+        self.store_input(instruction, cell, line)
+
+    def command_assign_value(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
+        integer, real, text = instruction.operands
+
+        if type(cell) is IntegerCell:
+            if integer is None:
+                self.handle_error("CFTE9", instruction.line_number, instruction.text, data_type = "int")
+            cell.value = integer
+
+        elif type(cell) is FloatCell:
+            if real is None:
+                self.handle_error("CFTE9", instruction.line_number, instruction.text, data_type = "float")
+            cell.value = real
+
+        else:
+            cell.value = text
         
-        elif _COMMAND == SUM_CELLS:
-            cell1: Cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2: Cell = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_sum_cells(self, instruction: Instruction) -> None:
+        cell1: Cell = self.get_cell(instruction, 0)
+        cell2: Cell = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, type(cell2)):
-                result = cell1.value + cell2.value
-                self.update_value(cell1, result, False)
+        if type(cell1) is type(cell2):
+            if type(cell1) is StringCell:
+                cell1.append(cell2.value)
             else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
+                cell1.value += cell2.value
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == SUBTRACT_CELLS:
-            cell1: Cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2: Cell = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_subtract_cells(self, instruction: Instruction) -> None:
+        cell1: Cell = self.get_cell(instruction, 0)
+        cell2: Cell = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, type(cell2)):
-                if not isinstance(cell1, StringCell):
-                    result = cell1.value - cell2.value
-                    self.update_value(cell1, result)
-                else:
-                    self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+        if type(cell1) is type(cell2):
+            if type(cell1) is not StringCell:
+                cell1.value = cell1.value - cell2.value
             else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
+                self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == MULTIPLY_CELLS:
-            cell1: Cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2: Cell = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_multiply_cells(self, instruction: Instruction) -> None:
+        cell1: Cell = self.get_cell(instruction, 0)
+        cell2: Cell = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, type(cell2)):
-                if not isinstance(cell1, StringCell):
-                    result = cell1.value * cell2.value
-                    self.update_value(cell1, result)
-                else:
-                    self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+        if type(cell1) is type(cell2):
+            if type(cell1) is not StringCell:
+                cell1.value = cell1.value * cell2.value
             else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
+                self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == DIVIDE_CELLS:
-            cell1: Cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2: Cell = self.get_cell(self.get_argument(LineArgument.SECOND))
-
-            if isinstance(cell1, type(cell2)):
-                if not isinstance(cell1, StringCell):
-                    result = cell1.value / cell2.value
-                    self.update_value(cell1, result)
-                else:
-                    self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+    def command_divide_cells(self, instruction: Instruction) -> None:
+        cell1: Cell = self.get_cell(instruction, 0)
+        cell2: Cell = self.get_cell(instruction, 1)
+
+        if type(cell1) is type(cell2):
+            if type(cell1) is not StringCell:
+                result = cell1.value / cell2.value
+                cell1.value = int(result) if type(cell1) is IntegerCell else result
             else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
+                self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == INCREMENT_CELL:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
+    def command_increment_cell(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
+
+        if type(cell) is IntegerCell or type(cell) is FloatCell:
+            cell.value += 1
+        else:
             self.update_value(cell, 1, UpdateMode.ADD)
         
-        elif _COMMAND == DECREMENT_CELL:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
+    def command_decrement_cell(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
+
+        if type(cell) is IntegerCell or type(cell) is FloatCell:
+            cell.value -= 1
+        else:
             self.update_value(cell, -1, UpdateMode.ADD)
         
-        elif _COMMAND == MODULO_CELLS:
-            cell1: Cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2: Cell = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_modulo_cells(self, instruction: Instruction) -> None:
+        cell1: Cell = self.get_cell(instruction, 0)
+        cell2: Cell = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, type(cell2)):
-                if not isinstance(cell1, StringCell):
-                    result = cell1.value % cell2.value
-                    self.update_value(cell1, result)
-                else:
-                    self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+        if type(cell1) is type(cell2):
+            if type(cell1) is not StringCell:
+                cell1.value = cell1.value % cell2.value
             else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
+                self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == CLEAR_CONSOLE:
-            os.system(self.__cls_command)
+    def command_clear_console(self, instruction: Instruction) -> None:
+        self.output.clear()
         
-        elif _COMMAND == EQUAL_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_equal_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if not cell1.value == cell2.value:
-                self.__will_skip_next_line = True
+        if not cell1.value == cell2.value:
+            self.__will_skip_next_line = True
         
-        elif _COMMAND == NOT_EQUAL_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_not_equal_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if not cell1.value != cell2.value:
-                self.__will_skip_next_line = True
+        if not cell1.value != cell2.value:
+            self.__will_skip_next_line = True
         
-        elif _COMMAND == GREATER_THAN_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_greater_than_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if not cell1.value > cell2.value:
-                self.__will_skip_next_line = True
+        if not cell1.value > cell2.value:
+            self.__will_skip_next_line = True
         
-        elif _COMMAND == LESS_THAN_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_less_than_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if not cell1.value < cell2.value:
-                self.__will_skip_next_line = True
+        if not cell1.value < cell2.value:
+            self.__will_skip_next_line = True
         
-        elif _COMMAND == GREATER_EQUAL_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_greater_equal_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if not cell1.value >= cell2.value:
-                self.__will_skip_next_line = True
+        if not cell1.value >= cell2.value:
+            self.__will_skip_next_line = True
 
-        elif _COMMAND == LESS_EQUAL_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_less_equal_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if not cell1.value <= cell2.value:
-                self.__will_skip_next_line = True
+        if not cell1.value <= cell2.value:
+            self.__will_skip_next_line = True
         
-        elif _COMMAND == UPPERCASE_CELL:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
+    def command_uppercase_cell(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
 
-            if isinstance(cell, StringCell):
-                cell.value = cell.value.upper()
-            else:
-                self.handle_error("CFTE5", self.__current_line_number, self.__current_line_str)
+        if type(cell) is StringCell:
+            cell.value = cell.value.upper()
+        else:
+            self.handle_error("CFTE5", instruction.line_number, instruction.text)
         
-        elif _COMMAND == LOWERCASE_CELL:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
+    def command_lowercase_cell(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
 
-            if isinstance(cell, StringCell):
-                cell.value = cell.value.lower()
-            else:
-                self.handle_error("CFTE5", self.__current_line_number, self.__current_line_str)
+        if type(cell) is StringCell:
+            cell.value = cell.value.lower()
+        else:
+            self.handle_error("CFTE5", instruction.line_number, instruction.text)
         
-        elif _COMMAND == LENGTH_CELL:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_length_cell(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if isinstance(cell2, StringCell):
-                self.update_value(cell1, len(cell2.value))
-            else:
-                self.handle_error("CFTE5", self.__current_line_number, self.__current_line_str)
+        if type(cell2) is StringCell:
+            self.update_value(cell1, len(cell2))
+        else:
+            self.handle_error("CFTE5", instruction.line_number, instruction.text)
 
-        elif _COMMAND == INVERT_CELL:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
+    def command_invert_cell(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
 
-            if isinstance(cell, StringCell):
-                cell.value = cell.value[::-1]
-            else:
-                cell.value = -cell.value
+        if type(cell) is StringCell:
+            cell.value = cell.value[::-1]
+        else:
+            cell.value = -cell.value
         
-        elif _COMMAND == CALL_BLOCK:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            value = str(cell.value)
+    def command_call_block(self, instruction: Instruction) -> bool:
+        cell = self.get_cell(instruction, 0)
+        value = str(cell.value)
 
-            if value in self.blocks:
-                self.execute_block(value, False, 0)
-                self.__is_executing_new_block = True
-            else:
-                self.handle_error("CFTE10", name = cell.value)
+        if value in self.blocks:
+            self.execute_block(value, False, 0)
+            self.__is_executing_new_block = True
+        else:
+            self.handle_error("CFTE10", name = cell.value)
         
-        elif _COMMAND == ADD_CONSTANT:
-            value = self.get_argument(LineArgument.SECOND)
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-
-            self.update_value(cell, value, UpdateMode.ADD)
+        return True
         
-        elif _COMMAND == SWAP_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_add_constant(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
+        integer, real, text = instruction.operands
 
-            if isinstance(cell1, type(cell2)):
-                cell1.value, cell2.value = cell2.value, cell1.value
-            else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
-        
-        elif _COMMAND == COPY_CELL:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+        if type(cell) is IntegerCell:
+            if integer is None:
+                self.handle_error("CFTE9", instruction.line_number, instruction.text, data_type = "int")
+            cell.value += integer
 
-            if isinstance(cell1, type(cell2)):
-                cell1.value = cell2.value
-            else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
+        elif type(cell) is FloatCell:
+            if real is None:
+                self.handle_error("CFTE9", instruction.line_number, instruction.text, data_type = "float")
+            cell.value += real
+
+        else:
+            cell.append(text)
         
-        elif _COMMAND == DELETE_CHAR:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_swap_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, StringCell) and isinstance(cell2, IntegerCell):
-                cell1.value[:cell2.value] + cell1.value[cell2.value+1:]
-            else:
-                self.handle_error("CFTE4", self.__current_line_number, self.__current_line_str)
-        
-        elif _COMMAND == STRING_TO_INT:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
-            self.update_value(cell1, cell2.value)
-        
-        elif _COMMAND == INT_TO_STRING:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
-            self.update_value(cell1, str(cell2.value))
-        
-        elif _COMMAND == BITWISE_AND:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
-
-            if isinstance(cell1, type(cell2)):
-                if not isinstance(cell1, StringCell):
-                    result = cell1.value & cell2.value
-                    self.update_value(cell1, result)
-                else:
-                    self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
-            else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
+        if type(cell1) is type(cell2):
+            cell1.value, cell2.value = cell2.value, cell1.value
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == BITWISE_OR:
-            result = None
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_copy_cell(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, type(cell2)):
-                if not isinstance(cell1, StringCell):
-                    result = cell1.value | cell2.value
-                    self.update_value(cell1, result)
-                else:
-                    self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
-            else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
+        if type(cell1) is type(cell2):
+            cell1.value = cell2.value
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == BITWISE_XOR:
-            result = None
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_delete_char(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, type(cell2)):
-                if not isinstance(cell1, StringCell):
-                    result = cell1.value ^ cell2.value
-                    self.update_value(cell1, result)
-                else:
-                    self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
-            else:
-                self.handle_error("CFTE7", self.__current_line_number, self.__current_line_str)
+        if type(cell1) is StringCell and type(cell2) is IntegerCell:
+            cell1.delete(cell2.value)
+        else:
+            self.handle_error("CFTE4", instruction.line_number, instruction.text)
+        
+    def command_string_to_int(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
+        self.update_value(cell1, cell2.value)
         
-        elif _COMMAND == BITWISE_NOT:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
+    def command_int_to_string(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
+        self.update_value(cell1, str(cell2.value))
+        
+    def command_bitwise_and(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if not isinstance(cell, StringCell):
-                cell.value = ~cell.value
+        if type(cell1) is type(cell2):
+            if type(cell1) is not StringCell:
+                cell1.value = cell1.value & cell2.value
             else:
-                self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+                self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == SLEEP:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
+    def command_bitwise_or(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if not isinstance(cell, StringCell):
-                time.sleep(cell.value)
+        if type(cell1) is type(cell2):
+            if type(cell1) is not StringCell:
+                cell1.value = cell1.value | cell2.value
             else:
-                self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+                self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == START_LOOP:
-            cell = self.get_cell(self.get_argument(LineArgument.FIRST))
-            value = cell.value
+    def command_bitwise_xor(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if value in self.blocks:
-                self.execute_block(value, True, 0)
-                self.__is_executing_new_block = True
+        if type(cell1) is type(cell2):
+            if type(cell1) is not StringCell:
+                cell1.value = cell1.value ^ cell2.value
             else:
-                self.handle_error("CFTE10", name = cell.value)
+                self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        else:
+            self.handle_error("CFTE7", instruction.line_number, instruction.text)
         
-        elif _COMMAND == RANDOM_CHAR:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_bitwise_not(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
 
-            if isinstance(cell1, type(cell2)) and isinstance(cell1, StringCell):
-                cell1.value = random.choice(cell2.value)
-            else:
-                self.handle_error("CFTE5", self.__current_line_number, self.__current_line_str)
+        if type(cell) is not StringCell:
+            cell.value = ~cell.value
+        else:
+            self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        
+    def command_sleep(self, instruction: Instruction) -> None:
+        cell = self.get_cell(instruction, 0)
+
+        if type(cell) is not StringCell:
+            self.output.flush()
+            start = time.perf_counter()
+
+            try:
+                # a program can't sleep through its time limit
+                time_left = self.get_time_left()
+                if time_left is not None and cell.value > time_left:
+                    time.sleep(self.clock.take(max(time_left, 0)))
+                    self.handle_error("CFTE15", instruction.line_number, instruction.text, limit = self.limits.seconds)
+
+                time.sleep(self.clock.take(cell.value))
+            finally:
+                if self.metrics is not None:
+                    self.metrics.sleep_seconds += time.perf_counter() - start
+        else:
+            self.handle_error("CFTE6", instruction.line_number, instruction.text)
         
-        elif _COMMAND == MAX_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_start_loop(self, instruction: Instruction) -> bool:
+        cell = self.get_cell(instruction, 0)
+        value = cell.value
 
-            if isinstance(cell1, type(cell2)) and not isinstance(cell1, StringCell):
-                cell1.value = max(cell1.value, cell2.value)
-            else:
-                self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+        if value in self.blocks:
+            self.execute_block(value, True, 0)
+            self.__is_executing_new_block = True
+        else:
+            self.handle_error("CFTE10", name = cell.value)
+        
+        return True
         
-        elif _COMMAND == MIN_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_random_char(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, type(cell2)) and not isinstance(cell1, StringCell):
-                cell1.value = min(cell1.value, cell2.value)
-            else:
-                self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+        if type(cell1) is type(cell2) and type(cell1) is StringCell:
+            cell1.value = self.get_random().choice(cell2.value)
+        else:
+            self.handle_error("CFTE5", instruction.line_number, instruction.text)
         
-        elif _COMMAND == GCD_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_max_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, type(cell2)) and not isinstance(cell1, StringCell):
-                cell1.value = math.gcd(cell1.value, cell2.value)
-            else:
-                self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+        if type(cell1) is type(cell2) and type(cell1) is not StringCell:
+            cell1.value = max(cell1.value, cell2.value)
+        else:
+            self.handle_error("CFTE6", instruction.line_number, instruction.text)
         
-        elif _COMMAND == LCM_CELLS:
-            cell1 = self.get_cell(self.get_argument(LineArgument.FIRST))
-            cell2 = self.get_cell(self.get_argument(LineArgument.SECOND))
+    def command_min_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if isinstance(cell1, type(cell2)) and not isinstance(cell1, StringCell):
-                cell1.value = math.lcm(cell1.value, cell2.value)
-            else:
-                self.handle_error("CFTE6", self.__current_line_number, self.__current_line_str)
+        if type(cell1) is type(cell2) and type(cell1) is not StringCell:
+            cell1.value = min(cell1.value, cell2.value)
+        else:
+            self.handle_error("CFTE6", instruction.line_number, instruction.text)
         
-        elif _COMMAND == CREATE_CELL:
-            name = self.get_argument(LineArgument.FIRST)
-            data_type = self.get_argument(LineArgument.SECOND)
+    def command_gcd_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            if not Cell.is_name_correct(name):
-                self.handle_error("CFTE2", self.__current_line_number, self.__current_line_str, name = name)
+        if type(cell1) is type(cell2) and type(cell1) is not StringCell:
+            import math
+            cell1.value = math.gcd(cell1.value, cell2.value)
+        else:
+            self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        
+    def command_lcm_cells(self, instruction: Instruction) -> None:
+        cell1 = self.get_cell(instruction, 0)
+        cell2 = self.get_cell(instruction, 1)
 
-            match data_type:
-                case CellDataType.INTEGER.value:
-                    cell: Cell = IntegerCell()
-                case CellDataType.FLOAT.value:
-                    cell: Cell = FloatCell()
-                case CellDataType.STRING.value:
-                    cell: Cell = StringCell()
-                case _:
-                    self.handle_error("CFTE1", self.__current_line_number, self.__current_line_str, data_type = data_type)
-            
-            self.cells[name] = cell
+        if type(cell1) is type(cell2) and type(cell1) is not StringCell:
+            import math
+            cell1.value = math.lcm(cell1.value, cell2.value)
+        else:
+            self.handle_error("CFTE6", instruction.line_number, instruction.text)
+        
+    def command_create_cell(self, instruction: Instruction) -> None:
+        name, data_type = instruction.args
+
+        if not Cell.is_name_correct(name):
+            self.handle_error("CFTE2", instruction.line_number, instruction.text, name = name)
+
+        match data_type:
+            case CellDataType.INTEGER.value:
+                cell: Cell = IntegerCell()
+            case CellDataType.FLOAT.value:
+                cell: Cell = FloatCell()
+            case CellDataType.STRING.value:
+                cell: Cell = StringCell()
+            case _:
+                self.handle_error("CFTE1", instruction.line_number, instruction.text, data_type = data_type)
+        
+        self.cells[instruction.cells[0]] = cell
         
-        elif _COMMAND == RETURN:
-            self.__is_return_called = True
+    def command_return(self, instruction: Instruction) -> bool:
+        self.__is_return_called = True
+        return True
         
-        # if command isn't defined, then the CFTE3 error will handled
+    # if command isn't defined, then the CFTE3 error will handled
+    def command_undefined(self, instruction: Instruction) -> None:
+        self.handle_error("CFTE3", instruction.line_number, instruction.text, command = instruction.args[0])
+
+    # if command hasn't got enough arguments, then the CFTE12 error will handled
+    def command_invalid_syntax(self, instruction: Instruction) -> None:
+        self.handle_error("CFTE12", instruction.line_number, instruction.text)
+
+    # the second line of a superinstruction is right after it in the block, so a superinstruction
+    # moves the index of the frame over that line (see optimizer.py)
+    def command_fused_lines(self, instruction: Instruction) -> bool | None:
+        first, second = instruction.operands
+        handlers = self.__handlers
+
+        # the first line is never a condition, a call or a return
+        handlers[first.opcode](first)
+        self.__current_frame.index += 1
+
+        self.__current_instruction = second
+        return handlers[second.opcode](second)
+
+    def command_compare_jump(self, instruction: Instruction) -> bool | None:
+        first, second, compare, slot1, slot2 = instruction.operands
+        cell1, cell2 = self.cells[slot1], self.cells[slot2]
+
+        # a missing cell is reported by the condition itself
+        if cell1 is None or cell2 is None:
+            self.get_cell(first, 0)
+            self.get_cell(first, 1)
+
+        self.__current_frame.index += 1
+        if compare(cell1.value, cell2.value):
+            self.__current_instruction = second
+            return self.__handlers[second.opcode](second)
+        self.skipped += 1
+
+    def command_step_condition(self, instruction: Instruction) -> bool | None:
+        first, second, step, slot = instruction.operands
+        cell = self.cells[slot]
+
+        # errors of the step (a string or a missing cell) are reported by its own handler
+        if type(cell) is IntegerCell or type(cell) is FloatCell:
+            cell.value += step
         else:
-            self.handle_error("CFTE3", self.__current_line_number, self.__current_line_str, command = _COMMAND)
+            self.__handlers[first.opcode](first)
+
+        self.__current_frame.index += 1
+        self.__current_instruction = second
+        return self.__handlers[second.opcode](second)
+
+    def command_assign_constant(self, instruction: Instruction) -> None:
+        cell = self.cells[instruction.cells[0]]
+        if cell is None:
+            self.get_cell(instruction, 0)
+
+        integer, real, text = instruction.operands
+
+        if type(cell) is IntegerCell:
+            if integer is None:
+                self.handle_error("CFTE9", instruction.line_number, instruction.text, data_type = "int")
+            cell.value = integer
+
+        elif type(cell) is FloatCell:
+            if real is None:
+                self.handle_error("CFTE9", instruction.line_number, instruction.text, data_type = "float")
+            cell.value = real
+
+        else:
+            cell.value = text
+
+    # the verifier has proven that the cells of a typed command exist and have the types the command needs,
+    # so the commands below don't check them (see verifier.py)
+    def command_typed_arithmetic(self, instruction: Instruction) -> None:
+        operation, slot1, slot2 = instruction.operands
+        cell = self.cells[slot1]
+        cell.value = operation(cell.value, self.cells[slot2].value)
+
+    def command_typed_step(self, instruction: Instruction) -> None:
+        slot, step = instruction.operands
+        self.cells[slot].value += step
+
+    def command_typed_copy(self, instruction: Instruction) -> None:
+        slot1, slot2 = instruction.cells
+        self.cells[slot1].value = self.cells[slot2].value
+
+    def command_typed_condition(self, instruction: Instruction) -> None:
+        compare, slot1, slot2 = instruction.operands
+
+        if not compare(self.cells[slot1].value, self.cells[slot2].value):
+            self.__will_skip_next_line = True
     
     #endregion
 
     #region Parser
-    def parse(self, source: str) -> dict[str, BlockData]:
+    @staticmethod
+    def parse(source: lexer.Source) -> dict[str, BlockData]:
         
         """
-        Parses the source code
+        Parses the source code (see lexer.py)
         """
-        
-        lines = [
-            line.split(COMMENT_SYMBOL, 1)[0].rstrip()
-            for line in source.splitlines()
-        ]
 
-        blocks: dict[str, BlockData] = {}
-        block: str = None
+        return lexer.parse(source)
 
-        for line_number, line in enumerate(lines, 1):
-            if not line:
-                continue
+    @staticmethod
+    def resolve(
+            blocks: Mapping[str, BlockData],
+            symbols: dict[str, int] | None = None,
+            constants: dict[str, tuple[int | None, float | None, str]] | None = None) -> dict[str, int]:
+
+        """
+        Gives every cell name used in the program a slot in the cells table and stores
+        the slots of the cell arguments in the instructions, returns the slots by names.
+        The names which are in `symbols` already keep their slots.
+        The values of 04 and 24 commands are decoded into `constants` (the constant pool), once for every
+        distinct value, and stored in the instructions as their operands: an int and a float, None where
+        the value isn't such a number, and the text with its `\\n` sequences turned into new lines
+        """
+
+        symbols = symbols if symbols is not None else {}
+        constants = constants if constants is not None else {}
+
+        for block in blocks.values():
+            for instruction in block.code:
+
+                # the cell arguments always go first, 04, 24 and 41 have a value or a type as the second one
+                if instruction.opcode in (UNDEFINED_COMMAND, INVALID_SYNTAX):
+                    names = ()
+                elif instruction.opcode in (int(ASSIGN_VALUE), int(ADD_CONSTANT), int(CREATE_CELL)):
+                    names = instruction.args[:1]
+                else:
+                    names = instruction.args
+
+                instruction.cells = tuple(symbols.setdefault(name, len(symbols)) for name in names)
+
+                if instruction.opcode == int(ASSIGN_VALUE) or instruction.opcode == int(ADD_CONSTANT):
+                    value = instruction.args[1]
+                    constant = constants.get(value)
+                    if constant is None:
+                        constant = constants[value] = (*Cell.decode_number(value), decode_escapes(value))
+                    instruction.operands = constant
+
+        return symbols
+
+    def prepare(self, blocks: Mapping[str, BlockData], optimize: bool) -> Mapping[str, BlockData]:
+
+        """
+        Returns the code to run: the blocks with resolved cells, optimized if `optimize` is true.
+        Lazy blocks (see lexer.py) are prepared one by one when they're first used
+        """
+
+        if isinstance(blocks, lexer.LazyBlocks):
+            return lexer.LazyBlocks(blocks, lambda name: self.prepare_block(name, blocks[name], optimize))
+
+        self.resolve(blocks, self.symbols, self.constants)
+        self.cells.extend([None] * (len(self.symbols) - len(self.cells)))
+
+        if not optimize:
+            return blocks
 
-            if line.startswith(START_BLOCK):
-                _, _, block_name = line.partition(' ')
-                block = block_name.strip()
-                if block:
-                    blocks[block] = BlockData()
-            elif line.startswith(END_BLOCK):
-                block = None
-            elif block:
-                tokens = [match.group(1) if match.group(1) else match.group(0)
-                        for match in re.finditer(r'"([^"]*)"|\S+', line)]
-                if tokens:
-                    blocks[block].data.append((line_number, tokens))
-
-        return blocks
+        import verifier
+        return optimizer.optimize(blocks, verifier.infer_types(blocks))
+
+    def get_prepared(self) -> PreparedCode | None:
+
+        """
+        Returns the prepared code of the program, another interpreter made with it doesn't prepare the code again.
+        A lazily parsed program has none: its blocks are prepared into the cells table of the interpreter which runs them
+        """
+
+        if isinstance(self.blocks, lexer.LazyBlocks):
+            return None
+
+        return PreparedCode(self.blocks, self.symbols, self.constants, self.is_optimized)
+
+    def prepare_block(self, name: str, block: BlockData, optimize: bool) -> BlockData:
+
+        """
+        Prepares a block of a lazily parsed program when it's first used, the new cells of the block
+        are added to the cells table. Such a block is optimized without the types of cells,
+        they are inferred only for the whole program
+        """
+
+        # the lines read by the lexer are shared by the interpreters of the program, which give the cells other slots
+        prepared = BlockData(block.data)
+        prepared.code = [Instruction(line.opcode, line.args, line.line_number, line.text) for line in block.code]
+
+        self.resolve({name: prepared}, self.symbols, self.constants)
+        self.cells.extend([None] * (len(self.symbols) - len(self.cells)))
+
+        # any block which isn't read yet can end with a condition and skip a line after a call
+        if optimize:
+            prepared.code = optimizer.optimize_code(prepared.code, True, {})
+
+        return prepared
     #endregion
 
     #region Methods
-    def get_cell(self, name: str) -> Cell:
+    def get_cell(self, instruction: Instruction, index: int) -> Cell:
         
         """
-        Returns a cell from the cells
+        Returns a cell which is the argument of the instruction by index
         """
 
-        if (cell := self.cells.get(name, None)) is not None:
+        if (cell := self.cells[instruction.cells[index]]) is not None:
             return cell
         
-        self.handle_error("CFTE8", self.__current_line_number, self.__current_line_str, name = name)
+        self.handle_error("CFTE8", instruction.line_number, instruction.text, name = instruction.args[index])
+
+    def execute_instruction(self, instruction: Instruction) -> bool | None:
 
-    def get_argument(self, index: LineArgument) -> str:
-        
         """
-        Returns an argument value in the line by index
+        Executes a single instruction outside of the main loop, returns true if the current block has to be interrupted
         """
-        
-        if 0 <= index.value < len(self.__current_line):
-            return self.__current_line[index.value]
-        self.handle_error("CFTE12", self.__current_line_number, self.__current_line_str)
-    
-    def update_value(self, cell: Cell, value: str, mode: UpdateMode = UpdateMode.WRITE) -> None:
+
+        self.__current_instruction = instruction
+        return self.__handlers[instruction.opcode](instruction)
+
+    def update_value(self, cell: Cell, value: str | int | float, mode: UpdateMode = UpdateMode.WRITE) -> None:
         
         """
-        Updates a cell's value (only write or add)
+        Updates a cell's value (only write or add), a text written into a number cell is decoded as a literal
         """
         
-        if isinstance(cell, IntegerCell):
-            if Cell.is_number(value):
-                match mode:
-                    case UpdateMode.WRITE:
-                        cell.value = int(value)
-                    case UpdateMode.ADD:
-                        cell.value += int(value)
-            else:
-                self.handle_error("CFTE9", self.__current_line_number, self.__current_line_str, data_type = "int")
-        
-        elif isinstance(cell, FloatCell):
-            if Cell.is_number(value):
-                match mode:
-                    case UpdateMode.WRITE:
-                        cell.value = float(value)
-                    case UpdateMode.ADD:
-                        cell.value += float(value)
-            else:
-                self.handle_error("CFTE9", self.__current_line_number, self.__current_line_str, data_type = "float")
+        if type(cell) is IntegerCell:
+            number = Cell.decode_number(value)[0] if type(value) is str else int(value)
+            if number is None:
+                self.handle_error("CFTE9", self.__current_instruction.line_number, self.__current_instruction.text, data_type = "int")
+
+            match mode:
+                case UpdateMode.WRITE:
+                    cell.value = number
+                case UpdateMode.ADD:
+                    cell.value += number
+        
+        elif type(cell) is FloatCell:
+            number = Cell.decode_number(value)[1] if type(value) is str else float(value)
+            if number is None:
+                self.handle_error("CFTE9", self.__current_instruction.line_number, self.__current_instruction.text, data_type = "float")
+
+            match mode:
+                case UpdateMode.WRITE:
+                    cell.value = number
+                case UpdateMode.ADD:
+                    cell.value += number
         
         # else - it's a string 
         else:
@@ -536,7 +1095,21 @@ class Interpreter:
                 case UpdateMode.WRITE:
                     cell.value = value
                 case UpdateMode.ADD:
-                    cell.value += value
+                    cell.append(value)
+
+    def store_input(self, instruction: Instruction, cell: Cell, value: str | None) -> None:
+
+        """
+        Writes a line read by a 03 command into the cell, None means the input is over
+        """
+
+        if value is not None:
+            self.__lines_read += 1
+            self.update_value(cell, value)
+        elif self.on_eof is EOFPolicy.EMPTY:
+            cell.value = type(cell)().value
+        else:
+            self.handle_error("CFTE13", instruction.line_number, instruction.text)
 
     def execute_block(self, name: str, is_looping: bool, index: int) -> None:
 
@@ -545,7 +1118,281 @@ class Interpreter:
         """
 
         self.execution_stack.append(ExecutionFrame(name, is_looping, index))
+
+        if len(self.execution_stack) > self.__max_depth:
+            self.handle_error("CFTE18", limit = self.__max_depth)
     
+    def check_limits(self, executed: int) -> int:
+
+        """
+        Stops the program if it has run over a limit, returns the number of executed lines to check the limits at next time.
+        The first check starts the clock of the time limit. The strings are measured for the metrics here too,
+        a run with metrics and without limits only measures them
+        """
+
+        limits, metrics = self.limits, self.metrics
+
+        if metrics is not None or (limits is not None and limits.string_length is not None):
+            string_length = self.get_string_length()
+            if metrics is not None and string_length > metrics.peak_string_length:
+                metrics.peak_string_length = string_length
+
+        # a run without limits is checked only for its metrics, so metrics.py is imported already
+        if limits is None:
+            from metrics import CHECK_INTERVAL
+            return executed + CHECK_INTERVAL
+
+        if limits.instructions is not None and executed > limits.instructions:
+            self.handle_error("CFTE14", limit = limits.instructions)
+
+        if limits.seconds is not None:
+            if self.__deadline is None:
+                self.__deadline = self.clock.now() + limits.seconds
+            elif self.clock.now() > self.__deadline:
+                self.handle_error("CFTE15", limit = limits.seconds)
+
+        if limits.string_length is not None and string_length > limits.string_length:
+            self.handle_error("CFTE16", limit = limits.string_length)
+
+        next_check = executed + limits.check_interval
+        if limits.instructions is not None:
+            next_check = min(next_check, limits.instructions + 1)
+
+        return next_check
+
+    def get_time_left(self) -> float | None:
+
+        """
+        Returns the seconds left until the time limit, None if there is no time limit
+        """
+
+        if self.__deadline is None:
+            return None
+
+        return self.__deadline - self.clock.now()
+
+    def set_checkpoints(self, checkpoints: Checkpoints | None) -> None:
+
+        """
+        Sets where and how often the state of the run is saved, the interpreter engine only
+        """
+
+        # the slots of the cells of a lazily parsed program depend on the order its blocks have run in
+        if checkpoints is not None and isinstance(self.blocks, lexer.LazyBlocks):
+            raise ValueError("the state of a lazily parsed program can't be saved")
+
+        self.checkpoints = checkpoints
+        self.__next_snapshot = self.__executed + checkpoints.interval if checkpoints is not None and checkpoints.interval is not None else sys.maxsize
+
+    def set_hooks(self, hooks: "Hooks | None") -> None:
+
+        """
+        Sets the callbacks of a debugger or a tracer for the run, the interpreter engine only (see hooks.py).
+        Hooks without callbacks are the same as no hooks, the run keeps its uninstrumented loop
+        """
+
+        self.hooks = hooks if hooks is not None and not hooks.is_empty() else None
+
+    def set_metrics(self, metrics: "Metrics | None") -> None:
+
+        """
+        Sets the counters the run adds to (see metrics.py), the run goes through the counted loop with them
+        """
+
+        self.metrics = metrics
+
+    def count_block(self, frame: ExecutionFrame, depth: int) -> None:
+
+        """
+        Counts a block taken from the execution stack, a block which goes on after a block it has called isn't counted again
+        """
+
+        metrics = self.metrics
+        if frame.index == 0:
+            metrics.blocks += 1
+            if frame.is_looping:
+                metrics.loop_iterations += 1
+
+        if depth > metrics.peak_depth:
+            metrics.peak_depth = depth
+
+    def finish_metrics(self, executed: int, start: float) -> None:
+
+        """
+        Adds a run which has ended to the metrics: its executed lines and time, its strings and cells at the end
+        """
+
+        from metrics import CELL_TYPES
+
+        metrics = self.metrics
+        metrics.runs += 1
+        metrics.seconds += time.perf_counter() - start
+        metrics.instructions += executed
+        metrics.peak_string_length = max(metrics.peak_string_length, self.get_string_length())
+
+        cells = dict.fromkeys(CELL_TYPES.values(), 0)
+        for cell in self.cells:
+            if cell is not None:
+                cells[CELL_TYPES[type(cell)]] += 1
+        metrics.cells = cells
+
+    def request_snapshot(self, is_suspending: bool = False) -> None:
+
+        """
+        Makes the interpreter save a snapshot after the current block or iteration of a loop, and stop the program
+        if `is_suspending` is true. It can be called from a signal handler
+        """
+
+        if self.checkpoints is not None:
+            self.__is_suspending = self.__is_suspending or is_suspending
+            self.__next_snapshot = 0
+
+    def record(self, trace: "Trace") -> None:
+
+        """
+        Records what the run takes from outside the program into the trace (see replay.py). Called before the run,
+        after a snapshot is restored: the lines a restored run skips aren't recorded
+        """
+
+        from replay import RecordingClock, RecordingInput
+
+        trace.random_state = self.get_random().getstate()
+        self.input = RecordingInput(self.input, trace.lines)
+        self.clock = RecordingClock(trace.sleeps)
+
+    def replay(self, trace: "Trace") -> None:
+
+        """
+        Gives the run the lines, the random choices and the sleeps of a recorded run,
+        the sleeps go by a virtual clock without waiting
+        """
+
+        from replay import VirtualClock, ReplayInput
+
+        self.get_random().setstate(trace.random_state)
+        self.input = ReplayInput(trace.lines)
+        self.clock = VirtualClock(trace.sleeps)
+
+    def save_snapshot(self, executed: int, frame: ExecutionFrame | None) -> None:
+
+        """
+        Saves the state of the run into the checkpoints file, `frame` is a restarted loop which isn't on the stack
+        """
+
+        import checkpoint
+
+        # the output printed before the snapshot mustn't be lost if the program is stopped after it
+        self.output.flush()
+
+        frames = self.execution_stack + [frame] if frame is not None else list(self.execution_stack)
+        snapshot = checkpoint.Snapshot(
+            self.cells, frames, self.is_optimized, self.__will_skip_next_line,
+            executed, self.__created_cells, self.__lines_read, self.get_random().getstate(),
+        )
+        checkpoint.save(self.checkpoints.path, snapshot, checkpoint.get_source_hash(self.source))
+
+        if self.__is_suspending:
+            self.exit_reason = ExitReason.SUSPENDED
+            raise exception.ProgramExit()
+
+        interval = self.checkpoints.interval
+        self.__next_snapshot = executed + interval if interval is not None else sys.maxsize
+
+    def restore(self, snapshot: "checkpoint.Snapshot") -> None:
+
+        """
+        Puts the state of a snapshot into the interpreter, the lines the program has read are skipped in the input.
+        Raises SnapshotError if the snapshot doesn't fit the code
+        """
+
+        import checkpoint
+
+        if snapshot.is_optimized != self.is_optimized:
+            raise checkpoint.SnapshotError(f"the snapshot was made {'with' if snapshot.is_optimized else 'without'} the optimizer")
+        if len(snapshot.cells) != len(self.cells):
+            raise checkpoint.SnapshotError("the snapshot was made from another program")
+
+        # the tables are changed in place, compiled code and handlers keep references to them
+        self.cells[:] = snapshot.cells
+        self.execution_stack[:] = snapshot.frames
+        self.__will_skip_next_line = snapshot.will_skip_next_line
+        self.__executed = snapshot.executed
+        self.__created_cells = snapshot.created_cells
+        self.get_random().setstate(snapshot.random_state)
+
+        for _ in range(snapshot.lines_read):
+            self.input.readline()
+        self.__lines_read = snapshot.lines_read
+
+        # the count of lines goes on, so the next periodic snapshot is counted from the restored one
+        self.set_checkpoints(self.checkpoints)
+
+    def get_random(self) -> "random.Random":
+
+        """
+        Returns the generator of 36 commands of the run, it's made when it's first used
+        """
+
+        if self.random is None:
+            import random
+            self.random = random.Random()
+
+        return self.random
+
+    def get_string_length(self) -> int:
+        return sum(len(cell) for cell in self.cells if type(cell) is StringCell)
+
+    def limit_handlers(self, handlers: list[Callable[[Instruction], bool | None]]) -> list[Callable[[Instruction], bool | None]]:
+
+        """
+        Returns the handlers with the checks of the limits which can't wait for the next check of them:
+        a 05 command can double a string and a 41 command creates a cell
+        """
+
+        limits = self.limits
+        if limits is None:
+            return handlers
+
+        handlers = list(handlers)
+        cells = self.cells
+
+        if limits.string_length is not None:
+            handlers[int(SUM_CELLS)] = self.limit_string(handlers[int(SUM_CELLS)], limits.string_length)
+
+        if limits.cells is not None:
+            create_cell = handlers[int(CREATE_CELL)]
+
+            def limited_create_cell(instruction: Instruction) -> None:
+                if cells[instruction.cells[0]] is None:
+                    if self.__created_cells >= limits.cells:
+                        self.handle_error("CFTE17", instruction.line_number, instruction.text, limit = limits.cells)
+                    self.__created_cells += 1
+
+                return create_cell(instruction)
+
+            handlers[int(CREATE_CELL)] = limited_create_cell
+
+        return handlers
+
+    def limit_string(self, handler: Callable[[Instruction], bool | None], limit: int) -> Callable[[Instruction], bool | None]:
+
+        """
+        Returns the handler which stops the program if the string it has written is longer than the limit
+        """
+
+        cells = self.cells
+
+        def limited(instruction: Instruction) -> bool | None:
+            result = handler(instruction)
+
+            cell = cells[instruction.cells[0]]
+            if type(cell) is StringCell and len(cell) > limit:
+                self.handle_error("CFTE16", instruction.line_number, instruction.text, limit = limit)
+
+            return result
+
+        return limited
+
     def handle_error(self, error_number: str, line: int | None = None, command_in_string: str | None = None, **kwargs) -> NoReturn:
         
         """
@@ -553,16 +1400,30 @@ class Interpreter:
         """
         
         formatted_exception = exception.ERRORS[error_number].format(**kwargs)
-        exception.Exception(error_number, formatted_exception, line, command_in_string)
-        self.cft_exit()
+        self.error = ProgramError(error_number, formatted_exception, line, command_in_string)
+
+        if self.hooks is not None:
+            for callback in self.hooks.on_error:
+                callback(self.error)
+
+        if self.is_reporting:
+            exception.Exception(error_number, formatted_exception, line, command_in_string, file = self.output)
 
-    def cft_exit(self) -> NoReturn:
+        reason = ExitReason.LIMIT if error_number in exception.LIMIT_ERRORS else ExitReason.ERROR
+        self.cft_exit(error_number, reason)
+
+    def cft_exit(self, error_number: str | None = None, reason: ExitReason = ExitReason.FINISHED) -> NoReturn:
 
         """
-        Ends program execution
+        Ends program execution, error_number is the code of the error that has stopped the program
         """
 
-        print("\n[Program Finished]")
-        sys.exit()
+        self.error_number = error_number
+        self.exit_reason = reason
+
+        if self.is_reporting:
+            self.output.write("\n[Program Finished]\n")
+        self.output.flush()
+        raise exception.ProgramExit(error_number)
     
     #endregion
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+Lexer of C42 sources: blocks are found by one pass over the source, their lines are tokenized
+when the block is read.
+
+index() jumps from one line which starts with "#" to the next one (only such a line can start or end
+a block) and records where the lines of every block are, the lines inside the blocks are only counted.
+parse() reads every block at once, parse_lazily() gives LazyBlocks, which read a block when it's
+first used, so a huge program starts without tokenizing the blocks it never calls.
+
+The source can be a str or bytes-like (an mmap of the file, see map_file), the lines of a block
+are decoded from utf-8 when the block is read.
+"""
+
+import gc, mmap, re
+
+from dataclasses import dataclass
+from typing import Callable, Collection, Iterator, Mapping
+
+from constants import *
+from cfttypes import *
+
+
+# line breaks of str.splitlines() besides "\n" and "\r\n", the source is normalized to "\n" if it has any
+LINE_BREAKS         = re.compile("\r(?!\n)|[\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+LINE_BREAKS_UTF8    = re.compile(rb"\r(?!\n)|[\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+
+COUNT_CHUNK = 1 << 20 # an mmap can't count lines, it's counted by pieces of this size
+
+Source = str | bytes | mmap.mmap
+
+
+@dataclass(slots=True)
+class BlockSpan:
+    """
+    Represents where the lines of a block are in the source.
+    """
+
+    start: int          # offset of the line after the start of the block
+    end: int            # offset of the line which ends the block (or the end of the source)
+    line_number: int    # number of the first line of the block
+
+
+class LazyBlocks(Mapping[str, BlockData]):
+    """
+    Blocks which are made when they are first used: `load` makes the block of a name from `names`.
+    Membership and iteration don't make any block.
+    """
+
+    def __init__(self, names: Collection[str], load: Callable[[str], BlockData]) -> None:
+        self.names: Collection[str]             = names
+        self.load: Callable[[str], BlockData]   = load
+
+        self.__blocks: dict[str, BlockData]     = {}
+
+    def __getitem__(self, name: str) -> BlockData:
+        block = self.__blocks.get(name)
+        if block is None:
+            if name not in self.names:
+                raise KeyError(name)
+            block = self.__blocks[name] = self.load(name)
+
+        return block
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.__blocks
+
+
+def parse(source: Source) -> dict[str, BlockData]:
+
+    """
+    Parses the source code
+    """
+
+    source = normalize(source)
+
+    # the lexer creates a lot of objects without reference cycles, so collections would only waste time
+    is_gc_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        return {name: read_block(source, span) for name, span in index(source).items()}
+    finally:
+        if is_gc_enabled:
+            gc.enable()
+
+def parse_lazily(source: Source) -> LazyBlocks:
+
+    """
+    Finds the blocks of the source code, every block is tokenized when it's first used
+    """
+
+    source = normalize(source)
+    spans = index(source)
+    return LazyBlocks(spans, lambda name: read_block(source, spans[name]))
+
+def map_file(path: str) -> Source:
+
+    """
+    Maps a source file into memory, the file is read only when the lexer reaches its pages
+    """
+
+    with open(path, "rb") as file:
+        try:
+            return mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        # an empty file can't be mapped
+        except ValueError:
+            return ""
+
+def normalize(source: Source) -> Source:
+
+    """
+    Returns the source with every line break which isn't "\\n" or "\\r\\n" replaced by "\\n",
+    so the lines are the same as from str.splitlines()
+    """
+
+    if isinstance(source, str):
+        return LINE_BREAKS.sub("\n", source) if LINE_BREAKS.search(source) else source
+
+    # rare in sources, such a file is decoded as a whole
+    if LINE_BREAKS_UTF8.search(source):
+        return normalize(bytes(source).decode("utf-8"))
+
+    return source
+
+
+def index(source: Source) -> dict[str, BlockSpan]:
+
+    """
+    Returns the spans of the blocks by their names in the order the blocks are defined.
+    A block defined again gets the lines of its last definition, as in the parser before it
+    """
+
+    is_text = isinstance(source, str)
+    newline, sign = ("\n", "#") if is_text else (b"\n", b"#")
+    marker = newline + sign
+
+    spans: dict[str, BlockSpan] = {}
+    name: str | None = None     # block the lines are passed over for, None between blocks
+    body, body_line = 0, 0      # offset and number of the first line of the block
+
+    line_number, counted = 1, 0 # number of the line at `counted` offset
+
+    # only a line which starts with "#" can start or end a block
+    start = 0 if source[:1] == sign else find_line(source, marker, 0)
+
+    while start != -1:
+        end = source.find(newline, start)
+        if end == -1:
+            end = len(source)
+
+        line_number += count_lines(source, counted, start)
+        counted = start
+
+        line = source[start:end] if is_text else source[start:end].decode("utf-8")
+        line = line.split(COMMENT_SYMBOL, 1)[0].rstrip()
+
+        if line.startswith(START_BLOCK) or line.startswith(END_BLOCK):
+            if name:
+                spans[name] = BlockSpan(body, start, body_line)
+
+            name = line.partition(" ")[2].strip() if line.startswith(START_BLOCK) else None
+            body, body_line = end + 1, line_number + 1
+
+        start = find_line(source, marker, end)
+
+    if name:
+        spans[name] = BlockSpan(body, len(source), body_line)
+
+    return spans
+
+def find_line(source: Source, marker: str | bytes, position: int) -> int:
+
+    """
+    Returns the offset of the next line which starts with the character after "\\n" in the marker, -1 if there is none
+    """
+
+    found = source.find(marker, position)
+    return found + 1 if found != -1 else -1
+
+def count_lines(source: Source, start: int, end: int) -> int:
+    if not isinstance(source, mmap.mmap):
+        return source.count("\n" if isinstance(source, str) else b"\n", start, end)
+
+    return sum(
+        source[position:min(position + COUNT_CHUNK, end)].count(b"\n")
+        for position in range(start, end, COUNT_CHUNK)
+    )
+
+def read_block(source: Source, span: BlockSpan) -> BlockData:
+
+    """
+    Tokenizes and decodes the lines of a block
+    """
+
+    text = source[span.start:span.end]
+    if not isinstance(text, str):
+        text = text.decode("utf-8")
+
+    block = BlockData()
+    for line_number, line in enumerate(text.split("\n"), span.line_number):
+        line = line.split(COMMENT_SYMBOL, 1)[0].rstrip()
+        if line:
+            tokens = tokenize(line)
+            block.data.append((line_number, tokens))
+            block.code.append(decode(line_number, tokens))
+
+    return block
+
+
+def tokenize(line: str) -> list[str]:
+
+    """
+    Splits a line into tokens: words separated by whitespace, and strings in quotes which keep their spaces.
+    A quote without a pair is a part of the word, and an empty string "" is kept with its quotes
+    """
+
+    if '"' not in line:
+        return line.split()
+
+    tokens: list[str] = []
+    position, length = 0, len(line)
+
+    while position < length:
+        if line[position].isspace():
+            position += 1
+            continue
+
+        if line[position] == '"':
+            end = line.find('"', position + 1)
+            if end != -1:
+                tokens.append(line[position + 1:end] or '""')
+                position = end + 1
+                continue
+
+        # a word ends at whitespace, quotes in it are its characters
+        end = position + 1
+        while end < length and not line[end].isspace():
+            end += 1
+
+        tokens.append(line[position:end])
+        position = end
+
+    return tokens
+
+def decode(line_number: int, tokens: list[str]) -> Instruction:
+
+    """
+    Turns a tokenized line into an instruction with a numeric opcode
+    """
+
+    command, args = tokens[0], tuple(tokens[1:])
+    line_str = " ".join(tokens)
+
+    # an undefined command keeps its name as the only argument for the error message
+    if command not in ARGUMENTS_COUNT:
+        return Instruction(UNDEFINED_COMMAND, (command,), line_number, line_str)
+
+    arguments_count = ARGUMENTS_COUNT[command]
+    if len(args) < arguments_count:
+        return Instruction(INVALID_SYNTAX, args, line_number, line_str)
+
+    return Instruction(int(command), args[:arguments_count], line_number, line_str)
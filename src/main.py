@@ -1,19 +1,51 @@
+"""
+Entry point of the command line, the commands are in cli.py.
+
+Python starts in about 10 ms and click takes longer than that to import, so `main.py run FILENAME`
+without options doesn't import it: such a program is run here as the `run` command runs it
+with its default options. Any other command line goes to click.
+
+Without arguments main.py runs the default example, as it did before it had commands.
+"""
+
+import os, sys
+
+from constants import DEFAULT_PROGRAM, VERSION
+from program import Program
+from output import get_default_output
+from inputs import BufferedInput
+
 __author__ = "AlmazCode"
-__vertion__ = "1.1o"
+__vertion__ = VERSION
+
+
+def is_plain_run(args: list[str]) -> bool:
+    return len(args) == 2 and args[0] == "run" and not args[1].startswith("-") and os.path.isfile(args[1]) and os.access(args[1], os.R_OK)
+
+def run_plain(filename: str) -> None:
+
+    """
+    Runs the program the same way as `run FILENAME`: cached, optimized, stdin as the input
+    """
+
+    try:
+        Program.load(filename).run(BufferedInput(sys.stdin.buffer), get_default_output(), is_reporting = True)
 
-import click
-from interpreter import Interpreter
+    # the same as click does with an interrupted command
+    except KeyboardInterrupt:
+        print("\nAborted!", file = sys.stderr)
+        raise SystemExit(1)
 
-@click.command()
-@click.argument("filename", default="src/Examples/testing conditions.cft", required=False, type=click.Path(exists=True, readable=True))
-def run(filename):
-    """C42 Interpretator"""
+def main(args: list[str]) -> None:
+    if not args:
+        args = ["run", DEFAULT_PROGRAM]
 
-    with open(filename, "r", encoding="utf-8") as file:
-        code = file.read()
+    if is_plain_run(args):
+        run_plain(args[1])
+        return
 
-    C42 = Interpreter(code)
-    C42.interpret()
+    from cli import cli
+    cli(args)
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    main(sys.argv[1:])
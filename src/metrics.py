@@ -0,0 +1,96 @@
+"""
+Runtime metrics of C42 programs: what the engines have done in the runs, as a JSON summary (`run --stats`)
+or in the Prometheus text format for the textfile collector of node_exporter (`run --prometheus`, `serve --prometheus`).
+
+The engines count only in their counted loops (see Interpreter.set_metrics), the same loops which check the limits.
+The counters are updated once per run of a block, the executed lines are the distance the index of the block
+has moved without the lines conditions have skipped (the same count as --max-instructions and benchmarks/suite.py),
+and the strings are measured every `check_interval` lines, so the counting costs only a few percent.
+A Metrics object given to many runs adds them up: the server counts all the programs it has run in one object.
+"""
+
+from dataclasses import asdict, dataclass, field
+
+from cell import IntegerCell, FloatCell, StringCell
+from files import write_atomically
+
+
+CHECK_INTERVAL = 4096 # lines between two measurements of the strings of a run without limits
+
+# names of the types of cells in the metrics
+CELL_TYPES = {IntegerCell: "int", FloatCell: "float", StringCell: "string"}
+
+
+@dataclass(slots=True)
+class Metrics:
+    """
+    Represents the counters of the runs of programs.
+    """
+
+    runs: int = 0                   # runs which have ended (finished, exited or stopped by an error)
+    seconds: float = 0.0            # wall-clock time of the runs
+    instructions: int = 0           # lines executed, not skipped by conditions, a superinstruction counts as the lines it runs
+    blocks: int = 0                 # blocks started by 23 and 35 commands, with the main block
+    loop_iterations: int = 0        # iterations of 35 loops, the first ones too
+    peak_depth: int = 0             # most blocks on the execution stack at once, with the running one
+    peak_string_length: int = 0     # longest total length of the strings in the cells (in characters), measured between blocks
+    input_seconds: float = 0.0      # time 03 commands have waited for input
+    sleep_seconds: float = 0.0      # time 34 commands have slept
+    cells: dict[str, int] = field(default_factory = dict) # cells by their type at the end of the last run
+
+
+def summary(metrics: Metrics, **values) -> dict:
+
+    """
+    Returns the metrics as a dict for a JSON summary, with the other `values` of the run before them
+    """
+
+    return {**values, **asdict(metrics)}
+
+def to_prometheus(metrics: Metrics, labels: dict[str, str] | None = None) -> str:
+
+    """
+    Returns the metrics in the Prometheus text exposition format, every sample with the `labels`
+    """
+
+    rows: list[str] = []
+
+    def family(name: str, kind: str, help: str, samples: list[tuple[dict[str, str], int | float]]) -> None:
+        rows.append(f"# HELP {name} {help}")
+        rows.append(f"# TYPE {name} {kind}")
+        for sample_labels, value in samples:
+            rows.append(f"{name}{format_labels({**(labels or {}), **sample_labels})} {value}")
+
+    family("c42_runs_total", "counter", "Runs of C42 programs which have ended.", [({}, metrics.runs)])
+    family("c42_run_seconds_total", "counter", "Wall-clock time of the runs.", [({}, metrics.seconds)])
+    family("c42_instructions_total", "counter", "Lines executed, without the lines skipped by conditions.", [({}, metrics.instructions)])
+    family("c42_blocks_total", "counter", "Blocks started by 23 and 35 commands, with the main block.", [({}, metrics.blocks)])
+    family("c42_loop_iterations_total", "counter", "Iterations of 35 loops.", [({}, metrics.loop_iterations)])
+    family("c42_blocked_seconds_total", "counter", "Time the programs have waited for input (03) and slept (34).", [
+        ({"command": "03"}, metrics.input_seconds),
+        ({"command": "34"}, metrics.sleep_seconds),
+    ])
+    family("c42_stack_depth_peak", "gauge", "Most blocks on the execution stack at once.", [({}, metrics.peak_depth)])
+    family("c42_string_length_peak", "gauge", "Longest total length of the strings in the cells, in characters.", [({}, metrics.peak_string_length)])
+    family("c42_cells", "gauge", "Cells at the end of the last run by their type.", [
+        ({"type": name}, metrics.cells.get(name, 0)) for name in CELL_TYPES.values()
+    ])
+
+    return "\n".join(rows) + "\n"
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{name}="{escape(str(value))}"' for name, value in labels.items()) + "}"
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def write_textfile(path: str, metrics: Metrics, labels: dict[str, str] | None = None) -> None:
+
+    """
+    Writes the metrics into a file of the textfile collector, the collector never reads a half-written file
+    """
+
+    write_atomically(path, to_prometheus(metrics, labels).encode("utf-8"))
@@ -0,0 +1,260 @@
+"""
+Peephole optimizer: rewrites decoded blocks into superinstructions before execution.
+
+Rules:
+    04 with a constant       ASSIGN_CONSTANT, the decoded value is written into the cell by its slot
+    condition + 42 or 23     COMPARE_JUMP, the condition returns or calls without the skip flag
+    09/10 + condition        STEP_CONDITION, the step is made without a handler
+    04 + 05                  FUSED_LINES, both lines by one dispatch
+    lines after 01 and 42    dropped when they can't be reached
+    commands of known types  TYPED_ARITHMETIC, TYPED_STEP, TYPED_COPY, TYPED_CONDITION without the type checks
+
+A superinstruction takes the place of the first line of the idiom and keeps its line number,
+the second line stays in the block after it. A superinstruction skips that line itself, but if
+the superinstruction is skipped by a condition above it, the second line is executed as usual,
+so conditions work the same as without the optimizer.
+
+Typed commands are made only for the lines where the verifier has proven that the cells exist
+and has inferred their types (see verifier.py), so they can't fail with CFTE errors.
+"""
+
+import math, operator
+
+from typing import Callable
+
+from constants import *
+from cfttypes import *
+
+
+# comparisons of the conditions (13-18 commands)
+CONDITIONS: dict[int, Callable] = {
+    int(EQUAL_CELLS):           operator.eq,
+    int(NOT_EQUAL_CELLS):       operator.ne,
+    int(GREATER_THAN_CELLS):    operator.gt,
+    int(LESS_THAN_CELLS):       operator.lt,
+    int(GREATER_EQUAL_CELLS):   operator.ge,
+    int(LESS_EQUAL_CELLS):      operator.le,
+}
+
+JUMPS       = (int(RETURN), int(CALL_BLOCK))            # lines fused with the condition above them
+STEPS       = (int(INCREMENT_CELL), int(DECREMENT_CELL))
+CALLS       = (int(CALL_BLOCK), int(START_LOOP))        # lines after which a block can be continued
+ENDS        = (int(EXIT), int(RETURN))                  # lines after which nothing in the block runs
+
+SUPERINSTRUCTIONS = {
+    FUSED_LINES:        "FUSED_LINES",
+    COMPARE_JUMP:       "COMPARE_JUMP",
+    ASSIGN_CONSTANT:    "ASSIGN_CONSTANT",
+    STEP_CONDITION:     "STEP_CONDITION",
+    TYPED_ARITHMETIC:   "TYPED_ARITHMETIC",
+    TYPED_STEP:         "TYPED_STEP",
+    TYPED_COPY:         "TYPED_COPY",
+    TYPED_CONDITION:    "TYPED_CONDITION",
+}
+
+INTEGER, STRING, FLOAT = CellDataType.INTEGER, CellDataType.STRING, CellDataType.FLOAT
+
+
+def divide_integers(a: int, b: int) -> int:
+    # 08 writes the quotient into an int cell through int()
+    return int(a / b)
+
+# operations of the typed arithmetic by the command and the types of its cells, a sum of strings
+# stays a 05 command, so the interpreter can check the length of strings there (see Limits)
+OPERATIONS: dict[tuple[int, CellDataType, CellDataType], Callable] = {
+    (int(SUM_CELLS), INTEGER, INTEGER):         operator.add,
+    (int(SUM_CELLS), FLOAT, FLOAT):             operator.add,
+    (int(SUBTRACT_CELLS), INTEGER, INTEGER):    operator.sub,
+    (int(SUBTRACT_CELLS), FLOAT, FLOAT):        operator.sub,
+    (int(MULTIPLY_CELLS), INTEGER, INTEGER):    operator.mul,
+    (int(MULTIPLY_CELLS), FLOAT, FLOAT):        operator.mul,
+    (int(DIVIDE_CELLS), INTEGER, INTEGER):      divide_integers,
+    (int(DIVIDE_CELLS), FLOAT, FLOAT):          operator.truediv,
+    (int(MODULO_CELLS), INTEGER, INTEGER):      operator.mod,
+    (int(MODULO_CELLS), FLOAT, FLOAT):          operator.mod,
+    (int(BITWISE_AND), INTEGER, INTEGER):       operator.and_,
+    (int(BITWISE_OR), INTEGER, INTEGER):        operator.or_,
+    (int(BITWISE_XOR), INTEGER, INTEGER):       operator.xor,
+    (int(MAX_CELLS), INTEGER, INTEGER):         max,
+    (int(MAX_CELLS), FLOAT, FLOAT):             max,
+    (int(MIN_CELLS), INTEGER, INTEGER):         min,
+    (int(MIN_CELLS), FLOAT, FLOAT):             min,
+    (int(GCD_CELLS), INTEGER, INTEGER):         math.gcd,
+    (int(LCM_CELLS), INTEGER, INTEGER):         math.lcm,
+}
+
+
+def optimize(blocks: dict[str, BlockData], types: dict[int, tuple[CellDataType | None, ...]] | None = None) -> dict[str, BlockData]:
+
+    """
+    Returns new blocks with optimized code, the given blocks aren't changed (they can be shared).
+    The cells of the instructions have to be resolved already, `types` are the types of the cells
+    by line numbers from verifier.infer_types, the lines with known types become typed commands
+    """
+
+    # a condition at the end of a block can skip the first line executed after the block
+    has_leaking_skips = any(block.code and block.code[-1].opcode in CONDITIONS for block in blocks.values())
+
+    optimized: dict[str, BlockData] = {}
+    for name, block in blocks.items():
+        optimized[name] = BlockData(block.data)
+        optimized[name].code = optimize_code(block.code, has_leaking_skips, types or {})
+
+    return optimized
+
+def optimize_code(code: list[Instruction], has_leaking_skips: bool, types: dict[int, tuple[CellDataType | None, ...]]) -> list[Instruction]:
+    code = drop_unreachable(code, has_leaking_skips)
+    code = [fold_constant(instruction) for instruction in code]
+
+    # from the end, so a line can be fused with a superinstruction under it (09, 13, 42 is one dispatch)
+    for index in range(len(code) - 2, -1, -1):
+        first, second = code[index], code[index + 1]
+
+        if first.opcode in CONDITIONS and second.opcode in JUMPS:
+            code[index] = Instruction(
+                COMPARE_JUMP, first.args, first.line_number, first.text, first.cells,
+                (first, second, CONDITIONS[first.opcode], *first.cells)
+            )
+
+        elif first.opcode in STEPS and (second.opcode in CONDITIONS or second.opcode == COMPARE_JUMP):
+            code[index] = Instruction(
+                STEP_CONDITION, first.args, first.line_number, first.text, first.cells,
+                (first, second, 1 if first.opcode == int(INCREMENT_CELL) else -1, first.cells[0])
+            )
+
+        elif first.opcode == ASSIGN_CONSTANT and second.opcode == int(SUM_CELLS):
+            code[index] = Instruction(
+                FUSED_LINES, first.args, first.line_number, first.text, first.cells,
+                (first, second)
+            )
+
+    # after the fusion, which looks for the commands as they are written
+    return [specialize(instruction, types) for instruction in code]
+
+def drop_unreachable(code: list[Instruction], has_leaking_skips: bool) -> list[Instruction]:
+
+    """
+    Drops lines after the first 01 or 42 which is always executed when it's reached
+    """
+
+    for index, instruction in enumerate(code):
+        if instruction.opcode not in ENDS:
+            continue
+
+        # a line under a condition can be skipped, as well as the first line of the block
+        # or a line after a call if a skip can come from another block
+        if index > 0 and code[index - 1].opcode in CONDITIONS:
+            continue
+        if has_leaking_skips and (index == 0 or code[index - 1].opcode in CALLS):
+            continue
+
+        return code[:index + 1]
+
+    return list(code)
+
+def fold_constant(instruction: Instruction) -> Instruction:
+
+    """
+    Returns ASSIGN_CONSTANT for a 04 command, its value is decoded already (see Interpreter.resolve)
+    """
+
+    if instruction.opcode != int(ASSIGN_VALUE):
+        return instruction
+
+    return Instruction(ASSIGN_CONSTANT, instruction.args, instruction.line_number, instruction.text, instruction.cells, instruction.operands)
+
+def specialize(instruction: Instruction, types: dict[int, tuple[CellDataType | None, ...]]) -> Instruction:
+
+    """
+    Returns the typed command for an instruction whose cells have known types, else the instruction itself.
+    A superinstruction gets its second line specialized, the first one is used only for errors or not at all
+    """
+
+    opcode = instruction.opcode
+
+    if opcode in (FUSED_LINES, COMPARE_JUMP, STEP_CONDITION):
+        first, second, *rest = instruction.operands
+        return Instruction(
+            opcode, instruction.args, instruction.line_number, instruction.text, instruction.cells,
+            (first, specialize(second, types), *rest)
+        )
+
+    cell_types = types.get(instruction.line_number)
+    if not cell_types or None in cell_types:
+        return instruction
+
+    if opcode in CONDITIONS:
+        return Instruction(
+            TYPED_CONDITION, instruction.args, instruction.line_number, instruction.text, instruction.cells,
+            (CONDITIONS[opcode], *instruction.cells)
+        )
+
+    if opcode == int(COPY_CELL) and cell_types[0] is cell_types[1]:
+        return Instruction(TYPED_COPY, instruction.args, instruction.line_number, instruction.text, instruction.cells)
+
+    if (operation := OPERATIONS.get((opcode, *cell_types))) is not None:
+        return Instruction(
+            TYPED_ARITHMETIC, instruction.args, instruction.line_number, instruction.text, instruction.cells,
+            (operation, *instruction.cells)
+        )
+
+    if opcode in STEPS or opcode == int(ADD_CONSTANT):
+        step = get_step(instruction, cell_types[0])
+        if step is not None:
+            return Instruction(
+                TYPED_STEP, instruction.args, instruction.line_number, instruction.text, instruction.cells,
+                (instruction.cells[0], step)
+            )
+
+    return instruction
+
+def get_step(instruction: Instruction, cell_type: CellDataType) -> int | float | None:
+
+    """
+    Returns what 09, 10 or 24 adds to a number cell of the type, None if the command fails or crashes on it
+    """
+
+    # 09 and 10 fail on strings, and 24 appends to a string cell by itself: adding to its value
+    # in the typed step would join the appended pieces every time (see StringCell)
+    if cell_type is STRING:
+        return None
+
+    if instruction.opcode in STEPS:
+        step = 1 if instruction.opcode == int(INCREMENT_CELL) else -1
+        return step if cell_type is INTEGER else float(step)
+
+    # the value of 24 from the constant pool, None if it isn't a number of the type
+    integer, real, _ = instruction.operands
+    return integer if cell_type is INTEGER else real
+
+
+def describe(instruction: Instruction) -> str:
+
+    """
+    Returns the text of an instruction, superinstructions are shown with the lines they're made of
+    """
+
+    if instruction.opcode in (FUSED_LINES, COMPARE_JUMP, STEP_CONDITION):
+        first, second = instruction.operands[:2]
+        return f"{SUPERINSTRUCTIONS[instruction.opcode]}({describe(first)} ; {describe(second)})"
+    if instruction.opcode == ASSIGN_CONSTANT:
+        return f"{SUPERINSTRUCTIONS[instruction.opcode]}({instruction.text} -> {instruction.operands[:2]})"
+    if instruction.opcode in SUPERINSTRUCTIONS:
+        return f"{SUPERINSTRUCTIONS[instruction.opcode]}({instruction.text})"
+
+    return instruction.text
+
+def dump(blocks: dict[str, BlockData]) -> str:
+
+    """
+    Returns the optimized code in text form, for the --dump-optimized option
+    """
+
+    rows = []
+
+    for name, block in blocks.items():
+        rows.append(f"{START_BLOCK} {name}")
+        rows.extend(f"    [{instruction.line_number}] {describe(instruction)}" for instruction in block.code)
+        rows.append(END_BLOCK)
+
+    return "\n".join(rows)
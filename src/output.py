@@ -0,0 +1,99 @@
+import sys
+
+from typing import TextIO
+
+
+CLEAR_SCREEN = "\x1b[H\x1b[2J\x1b[3J" # moves the cursor home, clears the screen and the scrollback (for 12's command)
+
+
+def decode_escapes(value: str) -> str:
+
+    """
+    Returns a string with `\\n` sequences turned into new lines, a string without them is returned as it is.
+    The values of 04 and 24 are decoded once in the constant pool (see Interpreter.resolve), 02 prints the cells as they are
+    """
+
+    return value.replace("\\n", "\n")
+
+
+class Output:
+    """
+    Base class of output sinks, everything a program prints (02 and 12 commands) goes through a sink.
+    """
+
+    def write(self, text: str) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def clear(self) -> None:
+        self.write(CLEAR_SCREEN)
+
+class BufferedOutput(Output):
+    """
+    Collects the text in memory and writes it into the stream at once when the buffer is full
+    (or when a line is finished if it's line-buffered) and when it's flushed.
+    """
+
+    def __init__(self, stream: TextIO | None = None, buffer_size: int = 8192, line_buffering: bool = False) -> None:
+        self.stream = stream if stream is not None else sys.stdout
+        self.buffer_size = buffer_size
+        self.line_buffering = line_buffering
+
+        self.__buffer: list[str] = []   # text which isn't written into the stream yet
+        self.__size: int = 0            # length of the text in the buffer
+
+    def write(self, text: str) -> None:
+        self.__buffer.append(text)
+        self.__size += len(text)
+
+        if self.__size >= self.buffer_size or (self.line_buffering and "\n" in text):
+            self.flush()
+
+    def flush(self) -> None:
+        if self.__buffer:
+            self.stream.write("".join(self.__buffer))
+            self.__buffer.clear()
+            self.__size = 0
+        self.stream.flush()
+
+class LineBufferedOutput(BufferedOutput):
+    """
+    Writes the text into the stream every time a line is finished, for interactive programs.
+    """
+
+    def __init__(self, stream: TextIO | None = None, buffer_size: int = 8192) -> None:
+        super().__init__(stream, buffer_size, True)
+
+class BlockBufferedOutput(BufferedOutput):
+    """
+    Writes the text into the stream only when the buffer is full, for output that goes into files and pipes.
+    """
+
+    def __init__(self, stream: TextIO | None = None, buffer_size: int = 65536) -> None:
+        super().__init__(stream, buffer_size, False)
+
+class CapturedOutput(Output):
+    """
+    Keeps all the text in memory, for embedding the interpreter.
+    """
+
+    def __init__(self) -> None:
+        self.__chunks: list[str] = []
+
+    def write(self, text: str) -> None:
+        self.__chunks.append(text)
+
+    def getvalue(self) -> str:
+        return "".join(self.__chunks)
+
+
+def get_default_output(stream: TextIO | None = None) -> Output:
+
+    """
+    Returns a line-buffered sink for a terminal and a block-buffered one for files and pipes
+    """
+
+    stream = stream if stream is not None else sys.stdout
+    return LineBufferedOutput(stream) if stream.isatty() else BlockBufferedOutput(stream)
@@ -0,0 +1,202 @@
+"""
+Profiler of C42 programs: hit counts and time per source line, per opcode and per block.
+
+Profiling is done by a subclass of the interpreter which wraps every command handler,
+so the reference interpreter itself has no instrumentation and runs at full speed.
+"""
+
+import constants
+
+from time import perf_counter
+from typing import Callable
+
+from constants import *
+from cfttypes import *
+
+from interpreter import Interpreter
+from output import Output
+from inputs import Input
+
+
+# names of commands by opcode for the report (e.g. 2 -> "PRINT")
+OPCODE_NAMES: dict[int, str] = {
+    int(value): name for name, value in vars(constants).items()
+    if name.isupper() and isinstance(value, str) and value in ARGUMENTS_COUNT
+}
+OPCODE_NAMES[UNDEFINED_COMMAND] = "UNDEFINED_COMMAND"
+OPCODE_NAMES[INVALID_SYNTAX]    = "INVALID_SYNTAX"
+
+
+class Profile:
+    """
+    Statistics collected while a program runs.
+
+    Time is measured per executed line and charged to the line, its opcode and the stack of blocks
+    it has run in. The stack is the block of the line and the blocks which have called it with 23 and 35,
+    a caller whose last line is the call is in it too, so the time of a block includes the blocks called from it.
+    """
+
+    def __init__(self) -> None:
+        self.lines: dict[int, list] = {}        # line number -> [hits, seconds, text]
+        self.opcodes: dict[int, list] = {}      # opcode -> [hits, seconds]
+        self.blocks: dict[str, int] = {}        # block name -> times the block has started (every loop iteration too)
+        self.stacks: dict[str, float] = {}      # "main;loop;body" -> seconds of the lines executed in this stack
+
+    def add_line(self, instruction: Instruction, stack: str, seconds: float) -> None:
+        line = self.lines.get(instruction.line_number)
+        if line is None:
+            line = self.lines[instruction.line_number] = [0, 0.0, instruction.text]
+        line[0] += 1
+        line[1] += seconds
+
+        opcode = self.opcodes.get(instruction.opcode)
+        if opcode is None:
+            opcode = self.opcodes[instruction.opcode] = [0, 0.0]
+        opcode[0] += 1
+        opcode[1] += seconds
+
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + seconds
+
+    def add_block(self, name: str) -> None:
+        self.blocks[name] = self.blocks.get(name, 0) + 1
+
+    def get_block_times(self) -> dict[str, tuple[float, float]]:
+
+        """
+        Returns the total time (with the called blocks) and the own time of every block
+        """
+
+        times: dict[str, list[float]] = {name: [0.0, 0.0] for name in self.blocks}
+
+        for stack, seconds in self.stacks.items():
+            names = stack.split(";")
+
+            # a recursive block is counted once per stack
+            for name in set(names):
+                times.setdefault(name, [0.0, 0.0])[0] += seconds
+            times[names[-1]][1] += seconds
+
+        return {name: (total, own) for name, (total, own) in times.items()}
+
+    def report(self, limit: int = 20) -> str:
+
+        """
+        Returns a text report sorted by time, `limit` rows in every table
+        """
+
+        rows = ["", "Blocks:", f"{'block':<24}{'starts':>10}{'total s':>12}{'own s':>12}"]
+        block_times = self.get_block_times()
+        for name, (total, own) in sorted(block_times.items(), key = lambda item: -item[1][0])[:limit]:
+            rows.append(f"{name:<24}{self.blocks.get(name, 0):>10}{total:>12.6f}{own:>12.6f}")
+
+        rows += ["", "Lines:", f"{'line':>6}{'hits':>10}{'seconds':>12}  command"]
+        for number, (hits, seconds, text) in sorted(self.lines.items(), key = lambda item: -item[1][1])[:limit]:
+            rows.append(f"{number:>6}{hits:>10}{seconds:>12.6f}  {text}")
+
+        rows += ["", "Commands:", f"{'command':<24}{'hits':>10}{'seconds':>12}"]
+        for opcode, (hits, seconds) in sorted(self.opcodes.items(), key = lambda item: -item[1][1])[:limit]:
+            name = f"{opcode:02} {OPCODE_NAMES.get(opcode, '?')}"
+            rows.append(f"{name:<24}{hits:>10}{seconds:>12.6f}")
+
+        return "\n".join(rows)
+
+    def collapsed(self) -> str:
+
+        """
+        Returns the stacks in the collapsed format of flamegraph tools ("main;loop;body 1234"), values are microseconds
+        """
+
+        return "".join(f"{stack} {round(seconds * 1_000_000)}\n" for stack, seconds in sorted(self.stacks.items()))
+
+
+class ProfiledInterpreter(Interpreter):
+    """
+    Interpreter which collects a Profile of the program, see the profiler module.
+    """
+
+    def __init__(
+            self,
+            source: str,
+            blocks: dict[str, BlockData] | None = None,
+            output: Output | None = None,
+            input: Input | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            limits: Limits | None = None):
+
+        # lines are profiled as they are written, not as superinstructions
+        super().__init__(source, blocks, output, input, on_eof, optimize = False, limits = limits)
+
+    def reset(
+            self,
+            output: Output | None = None,
+            input: Input | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            limits: Limits | None = None) -> None:
+
+        # every run has its own profile, the handlers are made by the reset of the interpreter
+        self.profile: Profile           = Profile()
+        self.__stack: str | None        = None  # blocks of the current line in the collapsed format, None before the main block
+        self.__stacks: dict[int, str]   = {}    # id of a frame on the execution stack -> blocks of its lines
+
+        super().reset(output, input, on_eof, limits)
+
+    def execute_block(self, name: str, is_looping: bool, index: int) -> None:
+        super().execute_block(name, is_looping, index)
+
+        # the stack of the new block is taken from its caller, not from the execution stack: the interpreter drops
+        # the frame of a caller whose last line is the call. A block already in the stack (recursion) is folded
+        # into its first call, so the stack of a chain of such calls doesn't grow with every call
+        if self.__stack is None:
+            stack = name
+        else:
+            names = self.__stack.split(";")
+            stack = ";".join(names[:names.index(name) + 1]) if name in names else f"{self.__stack};{name}"
+
+        self.__stacks[id(self.execution_stack[-1])] = stack
+
+    def enter_frame(self) -> ExecutionFrame:
+        frame = super().enter_frame()
+
+        # a frame restored from a snapshot has no stack, every frame left on the execution stack is waiting for it
+        self.__stack = self.__stacks.pop(id(frame), None)
+        if self.__stack is None:
+            self.__stack = ";".join([waiting.block_name for waiting in self.execution_stack] + [frame.block_name])
+
+        if frame.index == 0:
+            self.profile.add_block(frame.block_name)
+
+        return frame
+
+    def leave_frame(self, frame: ExecutionFrame) -> bool:
+
+        # the next iteration of a loop doesn't go through enter_frame
+        is_restarted = super().leave_frame(frame)
+        if is_restarted:
+            self.profile.add_block(frame.block_name)
+
+        # a frame put under the new block goes on with its stack after the new block is finished
+        stack = self.execution_stack
+        if len(stack) > 1 and stack[-2] is frame:
+            self.__stacks[id(frame)] = self.__stack
+
+        return is_restarted
+
+    def get_handlers(self) -> list[Callable[[Instruction], bool | None]]:
+        return [self.profile_handler(handler) for handler in super().get_handlers()]
+
+    def profile_handler(self, handler: Callable[[Instruction], bool | None]) -> Callable[[Instruction], bool | None]:
+
+        """
+        Returns the handler which measures the time of every command it executes
+        """
+
+        add_line = self.profile.add_line
+
+        def profiled(instruction: Instruction) -> bool | None:
+            start = perf_counter()
+            try:
+                return handler(instruction)
+            finally:
+                add_line(instruction, self.__stack, perf_counter() - start)
+
+        return profiled
@@ -0,0 +1,256 @@
+"""
+Embedding API: a C42 program is prepared once and run many times in the same process.
+
+    program = Program.load("hello.cft")
+    result = program.run("Almaz\n", seed = 42)
+    print(result.output, result.reason, result.error)
+
+Every run starts with empty cells and its own input and output, and returns a RunResult instead of
+exiting the process. Errors and "[Program Finished]" aren't written into the output, they are
+in the result (is_reporting = True writes them as the command line does).
+
+run() keeps the engine between runs, so the program is parsed, checked and optimized (or compiled) once,
+and a Program isn't thread-safe. run_async() makes an AsyncInterpreter with its own cells for every run,
+so any number of runs of one program can go on in an event loop at once. They share the code prepared once
+by prepare(): the resolved cells, the constant pool and the optimized blocks.
+"""
+
+import inspect, time
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, Mapping
+
+import exception, lexer
+
+from cfttypes import *
+from interpreter import Interpreter
+from bytecode import load_program
+from output import Output, CapturedOutput
+from inputs import Input, IterableInput
+
+# only the runs which are given these import them (see benchmarks/startup.py)
+if TYPE_CHECKING:
+    from checkpoint import Snapshot
+    from hooks import Hooks
+    from metrics import Metrics
+    from replay import Trace
+
+
+@dataclass(slots=True)
+class RunResult:
+    """
+    Represents the result of a run of a program.
+    """
+
+    reason: ExitReason          # why the program has stopped
+    output: str | None          # everything the program has printed, None if it has printed into a given output
+    error: ProgramError | None  # the error which has stopped the program, None if there was no error
+    seconds: float              # wall-clock time of the run
+
+    @property
+    def is_ok(self) -> bool:
+        return self.error is None
+
+
+class Program:
+    """
+    A parsed C42 program which can be run many times with fresh cells.
+    """
+
+    def __init__(
+            self,
+            source: lexer.Source,
+            blocks: Mapping[str, BlockData] | None = None,
+            engine: type[Interpreter] = Interpreter,
+            optimize: bool = True):
+
+        self.source: lexer.Source               = source
+        self.blocks: Mapping[str, BlockData]    = blocks if blocks is not None else Interpreter.parse(source) # the code as it is written
+        self.engine: type[Interpreter]          = engine
+        self.optimize: bool                     = optimize # ignored by the engines which take the lines as they are written
+        self.interpreter: Interpreter | None    = None  # engine of the runs of run(), made by the first one
+        self.prepared: PreparedCode | None      = None  # code of the runs of run_async(), see prepare()
+
+    @classmethod
+    def load(cls, path: str, cache: bool = True, lazy: bool = False, reachable_only: bool = False, **kwargs) -> "Program":
+
+        """
+        Reads a program from a .cft file, the parsed program is kept in a .c42c file next to it if `cache` is true.
+        A `lazy` program is memory-mapped and its blocks are tokenized when they first run (see lexer.py),
+        with `reachable_only` only the blocks the program can call are parsed (see verifier.find_reachable).
+        Both aren't cached
+        """
+
+        if lazy:
+            source = lexer.map_file(path)
+        else:
+            with open(path, "r", encoding = "utf-8") as file:
+                source = file.read()
+
+        if not lazy and not reachable_only:
+            return cls(source, load_program(path, source, Interpreter.parse) if cache else None, **kwargs)
+
+        blocks = lexer.parse_lazily(source)
+        if reachable_only:
+            blocks = select_reachable(blocks, lazy)
+
+        return cls(source, blocks, **kwargs)
+
+    def run(
+            self,
+            input: Input | Iterable[str] | str | None = None,
+            output: Output | None = None,
+            seed: int | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            limits: Limits | None = None,
+            is_reporting: bool = False,
+            checkpoints: Checkpoints | None = None,
+            snapshot: "Snapshot | None" = None,
+            hooks: "Hooks | None" = None,
+            metrics: "Metrics | None" = None,
+            recording: "Trace | None" = None,
+            replaying: "Trace | None" = None) -> RunResult:
+
+        """
+        Runs the program and returns its result. The input can be an Input, lines or a text,
+        the output is captured into the result if no output is given.
+        With the interpreter engine the state of the run can be saved into `checkpoints` and restored from a `snapshot`,
+        and `hooks` get the events of the run (see hooks.py). The run is added to `metrics` (see metrics.py).
+        What the run takes from outside the program is recorded into the `recording` trace, and a run `replaying`
+        a trace takes it from there instead of the input (see replay.py)
+        """
+
+        captured = CapturedOutput() if output is None else None
+        output = captured if captured is not None else output
+
+        if self.interpreter is None:
+            self.interpreter = self.make_interpreter(self.engine, output, get_input(input), on_eof, limits)
+        else:
+            self.interpreter.reset(output, get_input(input), on_eof, limits)
+
+        C42 = self.interpreter
+        start = prepare_run(C42, seed, is_reporting)
+
+        C42.set_checkpoints(checkpoints)
+        C42.set_hooks(hooks)
+        C42.set_metrics(metrics)
+        if snapshot is not None:
+            C42.restore(snapshot)
+        if recording is not None:
+            C42.record(recording)
+        if replaying is not None:
+            C42.replay(replaying)
+
+        # the async engine catches its ProgramExit itself, the others raise it.
+        # asyncio is imported only for it, it's the longest import of a run
+        try:
+            if inspect.iscoroutinefunction(C42.interpret):
+                import asyncio
+                asyncio.run(C42.interpret())
+            else:
+                C42.interpret()
+        except exception.ProgramExit:
+            pass
+
+        return get_result(C42, captured, start)
+
+    async def run_async(
+            self,
+            input: Input | Iterable[str] | str | None = None,
+            output: Output | None = None,
+            seed: int | None = None,
+            on_eof: EOFPolicy = EOFPolicy.ERROR,
+            limits: Limits | None = None,
+            is_reporting: bool = False,
+            yield_interval: int = 1000,
+            metrics: "Metrics | None" = None) -> RunResult:
+
+        """
+        Runs the program as a coroutine of the current event loop, see run()
+        """
+
+        from async_interpreter import AsyncInterpreter
+
+        captured = CapturedOutput() if output is None else None
+        output = captured if captured is not None else output
+
+        C42 = self.make_interpreter(
+            AsyncInterpreter, output, get_input(input), on_eof, limits,
+            yield_interval = yield_interval, prepared = self.prepare()
+        )
+        start = prepare_run(C42, seed, is_reporting)
+        C42.set_metrics(metrics)
+        await C42.interpret()
+
+        return get_result(C42, captured, start)
+
+    def prepare(self) -> PreparedCode | None:
+
+        """
+        Returns the code of the runs of run_async(), it's resolved and optimized by the first call only.
+        A lazily parsed program has none, every run prepares the blocks it uses (see Interpreter.get_prepared)
+        """
+
+        if self.prepared is None and not isinstance(self.blocks, lexer.LazyBlocks):
+            self.prepared = Interpreter(self.source, self.blocks, CapturedOutput(), IterableInput(()), optimize = self.optimize).get_prepared()
+
+        return self.prepared
+
+    def make_interpreter(self, engine: type[Interpreter], output: Output, input: Input, on_eof: EOFPolicy, limits: Limits | None, **kwargs) -> Interpreter:
+
+        # the compiled engine and the profiler always take the lines as they are written
+        if "optimize" in inspect.signature(engine).parameters:
+            kwargs["optimize"] = self.optimize
+
+        return engine(self.source, self.blocks, output, input, on_eof, limits = limits, **kwargs)
+
+
+def select_reachable(blocks: lexer.LazyBlocks, lazy: bool) -> Mapping[str, BlockData]:
+
+    """
+    Returns the blocks the program can call in the order they are defined. If they aren't known,
+    all the blocks are returned, still lazy if `lazy` is true
+    """
+
+    import verifier
+
+    names = verifier.find_reachable(blocks)
+    if names is None:
+        return blocks if lazy else dict(blocks)
+
+    return {name: blocks[name] for name in blocks if name in names}
+
+def get_input(input: Input | Iterable[str] | str | None) -> Input:
+
+    """
+    Returns the input source of a run: a text is split into lines, no input is an empty one (not stdin)
+    """
+
+    if isinstance(input, Input):
+        return input
+    if input is None:
+        return IterableInput(())
+    if isinstance(input, str):
+        return IterableInput(input.splitlines())
+
+    return IterableInput(input)
+
+def prepare_run(C42: Interpreter, seed: int | None, is_reporting: bool) -> float:
+
+    """
+    Sets the options of a run which aren't reset, returns the start time of the run
+    """
+
+    C42.is_reporting = is_reporting
+    if seed is not None:
+        C42.get_random().seed(seed)
+
+    return time.perf_counter()
+
+def get_result(C42: Interpreter, captured: CapturedOutput | None, start: float) -> RunResult:
+    return RunResult(
+        reason  = C42.exit_reason,
+        output  = captured.getvalue() if captured is not None else None,
+        error   = C42.error,
+        seconds = time.perf_counter() - start,
+    )
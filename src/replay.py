@@ -0,0 +1,213 @@
+"""
+Record and replay of C42 runs: everything a run takes from outside the program (the lines 03 commands
+read, the state of the generator of 36 commands, the seconds 34 commands sleep) is recorded into a trace
+(.c42r), and a replay of the trace gets the same values back, so it prints the same output.
+
+A replay doesn't wait: its 34 commands move a virtual clock forward instead of sleeping, and the time limit
+is measured by that clock, so a program which sleeps for minutes is replayed in milliseconds.
+
+    trace = Trace()
+    program.run(input, recording = trace)
+    program.run(replaying = trace)
+
+Layout (little-endian), the payload is compressed with zlib:
+
+    header      HEADER (magic, format version, source hash, interpreter version, counts)
+    random      625 * u32 state of the generator of 36 commands, RANDOM_TAIL (has gauss_next, gauss_next)
+    lines       lines * (u32 size + utf-8), END_OF_INPUT as the size of a read which has found the input over
+    sleeps      sleeps * f64
+"""
+
+import struct, time, zlib
+
+from dataclasses import dataclass, field
+
+from constants import VERSION
+from cfttypes import Clock
+from checkpoint import RANDOM, RANDOM_TAIL
+from files import write_atomically
+from inputs import Input
+
+
+MAGIC           = b"C42R"
+FORMAT_VERSION  = 1
+EXTENSION       = ".c42r"
+
+HEADER      = struct.Struct("<4sH32s16sII")     # magic, format version, sha256 of source, interpreter version, lines, sleeps
+SIZE        = struct.Struct("<I")
+SECONDS     = struct.Struct("<d")
+
+END_OF_INPUT = 0xFFFFFFFF
+
+
+class TraceError(ValueError):
+    """
+    Raised when a trace can't be loaded or belongs to another program
+    """
+
+
+@dataclass(slots=True)
+class Trace:
+    """
+    Represents what a run has taken from outside the program, in the order it was taken.
+    """
+
+    lines: list[str | None] = field(default_factory = list)   # lines read by 03 commands, None where the input was over
+    sleeps: list[float] = field(default_factory = list)       # seconds slept by 34 commands (cut by the time limit)
+    random_state: tuple | None = None                         # state of the generator of 36 commands at the start of the run
+
+
+class RecordingClock(Clock):
+    """
+    Real time which records the seconds of every sleep.
+    """
+
+    def __init__(self, sleeps: list[float]) -> None:
+        self.sleeps: list[float] = sleeps
+
+    def take(self, seconds: float) -> float:
+        self.sleeps.append(float(seconds))
+        return seconds
+
+class VirtualClock(Clock):
+    """
+    Time which goes on as the real time and jumps forward by the recorded seconds of every sleep at once.
+    A sleep which wasn't recorded takes the seconds it asks for.
+    """
+
+    def __init__(self, sleeps: list[float] | None = None) -> None:
+        self.offset: float          = 0.0   # seconds slept so far
+        self.__sleeps: list[float]  = list(reversed(sleeps)) if sleeps is not None else []
+
+    def now(self) -> float:
+        return time.perf_counter() + self.offset
+
+    def take(self, seconds: float) -> float:
+        self.offset += self.__sleeps.pop() if self.__sleeps else seconds
+        return 0
+
+
+class RecordingInput(Input):
+    """
+    Hands out the lines of another input and records them.
+    """
+
+    def __init__(self, input: Input, lines: list[str | None]) -> None:
+        self.input: Input               = input
+        self.lines: list[str | None]    = lines
+
+    def readline(self) -> str | None:
+        line = self.input.readline()
+        self.lines.append(line)
+        return line
+
+    def is_ready(self) -> bool:
+        return self.input.is_ready()
+
+class ReplayInput(Input):
+    """
+    Hands out recorded lines, the input is over after them.
+    """
+
+    def __init__(self, lines: list[str | None]) -> None:
+        self.__lines = iter(lines)
+
+    def readline(self) -> str | None:
+        return next(self.__lines, None)
+
+
+def dump(trace: Trace, source_hash: bytes) -> bytes:
+
+    """
+    Serializes a trace into the .c42r format
+    """
+
+    payload = bytearray()
+
+    _, state, gauss_next = trace.random_state
+    payload += RANDOM.pack(*state)
+    payload += RANDOM_TAIL.pack(gauss_next is not None, gauss_next or 0.0)
+
+    for line in trace.lines:
+        if line is None:
+            payload += SIZE.pack(END_OF_INPUT)
+            continue
+
+        encoded = line.encode("utf-8", "surrogatepass")
+        payload += SIZE.pack(len(encoded)) + encoded
+
+    for seconds in trace.sleeps:
+        payload += SECONDS.pack(seconds)
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, source_hash, VERSION.encode("utf-8"), len(trace.lines), len(trace.sleeps))
+    return header + zlib.compress(payload)
+
+
+def load(data: bytes, source_hash: bytes) -> Trace:
+
+    """
+    Loads a trace, raises TraceError if the file is damaged or was made from another source
+    or by another version of the interpreter
+    """
+
+    try:
+        magic, format_version, file_hash, version, lines_count, sleeps_count = HEADER.unpack_from(data)
+    except struct.error:
+        raise TraceError("truncated header")
+
+    if magic != MAGIC or format_version != FORMAT_VERSION or version.rstrip(b"\0") != VERSION.encode("utf-8"):
+        raise TraceError("unsupported format")
+    if file_hash != source_hash:
+        raise TraceError("the trace was made from another program")
+
+    try:
+        payload = zlib.decompress(data[HEADER.size:])
+    except zlib.error as error:
+        raise TraceError(f"damaged payload: {error}")
+
+    position = 0
+
+    def read(structure: struct.Struct) -> tuple:
+        nonlocal position
+        values = structure.unpack_from(payload, position)
+        position += structure.size
+        return values
+
+    try:
+        state = read(RANDOM)
+        has_gauss_next, gauss_next = read(RANDOM_TAIL)
+
+        lines: list[str | None] = []
+        for _ in range(lines_count):
+            size, = read(SIZE)
+            if size == END_OF_INPUT:
+                lines.append(None)
+                continue
+
+            position += size
+            if position > len(payload):
+                raise TraceError("damaged payload")
+            lines.append(payload[position - size:position].decode("utf-8", "surrogatepass"))
+
+        sleeps = [read(SECONDS)[0] for _ in range(sleeps_count)]
+
+    except (UnicodeDecodeError, struct.error) as error:
+        raise TraceError(f"damaged payload: {error}")
+
+    if position != len(payload):
+        raise TraceError("damaged payload")
+
+    return Trace(lines, sleeps, (3, state, gauss_next if has_gauss_next else None))
+
+
+def save(path: str, trace: Trace, source_hash: bytes) -> None:
+
+    """
+    Writes a trace into a file, a file with the same name is replaced only when the new one is written
+    """
+
+    write_atomically(path, dump(trace, source_hash))
+
+def load_file(path: str, source_hash: bytes) -> Trace:
+    with open(path, "rb") as file:
+        return load(file.read(), source_hash)
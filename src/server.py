@@ -0,0 +1,313 @@
+"""
+Daemon which runs C42 programs for clients over a Unix domain socket (Unix only).
+
+Starting python for every short program costs more than running it, so `serve` keeps worker
+processes with everything imported and the parsed programs cached. The workers are forked after
+the socket is bound and accept connections from it by turns, every worker runs many programs
+at once in its event loop (see async_interpreter.py) and has its own LRU cache of programs.
+
+A connection is one run. The client sends a request as a JSON line:
+
+    {"path": "/home/almaz/hello.cft", "input": "Almaz\\n", "limits": {"seconds": 5}, "seed": 1}
+
+("source" instead of "path" sends the code itself, "on_eof" is the EOFPolicy), and the server answers
+with JSON lines: the output as the program prints it, then the result with the latency of the run.
+
+    {"output": "Hello, Almaz\\n"}
+    {"done": true, "reason": "finished", "error": null, "stats": {"cached": true, "parse_ms": 0.0, "run_ms": 0.41, "total_ms": 0.52}}
+
+A request which can't be run is answered with {"done": true, "rejected": "<why>"}.
+
+With a `metrics_path` the server counts all its runs (see metrics.py) and writes them into that file
+for the textfile collector of node_exporter every `METRICS_INTERVAL` seconds. Forked workers
+write a file each, "c42.prom" becomes "c42.0.prom", "c42.1.prom"... with a "worker" label.
+"""
+
+import asyncio, hashlib, json, os, signal, socket, tempfile, time
+
+from collections import OrderedDict
+from dataclasses import asdict, fields
+from typing import Iterator
+
+from program import Program
+from async_interpreter import StreamOutput
+from metrics import Metrics, write_textfile
+from cfttypes import EOFPolicy, Limits
+
+
+DEFAULT_SOCKET  = os.path.join(tempfile.gettempdir(), f"c42-{os.getuid()}.sock" if hasattr(os, "getuid") else "c42.sock")
+REQUEST_LIMIT   = 16 * 1024 * 1024  # longest request line in bytes, the source and the input are in it
+METRICS_INTERVAL = 15               # seconds between two writes of the metrics file, the usual scrape interval
+
+
+class MessageOutput(StreamOutput):
+    """
+    Sends the output of a program to the client as {"output": ...} JSON lines.
+    """
+
+    def encode(self, text: str) -> bytes:
+        return message(output = text)
+
+
+class ProgramCache:
+    """
+    LRU cache of parsed and prepared programs by the hash of their source.
+    """
+
+    def __init__(self, size: int, optimize: bool = True) -> None:
+        self.size: int          = size      # programs kept, the least recently used one is dropped first
+        self.optimize: bool     = optimize
+
+        self.__programs: OrderedDict[str, Program] = OrderedDict()
+
+    def get(self, source: str) -> tuple[Program, bool]:
+
+        """
+        Returns the program of the source and true if it was in the cache.
+        A new program is prepared at once, so a program from the cache is ready to run
+        """
+
+        key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+        program = self.__programs.get(key)
+        if program is not None:
+            self.__programs.move_to_end(key)
+            return program, True
+
+        program = self.__programs[key] = Program(source, optimize = self.optimize)
+        program.prepare()
+        if len(self.__programs) > self.size:
+            self.__programs.popitem(last = False)
+
+        return program, False
+
+
+class Server:
+    """
+    Runs the requests of the connections to the socket in one event loop.
+    """
+
+    def __init__(
+            self,
+            cache_size: int = 256,
+            optimize: bool = True,
+            limits: Limits | None = None,
+            yield_interval: int = 1000,
+            metrics_path: str | None = None) -> None:
+
+        self.cache: ProgramCache            = ProgramCache(cache_size, optimize)
+        self.limits: Limits | None          = limits # the most a request can get, its own limits can only be lower
+        self.yield_interval: int            = yield_interval
+        self.metrics_path: str | None       = metrics_path   # file the metrics are written into, None if they aren't counted
+        self.metrics_labels: dict[str, str] = {}             # labels of every sample in the file, the worker of a forked server
+
+        self.metrics: Metrics               = Metrics()      # all the runs of this process
+
+    async def serve(self, listener: socket.socket) -> None:
+
+        """
+        Accepts connections until SIGTERM, the programs which are still running are cancelled then
+        """
+
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+        server = await asyncio.start_unix_server(self.handle, sock = listener, limit = REQUEST_LIMIT)
+        exporter = asyncio.create_task(self.export_metrics()) if self.metrics_path is not None else None
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if exporter is not None:
+                exporter.cancel()
+                self.write_metrics()
+
+    async def export_metrics(self) -> None:
+        while True:
+            self.write_metrics()
+            await asyncio.sleep(METRICS_INTERVAL)
+
+    def write_metrics(self) -> None:
+
+        # a file which can't be written doesn't stop the server, the next write can succeed
+        try:
+            write_textfile(self.metrics_path, self.metrics, self.metrics_labels)
+        except OSError:
+            pass
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        start = time.perf_counter()
+
+        # the client can go away in the middle of the run and the server can be stopped, the program
+        # is just dropped then (a cancelled handler is logged as an error by asyncio streams)
+        try:
+            try:
+                request = json.loads(await reader.readline())
+                source = get_source(request)
+                limits = merge_limits(self.limits, request.get("limits"))
+                on_eof = EOFPolicy(request.get("on_eof", EOFPolicy.ERROR.value))
+                input = str(request.get("input", ""))
+                seed = request.get("seed")
+
+            except (ValueError, TypeError, KeyError, AttributeError, OSError) as error:
+                writer.write(message(done = True, rejected = f"{type(error).__name__}: {error}"))
+                await writer.drain()
+                return
+
+            parse_start = time.perf_counter()
+            program, is_cached = self.cache.get(source)
+            parsed = time.perf_counter()
+
+            result = await program.run_async(
+                input, MessageOutput(writer), seed, on_eof, limits,
+                is_reporting = True, yield_interval = self.yield_interval,
+                metrics = self.metrics if self.metrics_path is not None else None,
+            )
+
+            writer.write(message(
+                done    = True,
+                reason  = result.reason.value,
+                error   = asdict(result.error) if result.error is not None else None,
+                stats   = {
+                    "cached":   is_cached,
+                    "parse_ms": round((parsed - parse_start) * 1000, 3),
+                    "run_ms":   round(result.seconds * 1000, 3),
+                    "total_ms": round((time.perf_counter() - start) * 1000, 3),
+                },
+            ))
+            await writer.drain()
+
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+        finally:
+            writer.close()
+
+
+def message(**values) -> bytes:
+    return (json.dumps(values, ensure_ascii = False) + "\n").encode("utf-8")
+
+def get_source(request: dict) -> str:
+
+    """
+    Returns the code of a request, sent with it or read from the file at its path
+    """
+
+    if "source" in request:
+        return str(request["source"])
+
+    with open(request["path"], "r", encoding = "utf-8") as file:
+        return file.read()
+
+def merge_limits(server: Limits | None, request: dict | None) -> Limits | None:
+
+    """
+    Returns the limits of a request, the limits of the server are the most it can get.
+    Raises ValueError if a limit of the request isn't a non-negative number, so the request is rejected
+    """
+
+    if request is None:
+        return server
+
+    limits = Limits(**request)
+    for field in fields(Limits):
+        value = getattr(limits, field.name)
+        if value is None and field.default is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not value >= 0:
+            raise ValueError(f"the {field.name} limit has to be a non-negative number, not {value!r}")
+
+    if server is None:
+        return limits
+
+    for field in fields(Limits):
+        ceiling, value = getattr(server, field.name), getattr(limits, field.name)
+        if ceiling is not None and (value is None or value > ceiling):
+            setattr(limits, field.name, ceiling)
+
+    return limits
+
+
+def serve(path: str, server: Server, workers: int = 1) -> None:
+
+    """
+    Binds the socket and runs the server in `workers` forked processes until SIGINT or SIGTERM
+    """
+
+    # a socket file left by a killed server is removed, a socket of a running one isn't
+    if os.path.exists(path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            if probe.connect_ex(path) == 0:
+                raise OSError(f"a server is already running on {path}")
+        os.unlink(path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(128)
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    children: list[int] = []
+
+    try:
+        if workers == 1:
+            asyncio.run(server.serve(listener))
+            return
+
+        for index in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                run_worker(server, listener, index)
+            children.append(pid)
+
+        for pid in children:
+            os.waitpid(pid, 0)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+        listener.close()
+        os.unlink(path)
+
+def run_worker(server: Server, listener: socket.socket, index: int) -> None:
+
+    """
+    Runs the server in a forked worker, the worker is stopped by the parent with SIGTERM
+    """
+
+    # Ctrl+C goes to the whole process group, only the parent handles it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # the collector joins the files, every worker writes its own counters into its own file
+    if server.metrics_path is not None:
+        root, extension = os.path.splitext(server.metrics_path)
+        server.metrics_path = f"{root}.{index}{extension}"
+        server.metrics_labels = {"worker": str(index)}
+
+    try:
+        asyncio.run(server.serve(listener))
+    finally:
+        os._exit(0)
+
+
+def submit(path: str, request: dict) -> Iterator[dict]:
+
+    """
+    Sends a request to the server and yields the messages of its answer
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall(message(**request))
+
+        with connection.makefile("rb") as answer:
+            for line in answer:
+                yield json.loads(line)
@@ -0,0 +1,494 @@
+from colorama import Fore
+
+import exception
+
+from constants import *
+from cfttypes import *
+
+from cell import Cell
+from output import decode_escapes
+
+
+CONDITIONS: dict[int, str] = {
+    int(EQUAL_CELLS):           "==",
+    int(NOT_EQUAL_CELLS):       "!=",
+    int(GREATER_THAN_CELLS):    ">",
+    int(LESS_THAN_CELLS):       "<",
+    int(GREATER_EQUAL_CELLS):   ">=",
+    int(LESS_EQUAL_CELLS):      "<=",
+}
+
+# arithmetic on two cells of the same non-string type, the result is written straight into the cell like in the interpreter
+ARITHMETIC: dict[int, str] = {
+    int(SUBTRACT_CELLS):        "-",
+    int(MULTIPLY_CELLS):        "*",
+    int(DIVIDE_CELLS):          "/",
+    int(MODULO_CELLS):          "%",
+    int(BITWISE_AND):           "&",
+    int(BITWISE_OR):            "|",
+    int(BITWISE_XOR):           "^",
+}
+
+# functions on two cells of the same non-string type
+FUNCTIONS: dict[int, str] = {
+    int(MAX_CELLS):             "max",
+    int(MIN_CELLS):             "min",
+    int(GCD_CELLS):             "math.gcd",
+    int(LCM_CELLS):             "math.lcm",
+}
+
+CELL_CLASSES: dict[str, str] = {
+    CellDataType.INTEGER.value: "IntegerCell",
+    CellDataType.FLOAT.value:   "FloatCell",
+    CellDataType.STRING.value:  "StringCell",
+}
+
+PRELUDE = '''\
+import sys, time, random, math
+
+ERRORS = {errors}
+
+LINES = {lines}
+
+CLEAR_SCREEN = "\\x1b[H\\x1b[2J\\x1b[3J"
+
+
+class IntegerCell:
+    __slots__ = ("value",)
+    def __init__(self):
+        self.value = 0
+
+class FloatCell:
+    __slots__ = ("value",)
+    def __init__(self):
+        self.value = 0.0
+
+# appended text is joined when the value is read, like in cell.py
+class StringCell:
+    __slots__ = ("text", "pieces", "length")
+    def __init__(self):
+        self.text, self.pieces, self.length = "", None, 0
+    @property
+    def value(self):
+        if self.pieces is not None:
+            self.text, self.pieces = "".join(self.pieces), None
+        return self.text
+    @value.setter
+    def value(self, value):
+        self.text, self.pieces, self.length = value, None, len(value) if type(value) is str else 0
+    def __len__(self):
+        return self.length
+    def append(self, text):
+        if self.pieces is None:
+            self.pieces = [self.text, text]
+        else:
+            self.pieces.append(text)
+        self.length += len(text)
+    def delete(self, index):
+        if 0 <= index < self.length:
+            value = self.value
+            self.value = value[:index] + value[index + 1:]
+
+
+def cft_exit():
+    print("\\n[Program Finished]")
+    sys.exit()
+
+# a block whose last line is 23 returns the called block instead of calling it, like the interpreter drops
+# the frame of such a block, so a chain of tail calls runs here without growing the python stack
+def call(block):
+    result = block()
+    while callable(result):
+        result = result()
+
+# a 23 or 35 in a looped block ends the iteration and returns the called block, the loop starts again at once
+# and the called blocks run after it has ended with 42, the last called first, like the frames the interpreter
+# leaves under a looped block
+def loop(block):
+    called = []
+    while True:
+        result = block(True)
+        if result is True:
+            break
+        if result is not None:
+            called.append(result)
+    for block, is_looping in reversed(called):
+        if is_looping:
+            loop(block)
+        else:
+            call(block)
+
+def error(error_number, line = None, **kwargs):
+    message = ERRORS[error_number].format(**kwargs)
+    if line is not None:
+        print(f"\\n\\n  -> {{LINES[line]}}")
+        print(f"{cyan}[{{line}}] {reset}{{error_number}} : {red}{{message}}{reset}")
+    else:
+        print(f"{{error_number}} : {red}{{message}}{reset}")
+    cft_exit()
+
+def read(line):
+    try:
+        return input()
+    except EOFError:
+        error("CFTE13", line)
+
+# a text as an int and as a float, None where it isn't such a number, like Cell.decode_number
+def decode(text):
+    try:
+        real = float(text)
+    except ValueError:
+        return None, None
+    try:
+        return int(text), real
+    except ValueError:
+        return None, real
+
+def write(cell, value, line):
+    if type(cell) is IntegerCell:
+        number = decode(value)[0] if type(value) is str else int(value)
+        if number is None:
+            error("CFTE9", line, data_type = "int")
+        cell.value = number
+    elif type(cell) is FloatCell:
+        number = decode(value)[1] if type(value) is str else float(value)
+        if number is None:
+            error("CFTE9", line, data_type = "float")
+        cell.value = number
+    else:
+        cell.value = value
+
+def add(cell, value, line):
+    if type(cell) is IntegerCell or type(cell) is FloatCell:
+        cell.value += value
+    else:
+        cell.append(value)
+
+# 04 and 24 take their values from CONSTANTS, decoded when the module is loaded
+def assign_constant(cell, constant, line):
+    integer, real, text = constant
+    if type(cell) is IntegerCell:
+        if integer is None:
+            error("CFTE9", line, data_type = "int")
+        cell.value = integer
+    elif type(cell) is FloatCell:
+        if real is None:
+            error("CFTE9", line, data_type = "float")
+        cell.value = real
+    else:
+        cell.value = text
+
+def add_constant(cell, constant, line):
+    integer, real, text = constant
+    if type(cell) is IntegerCell:
+        if integer is None:
+            error("CFTE9", line, data_type = "int")
+        cell.value += integer
+    elif type(cell) is FloatCell:
+        if real is None:
+            error("CFTE9", line, data_type = "float")
+        cell.value += real
+    else:
+        cell.append(text)
+'''
+
+SKIP_PRELUDE = '''
+# set by a false condition at the end of a block, the next executed line is skipped
+SKIP = False
+
+def take_skip():
+    global SKIP
+    skip, SKIP = SKIP, False
+    return skip
+'''
+
+EPILOGUE = '''
+def main():
+    if {enter!r} not in BLOCKS:
+        error("CFTE11")
+    try:
+        call(BLOCKS[{enter!r}])
+    except RecursionError:
+        error("CFTE18", limit = sys.getrecursionlimit())
+    cft_exit()
+
+
+if __name__ == "__main__":
+    # 23 and 35 commands which aren't the last lines of their blocks are python calls,
+    # deep recursion in C42 needs a deep python stack, a deeper one is reported as CFTE18
+    sys.setrecursionlimit(100_000)
+    main()
+'''
+
+
+class Transpiler:
+    """
+    Translates parsed C42 blocks into the source of a standalone python module.
+
+    Every block becomes a function, every cell becomes a global variable which holds
+    a typed cell object (or None before the cell is created by 41), 23 becomes a call
+    (a 23 at the end of a block returns the called block to a driver loop, so tail calls
+    don't grow the python stack) and 35 becomes a call of the `loop` driver, which runs the block
+    with `looping` set. The generated module doesn't import the interpreter and reports the same errors at the same lines.
+    """
+
+    def __init__(self, blocks: dict[str, BlockData], source_name: str = "<source>"):
+        self.blocks = blocks
+        self.source_name = source_name
+
+        # a false condition at the end of a block skips the next executed line, even in another block.
+        # The check costs a call after every 23 command, so it's generated only if a block ends with a condition
+        self.__is_skip_leaking: bool = any(
+            block.code and block.code[-1].opcode in CONDITIONS for block in blocks.values()
+        )
+        self.__functions: dict[str, str] = {
+            name: f"block_{index}" for index, name in enumerate(blocks)
+        }
+        # the constant pool: indexes of the distinct values of 04 and 24 commands in CONSTANTS
+        self.__constants: dict[str, int] = {}
+        for block in blocks.values():
+            for instruction in block.code:
+                if instruction.opcode in (int(ASSIGN_VALUE), int(ADD_CONSTANT)):
+                    self.__constants.setdefault(instruction.args[1], len(self.__constants))
+
+    def transpile(self) -> str:
+
+        """
+        Returns the source code of the python module
+        """
+
+        lines = {
+            instruction.line_number: instruction.text
+            for block in self.blocks.values()
+            for instruction in block.code
+        }
+        cells = sorted({
+            self.get_variable(name)
+            for block in self.blocks.values()
+            for instruction in block.code
+            for name in self.get_cell_names(instruction)
+            if Cell.is_name_correct(name)
+        })
+
+        output = [f"# generated from {self.source_name} by the C42 transpiler, do not edit\n"]
+        output.append(PRELUDE.format(
+            errors = repr(exception.ERRORS), lines = repr(lines),
+            cyan = Fore.CYAN, red = Fore.RED, reset = Fore.RESET
+        ))
+        if self.__is_skip_leaking:
+            output.append(SKIP_PRELUDE)
+
+        output.append("\n# cells of the program, None until the cell is created\n")
+        output.extend(f"{cell} = None\n" for cell in cells)
+
+        output.append("\n# values of 04 and 24 commands: (int, float, text)\nCONSTANTS = (\n")
+        output.extend(f"    (*decode({value!r}), {decode_escapes(value)!r}),\n" for value in self.__constants)
+        output.append(")\n")
+
+        for name, block in self.blocks.items():
+            output.append("\n\n")
+            output.append(self.transpile_block(name, block))
+
+        output.append("\n\nBLOCKS = {\n")
+        output.extend(f"    {name!r}: {function},\n" for name, function in self.__functions.items())
+        output.append("}\n\n")
+        output.append(EPILOGUE.format(enter = ENTER_BLOCK))
+
+        return "".join(output)
+
+    def transpile_block(self, name: str, block: BlockData) -> str:
+
+        """
+        Returns the function of a block, it returns true if the block's finished with 42
+        and the block to run next if its last line is 23 (see `call` in the module).
+        A looped block returns the block and the kind of the call at its first 23 or 35 (see `loop`)
+        """
+
+        body: list[str] = []
+        created: set[str] = set()   # cells which are assigned in the function (need to be declared as globals)
+        checked: set[str] = set()   # cells which are known to exist at this point of the function
+        is_guarded = False          # if true, the line runs only if `run` is true (the previous line was a condition)
+
+        if self.__is_skip_leaking:
+            body.append("run = not take_skip()")
+            is_guarded = True
+
+        for index, instruction in enumerate(block.code):
+            body.append(f"# [{instruction.line_number}] {instruction.text}")
+            is_last = index == len(block.code) - 1
+
+            if instruction.opcode in CONDITIONS:
+                statements = self.transpile_line(instruction, checked if not is_guarded else set(checked), created)
+                if is_guarded:
+                    body.append("if run:")
+                    body.extend(self.indent(statements))
+                    body.append("else:")
+                    body.append("    run = True")
+                else:
+                    body.extend(statements)
+                is_guarded = True
+
+                if is_last:
+                    body.append("SKIP = not run")
+                    created.add("SKIP")
+                continue
+
+            statements = self.transpile_line(instruction, checked if not is_guarded else set(checked), created, is_last)
+            if is_guarded:
+                body.append("if run:")
+                body.extend(self.indent(statements))
+            else:
+                body.extend(statements)
+            is_guarded = False
+
+            # a block called with 23 (or after a loop) may end with a false condition which skips the next line here
+            if self.__is_skip_leaking and instruction.opcode in (int(CALL_BLOCK), int(START_LOOP)) and not is_last:
+                body.append("run = not take_skip()")
+                is_guarded = True
+
+        if created:
+            body.insert(0, f"global {', '.join(sorted(created))}")
+        if not body:
+            body.append("pass")
+
+        return f"def {self.__functions[name]}(looping = False):  # {name}\n" + "\n".join(self.indent(body)) + "\n"
+
+    def transpile_line(self, instruction: Instruction, checked: set[str], created: set[str], is_last: bool = False) -> list[str]:
+
+        """
+        Returns the statements of one line, `is_last` if it's the last line of its block
+        """
+
+        opcode, args, line = instruction.opcode, instruction.args, instruction.line_number
+
+        if opcode == UNDEFINED_COMMAND:
+            return [f"error(\"CFTE3\", {line}, command = {args[0]!r})"]
+        if opcode == INVALID_SYNTAX:
+            return [f"error(\"CFTE12\", {line})"]
+
+        if opcode == int(CREATE_CELL):
+            name, data_type = args
+            if not Cell.is_name_correct(name):
+                return [f"error(\"CFTE2\", {line}, name = {name!r})"]
+            if data_type not in CELL_CLASSES:
+                return [f"error(\"CFTE1\", {line}, data_type = {data_type!r})"]
+
+            variable = self.get_variable(name)
+            created.add(variable)
+            checked.add(variable)
+            return [f"{variable} = {CELL_CLASSES[data_type]}()"]
+
+        # the cells are checked in the same order as the interpreter gets them
+        names = self.get_cell_names(instruction)
+        statements: list[str] = []
+        for name in names:
+            if not Cell.is_name_correct(name):
+                return statements + [f"error(\"CFTE8\", {line}, name = {name!r})"]
+
+            variable = self.get_variable(name)
+            if variable not in checked:
+                statements.append(f"if {variable} is None: error(\"CFTE8\", {line}, name = {name!r})")
+                checked.add(variable)
+
+        a = self.get_variable(args[0]) if args else None
+        b = self.get_variable(args[1]) if len(args) > 1 and len(names) > 1 else None
+
+        def on_error(condition: str, error_number: str) -> str:
+            return f"if {condition}: error({error_number!r}, {line})"
+
+        match opcode:
+            case 1:     # EXIT
+                statements.append("cft_exit()")
+            case 2:     # PRINT
+                statements.append(f"print({a}.value, end = \"\", flush = True)")
+            case 3:     # INPUT
+                statements.append(f"write({a}, read({line}), {line})")
+            case 4:     # ASSIGN_VALUE
+                statements.append(f"assign_constant({a}, CONSTANTS[{self.__constants[args[1]]}], {line})")
+            case 5:     # SUM_CELLS
+                statements.append(on_error(f"type({a}) is not type({b})", "CFTE7"))
+                statements.append(f"if type({a}) is StringCell: {a}.append({b}.value)")
+                statements.append(f"else: {a}.value += {b}.value")
+            case 9 | 10:    # INCREMENT_CELL, DECREMENT_CELL
+                statements.append(f"add({a}, {1 if opcode == 9 else -1}, {line})")
+            case 12:    # CLEAR_CONSOLE
+                statements.append("print(CLEAR_SCREEN, end = \"\", flush = True)")
+            case 19 | 20:   # UPPERCASE_CELL, LOWERCASE_CELL
+                statements.append(on_error(f"type({a}) is not StringCell", "CFTE5"))
+                statements.append(f"{a}.value = {a}.value.{'upper' if opcode == 19 else 'lower'}()")
+            case 21:    # LENGTH_CELL
+                statements.append(on_error(f"type({b}) is not StringCell", "CFTE5"))
+                statements.append(f"write({a}, len({b}), {line})")
+            case 22:    # INVERT_CELL
+                statements.append(f"{a}.value = {a}.value[::-1] if type({a}) is StringCell else -{a}.value")
+            case 23:    # CALL_BLOCK
+                statements.append(f"block = BLOCKS.get(str({a}.value))")
+                statements.append(f"if block is None: error(\"CFTE10\", name = {a}.value)")
+                statements.append("if looping: return block, False")
+                statements.append("return block" if is_last else "call(block)")
+            case 24:    # ADD_CONSTANT
+                statements.append(f"add_constant({a}, CONSTANTS[{self.__constants[args[1]]}], {line})")
+            case 25:    # SWAP_CELLS
+                statements.append(on_error(f"type({a}) is not type({b})", "CFTE7"))
+                statements.append(f"{a}.value, {b}.value = {b}.value, {a}.value")
+            case 26:    # COPY_CELL
+                statements.append(on_error(f"type({a}) is not type({b})", "CFTE7"))
+                statements.append(f"{a}.value = {b}.value")
+            case 27:    # DELETE_CHAR
+                statements.append(on_error(f"type({a}) is not StringCell or type({b}) is not IntegerCell", "CFTE4"))
+                statements.append(f"{a}.delete({b}.value)")
+            case 28:    # STRING_TO_INT
+                statements.append(f"write({a}, {b}.value, {line})")
+            case 29:    # INT_TO_STRING
+                statements.append(f"write({a}, str({b}.value), {line})")
+            case 33:    # BITWISE_NOT
+                statements.append(on_error(f"type({a}) is StringCell", "CFTE6"))
+                statements.append(f"{a}.value = ~{a}.value")
+            case 34:    # SLEEP
+                statements.append(on_error(f"type({a}) is StringCell", "CFTE6"))
+                statements.append(f"time.sleep({a}.value)")
+            case 35:    # START_LOOP
+                statements.append(f"block = BLOCKS.get({a}.value)")
+                statements.append(f"if block is None: error(\"CFTE10\", name = {a}.value)")
+                statements.append("if looping: return block, True")
+                statements.append("loop(block)")
+            case 36:    # RANDOM_CHAR
+                statements.append(on_error(f"type({a}) is not type({b}) or type({a}) is not StringCell", "CFTE5"))
+                statements.append(f"{a}.value = random.choice({b}.value)")
+            case 42:    # RETURN
+                statements.append("return True")
+            case _ if opcode in CONDITIONS:
+                statements.append(f"run = {a}.value {CONDITIONS[opcode]} {b}.value")
+            case _ if opcode in ARITHMETIC:
+                statements.append(on_error(f"type({a}) is not type({b})", "CFTE7"))
+                statements.append(on_error(f"type({a}) is StringCell", "CFTE6"))
+                if opcode == int(DIVIDE_CELLS):
+                    statements.append(f"result = {a}.value / {b}.value")
+                    statements.append(f"{a}.value = int(result) if type({a}) is IntegerCell else result")
+                else:
+                    statements.append(f"{a}.value = {a}.value {ARITHMETIC[opcode]} {b}.value")
+            case _ if opcode in FUNCTIONS:
+                statements.append(on_error(f"type({a}) is not type({b}) or type({a}) is StringCell", "CFTE6"))
+                statements.append(f"{a}.value = {FUNCTIONS[opcode]}({a}.value, {b}.value)")
+
+        return statements
+
+    def get_cell_names(self, instruction: Instruction) -> list[str]:
+
+        """
+        Returns the arguments of the instruction which are names of cells
+        """
+
+        if instruction.opcode in (int(ASSIGN_VALUE), int(ADD_CONSTANT)):
+            return [instruction.args[0]]
+        if instruction.opcode in (int(CREATE_CELL), UNDEFINED_COMMAND, INVALID_SYNTAX):
+            return []
+        return list(instruction.args)
+
+    @staticmethod
+    def get_variable(name: str) -> str:
+        return "c" + name.lstrip("-") if Cell.is_name_correct(name) else None
+
+    @staticmethod
+    def indent(lines: list[str]) -> list[str]:
+        return ["    " + line for line in lines]
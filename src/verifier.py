@@ -0,0 +1,295 @@
+"""
+Static verifier: infers the types of cells at every line and finds the lines that fail whenever they run.
+
+Cells get a fixed type when a 41 command creates them, and they are never deleted, so a cell
+surely exists at a line if a 41 of it runs before the line whatever the conditions are:
+
+    - in the same block, above the line, and it can't be skipped
+    - in the main block before its first 23 or 35, for the lines of every other block
+
+The type of a surely existing cell is known if every 41 of the cell in the program gives it the same
+type, or if the 41 above the line in the same block gave it with no call of another block in between.
+
+A line can be skipped if there is a condition above it. If a condition ends a block, its skip goes to
+the next executed line, so the first line of a block and the line after a call can be skipped too.
+
+verify() reports the errors of such lines before execution, infer_types() gives the types to the
+optimizer, which replaces the commands with typed ones without the runtime checks (see optimizer.py).
+
+find_reachable() follows the calls from the main block, so the blocks a program never calls don't have to be parsed.
+"""
+
+from typing import Mapping
+
+from constants import *
+from cfttypes import *
+
+import exception
+
+from cell import Cell
+from optimizer import CONDITIONS, CALLS
+
+
+INTEGER, STRING, FLOAT = CellDataType.INTEGER, CellDataType.STRING, CellDataType.FLOAT
+
+DATA_TYPES = {data_type.value: data_type for data_type in CellDataType}
+
+# commands which work only with cells of the same type (CFTE7)
+SAME_TYPES      = (int(SUM_CELLS), int(SWAP_CELLS), int(COPY_CELL))
+
+# commands which work only with numbers of the same type (CFTE7, then CFTE6)
+SAME_NUMBERS    = (
+    int(SUBTRACT_CELLS), int(MULTIPLY_CELLS), int(DIVIDE_CELLS), int(MODULO_CELLS),
+    int(BITWISE_AND), int(BITWISE_OR), int(BITWISE_XOR),
+)
+
+# commands which need a number in the first cell and the same type in the second one (only CFTE6)
+NUMBERS         = (int(MAX_CELLS), int(MIN_CELLS), int(GCD_CELLS), int(LCM_CELLS))
+
+# commands which need a string in one of the cells (CFTE5), by the index of the cell
+STRINGS         = {int(UPPERCASE_CELL): (0,), int(LOWERCASE_CELL): (0,), int(LENGTH_CELL): (1,), int(RANDOM_CHAR): (0, 1)}
+
+# commands which can write a new string into their first cell, so a string cell can get any name of a block
+MAKE_STRINGS    = (
+    int(INPUT), int(SUM_CELLS), int(UPPERCASE_CELL), int(LOWERCASE_CELL), int(INVERT_CELL),
+    int(ADD_CONSTANT), int(DELETE_CHAR), int(RANDOM_CHAR),
+)
+
+
+def infer_types(blocks: dict[str, BlockData]) -> dict[int, tuple[CellDataType | None, ...]]:
+
+    """
+    Returns the types of the cell arguments of every line by its line number, a type is None if the cell
+    may not exist at the line or its type isn't known. The cells of the instructions have to be resolved already
+    """
+
+    has_leaking_skips = any(block.code and block.code[-1].opcode in CONDITIONS for block in blocks.values())
+
+    # types every 41 of the program can give to a cell
+    created: dict[int, set[CellDataType]] = {}
+    for block in blocks.values():
+        for instruction in block.code:
+            if (data_type := get_created_type(instruction)) is not None:
+                created.setdefault(instruction.cells[0], set()).add(data_type)
+
+    single_types = {slot: next(iter(types)) for slot, types in created.items() if len(types) == 1}
+
+    # cells created by the main block before any other block can start
+    main_cells: set[int] = set()
+    if ENTER_BLOCK in blocks:
+        code = blocks[ENTER_BLOCK].code
+        for index, instruction in enumerate(code):
+            if instruction.opcode in CALLS:
+                break
+            if get_created_type(instruction) is not None and not (index > 0 and code[index - 1].opcode in CONDITIONS):
+                main_cells.add(instruction.cells[0])
+
+    types: dict[int, tuple[CellDataType | None, ...]] = {}
+
+    for name, block in blocks.items():
+        code = block.code
+
+        # the main block is the first to run, so it can't count on its own cells before they're created
+        existing: set[int] = set() if name == ENTER_BLOCK else set(main_cells)
+        local_types: dict[int, CellDataType] = {} # types given by the 41 commands above in the block
+
+        for index, instruction in enumerate(code):
+            types[instruction.line_number] = tuple(
+                local_types.get(slot, single_types.get(slot)) if slot in existing else None
+                for slot in instruction.cells
+            )
+
+            if (data_type := get_created_type(instruction)) is not None:
+                slot = instruction.cells[0]
+
+                if not can_be_skipped(code, index, has_leaking_skips):
+                    existing.add(slot)
+                    local_types[slot] = data_type
+                elif local_types.get(slot) is not data_type:
+                    local_types.pop(slot, None)
+
+            # the called block can create the cells again with other types
+            elif instruction.opcode in CALLS:
+                local_types.clear()
+
+    return types
+
+def verify(blocks: dict[str, BlockData]) -> list[Diagnostic]:
+
+    """
+    Returns the errors of the lines which fail whenever they're executed, in the order of the lines.
+    The cells of the instructions have to be resolved already
+    """
+
+    types = infer_types(blocks)
+    created = {
+        instruction.cells[0]
+        for block in blocks.values() for instruction in block.code
+        if get_created_type(instruction) is not None
+    }
+
+    diagnostics: list[Diagnostic] = []
+    for block in blocks.values():
+        for instruction in block.code:
+            error = check(instruction, types[instruction.line_number], created)
+            if error is not None:
+                error_number, kwargs = error
+                message = exception.ERRORS[error_number].format(**kwargs)
+                diagnostics.append(Diagnostic(error_number, instruction.line_number, instruction.text, message))
+
+    diagnostics.sort(key = lambda diagnostic: diagnostic.line_number)
+    return diagnostics
+
+def find_reachable(blocks: Mapping[str, BlockData]) -> set[str] | None:
+
+    """
+    Returns the names of the blocks which can run, or None if the program can make names of blocks at run time.
+
+    23 and 35 call the block named by the value of a cell. A string cell gets its value from a 04 command,
+    or from another string cell, unless a command of MAKE_STRINGS writes into it. A number cell can hold
+    any number, so every block named by a number can be called. Only the blocks which can run are taken
+    from `blocks`, so the others aren't even tokenized if the blocks are lazy (see lexer.py)
+    """
+
+    reachable: set[str] = set()
+    queue: list[str] = [ENTER_BLOCK]
+    names: set[str] = set()         # values of 04 commands
+    string_cells: set[str] = set()  # cells which a 41 command can make strings
+    made_strings: set[str] = set()  # cells which a command of MAKE_STRINGS writes into
+    has_calls = False
+    numbers: list[str] = [name for name in blocks if Cell.is_number(name)] # blocks named by numbers, queued once
+
+    while queue:
+        name = queue.pop()
+        if name in reachable or name not in blocks:
+            continue
+        reachable.add(name)
+
+        for instruction in blocks[name].code:
+            opcode = instruction.opcode
+
+            if opcode == int(ASSIGN_VALUE):
+                names.add(instruction.args[1])
+            elif opcode in CALLS:
+                has_calls = True
+            elif opcode in MAKE_STRINGS:
+                made_strings.add(instruction.args[0])
+            elif get_created_type(instruction) is STRING:
+                string_cells.add(instruction.args[0])
+
+        if not string_cells.isdisjoint(made_strings):
+            return None
+
+        # names become calls only with a 23 or 35 in the blocks which can run
+        if has_calls:
+            queue.extend(names)
+            queue.extend(numbers)
+            names.clear()
+            numbers.clear()
+
+    return reachable
+
+def check(instruction: Instruction, types: tuple[CellDataType | None, ...], created: set[int]) -> tuple[str, dict] | None:
+
+    """
+    Returns the error of the line and the arguments of its message if the line always fails, else None
+    """
+
+    opcode = instruction.opcode
+
+    if opcode == UNDEFINED_COMMAND:
+        return "CFTE3", {"command": instruction.args[0]}
+    if opcode == INVALID_SYNTAX:
+        return "CFTE12", {}
+
+    if opcode == int(CREATE_CELL):
+        name, data_type = instruction.args
+        if not Cell.is_name_correct(name):
+            return "CFTE2", {"name": name}
+        if data_type not in DATA_TYPES:
+            return "CFTE1", {"data_type": data_type}
+        return None
+
+    # a cell without a 41 command which can create it never exists
+    for index, slot in enumerate(instruction.cells):
+        if slot not in created:
+            return "CFTE8", {"name": instruction.args[index]}
+
+    # the cells are taken before their types are checked, so a cell which may not exist can fail the line with CFTE8
+    if None in types:
+        return None
+
+    first = types[0] if types else None
+    second = types[1] if len(types) > 1 else None
+
+    if opcode in SAME_TYPES:
+        if first is not second:
+            return "CFTE7", {}
+
+    elif opcode in SAME_NUMBERS:
+        if first is not second:
+            return "CFTE7", {}
+        if first is STRING:
+            return "CFTE6", {}
+
+    elif opcode in NUMBERS:
+        if first is STRING or first is not second:
+            return "CFTE6", {}
+
+    elif opcode in STRINGS:
+        if any(types[index] is not STRING for index in STRINGS[opcode]):
+            return "CFTE5", {}
+
+    elif opcode == int(DELETE_CHAR):
+        if first is not STRING or second is not INTEGER:
+            return "CFTE4", {}
+
+    elif opcode == int(BITWISE_NOT) or opcode == int(SLEEP):
+        if first is STRING:
+            return "CFTE6", {}
+
+    elif opcode == int(ASSIGN_VALUE) or opcode == int(ADD_CONSTANT):
+        integer, real = Cell.decode_number(instruction.args[1])
+        if first is INTEGER and integer is None:
+            return "CFTE9", {"data_type": "int"}
+        if first is FLOAT and real is None:
+            return "CFTE9", {"data_type": "float"}
+
+    return None
+
+
+def get_created_type(instruction: Instruction) -> CellDataType | None:
+
+    """
+    Returns the type of the cell a 41 command creates, None if it isn't a 41 or it fails
+    """
+
+    if instruction.opcode != int(CREATE_CELL):
+        return None
+
+    name, data_type = instruction.args
+    if not Cell.is_name_correct(name):
+        return None
+
+    return DATA_TYPES.get(data_type)
+
+def can_be_skipped(code: list[Instruction], index: int, has_leaking_skips: bool) -> bool:
+
+    """
+    Returns true if a condition can skip the line, so it isn't executed every time the lines after it are
+    """
+
+    if index > 0 and code[index - 1].opcode in CONDITIONS:
+        return True
+
+    return has_leaking_skips and (index == 0 or code[index - 1].opcode in CALLS)
+
+
+def report(diagnostics: list[Diagnostic], file = None) -> None:
+
+    """
+    Prints the errors in the same format as the interpreter does
+    """
+
+    for diagnostic in diagnostics:
+        exception.Exception(diagnostic.error_number, diagnostic.message, diagnostic.line_number, diagnostic.text, file = file)
@@ -0,0 +1,4 @@
+import os, sys
+
+# the modules of the interpreter import each other by their names, as main.py runs them from src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
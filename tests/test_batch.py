@@ -0,0 +1,61 @@
+"""
+The batch runner: which files it takes as programs, and the reports of the programs it has run in a worker.
+"""
+
+import signal
+
+from batch import CRASHED, FINISHED, TIMEOUT, find_input, find_programs, run_program
+from interpreter import Interpreter
+
+
+HELLO = """\
+#1 main
+41 -1 1
+03 -1
+02 -1
+#0
+"""
+FOREVER = """\
+#1 main
+41 -1 1
+04 -1 "forever"
+35 -1
+#0
+#1 forever
+#0
+"""
+
+
+def test_find_programs(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "folder.cft").mkdir()
+    for name in ("a.cft", "a.in", "a.c42c", "notes.txt", "sub/b.cft", "sub/b.c42s"):
+        (tmp_path / name).write_text("", encoding = "utf-8")
+
+    directory = find_programs([str(tmp_path)])
+    pattern = find_programs([str(tmp_path / "**")])
+    file = find_programs([str(tmp_path / "notes.txt")])
+
+    assert directory == [str(tmp_path / "a.cft")]
+    assert pattern == [str(tmp_path / "a.cft"), str(tmp_path / "sub" / "b.cft")]
+    assert file == [str(tmp_path / "notes.txt")]
+
+def test_run_program(tmp_path):
+    program = tmp_path / "hello.cft"
+    program.write_text(HELLO, encoding = "utf-8")
+    (tmp_path / "hello.in").write_text("hi\n", encoding = "utf-8")
+
+    report = run_program(str(program), find_input(str(program), None), Interpreter, timeout = 10)
+
+    assert (report["status"], report["error"], report["output"]) == (FINISHED, None, "hi\n[Program Finished]\n")
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+
+def test_timeout_and_crash_stop_the_timer(tmp_path):
+    forever = tmp_path / "forever.cft"
+    forever.write_text(FOREVER, encoding = "utf-8")
+
+    assert run_program(str(forever), None, Interpreter, timeout = 0.2)["status"] == TIMEOUT
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+
+    assert run_program(str(tmp_path / "missing.cft"), None, Interpreter, timeout = 10)["status"] == CRASHED
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
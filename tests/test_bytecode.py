@@ -0,0 +1,97 @@
+"""
+The cache of parsed programs (.c42c): a round trip of the format, and files of another source or tree are rebuilt.
+"""
+
+import pytest
+
+import bytecode
+
+from interpreter import Interpreter
+from program import Program
+
+
+PROGRAM = """\
+#1 main
+41 -1 1
+41 -2 0
+04 -1 "привет, мир\\n"
+04 -2 3
+$ a comment
+23 -3
+02 -1
+99 -1
+05 -1
+#0
+#1 loop
+10 -2
+02 -2
+13 -2 -1
+42
+#0
+"""
+
+# the layout key comes after the magic, the format version, the reserved field and the hash of the source
+KEY_OFFSET = 4 + 2 + 2 + 32
+
+def get_lines(blocks: dict) -> dict:
+    return {name: [(line.opcode, line.args, line.line_number, line.text) for line in block.code] for name, block in blocks.items()}
+
+def write_cache(tmp_path, layout_key: bytes = bytecode.LAYOUT_KEY) -> str:
+
+    """
+    Writes the source and a .c42c file of it with the layout key, returns the path of the source
+    """
+
+    path = tmp_path / "program.cft"
+    path.write_text(PROGRAM, encoding = "utf-8")
+
+    data = bytearray(bytecode.dump(Interpreter.parse(PROGRAM), bytecode.get_source_hash(PROGRAM)))
+    data[KEY_OFFSET:KEY_OFFSET + 16] = layout_key
+    (tmp_path / "program.c42c").write_bytes(bytes(data))
+
+    return str(path)
+
+
+def test_round_trip():
+    source_hash = bytecode.get_source_hash(PROGRAM)
+    blocks = Interpreter.parse(PROGRAM)
+
+    loaded = bytecode.load(memoryview(bytecode.dump(blocks, source_hash)), source_hash)
+    assert get_lines(loaded) == get_lines(blocks)
+    assert {name: block.data for name, block in loaded.items()} == {name: block.data for name, block in blocks.items()}
+
+def test_program_is_cached(tmp_path):
+    path = tmp_path / "program.cft"
+    path.write_text(PROGRAM, encoding = "utf-8")
+    expected = Program(PROGRAM).run()
+
+    # the first load writes the cache, the second one reads it
+    first = Program.load(str(path)).run()
+    assert (tmp_path / "program.c42c").exists()
+    second = Program.load(str(path)).run()
+
+    assert (first.output, first.error) == (second.output, second.error) == (expected.output, expected.error)
+
+def test_cache_of_another_source_is_rejected():
+    data = bytecode.dump(Interpreter.parse(PROGRAM), bytecode.get_source_hash(PROGRAM))
+
+    with pytest.raises(bytecode.CorruptedFileError, match = "stale"):
+        bytecode.load(memoryview(data), bytecode.get_source_hash(PROGRAM + "\n"))
+
+@pytest.mark.parametrize("layout_key", [bytes(16), b"1.1o".ljust(16, b"\0")])
+def test_cache_of_another_tree_is_rejected(tmp_path, layout_key):
+    path = write_cache(tmp_path, layout_key)
+
+    with pytest.raises(bytecode.CorruptedFileError, match = "unsupported"):
+        bytecode.load(memoryview((tmp_path / "program.c42c").read_bytes()), bytecode.get_source_hash(PROGRAM))
+
+    # the program is parsed again and the file is rebuilt with the key of this tree
+    assert get_lines(Program.load(path).blocks) == get_lines(Interpreter.parse(PROGRAM))
+    assert bytecode.load(memoryview((tmp_path / "program.c42c").read_bytes()), bytecode.get_source_hash(PROGRAM))
+
+def test_damaged_cache_is_rejected():
+    data = bytearray(bytecode.dump(Interpreter.parse(PROGRAM), bytecode.get_source_hash(PROGRAM)))
+    data[-1] ^= 0xFF
+
+    with pytest.raises(bytecode.CorruptedFileError, match = "damaged"):
+        bytecode.load(memoryview(bytes(data)), bytecode.get_source_hash(PROGRAM))
@@ -0,0 +1,129 @@
+"""
+Snapshots of runs (.c42s): a suspended run is resumed from its snapshot, and files of another program or damaged ones are rejected.
+"""
+
+import pytest
+
+import checkpoint
+
+from cell import FloatCell, IntegerCell, StringCell
+from cfttypes import Checkpoints, ExecutionFrame, ExitReason
+from hooks import Hooks
+from program import Program
+
+
+# reads two lines, prints random characters and sleeps, so a snapshot has all its parts
+PROGRAM = """\
+#1 main
+41 -1 0
+41 -2 0
+41 -3 1
+41 -4 1
+41 -5 1
+41 -6 2
+04 -2 6
+04 -3 "loop"
+04 -5 "abcdefgh"
+04 -6 "0.01"
+03 -4
+02 -4
+35 -3
+03 -4
+02 -4
+#0
+#1 loop
+09 -1
+36 -4 -5
+02 -4
+34 -6
+17 -1 -2
+42
+#0
+"""
+INPUT = ["first", "second"]
+
+SOURCE_HASH = checkpoint.get_source_hash(PROGRAM)
+
+
+def make_cell(cell_class: type, value):
+    cell = cell_class()
+    cell.value = value
+    return cell
+
+def make_snapshot() -> checkpoint.Snapshot:
+
+    """
+    Returns a snapshot with every kind of value a cell can hold
+    """
+
+    cells = [
+        None,
+        make_cell(IntegerCell, -5),
+        make_cell(IntegerCell, 3 ** 100),
+        make_cell(FloatCell, 0.25),
+        make_cell(StringCell, "привет\n\udc80"),
+    ]
+    frames = [ExecutionFrame("main", False, 3), ExecutionFrame("loop", True, 1)]
+
+    return checkpoint.Snapshot(cells, frames, True, True, 120, 4, 1, (3, tuple(range(625)), 0.5))
+
+
+def test_snapshot_resumes_suspended_run(tmp_path):
+    path = str(tmp_path / "program.c42s")
+    program = Program(PROGRAM)
+    expected = program.run(INPUT, seed = 7).output
+
+    # the run is stopped after the third iteration of the loop
+    hooks = Hooks()
+    iterations = []
+    def on_block_enter(event) -> None:
+        iterations.append(event.block_name)
+        if iterations.count("loop") == 3:
+            program.interpreter.request_snapshot(is_suspending = True)
+    hooks.on_block_enter.append(on_block_enter)
+
+    suspended = program.run(INPUT, seed = 7, checkpoints = Checkpoints(path), hooks = hooks)
+    assert suspended.reason is ExitReason.SUSPENDED
+
+    snapshot = checkpoint.load_file(path, SOURCE_HASH)
+    assert checkpoint.dump(checkpoint.load(checkpoint.dump(snapshot, SOURCE_HASH), SOURCE_HASH), SOURCE_HASH) == checkpoint.dump(snapshot, SOURCE_HASH)
+
+    resumed = Program(PROGRAM).run(INPUT, snapshot = snapshot)
+    assert resumed.reason is ExitReason.FINISHED
+    assert suspended.output and resumed.output
+    assert suspended.output + resumed.output == expected
+
+def test_values_round_trip():
+    snapshot = make_snapshot()
+    loaded = checkpoint.load(checkpoint.dump(snapshot, SOURCE_HASH), SOURCE_HASH)
+
+    assert [type(cell) for cell in loaded.cells] == [type(cell) for cell in snapshot.cells]
+    assert [cell and cell.value for cell in loaded.cells] == [cell and cell.value for cell in snapshot.cells]
+    assert [(frame.block_name, frame.is_looping, frame.index) for frame in loaded.frames] == [("main", False, 3), ("loop", True, 1)]
+    assert (loaded.is_optimized, loaded.will_skip_next_line, loaded.executed, loaded.created_cells, loaded.lines_read) == (True, True, 120, 4, 1)
+    assert loaded.random_state == snapshot.random_state
+
+def test_snapshots_are_saved_every_interval(tmp_path):
+    path = tmp_path / "program.c42s"
+    Program(PROGRAM).run(INPUT, checkpoints = Checkpoints(str(path), interval = 5))
+
+    assert checkpoint.load_file(str(path), SOURCE_HASH).executed >= 5
+
+def test_snapshot_of_another_program_is_rejected(tmp_path):
+    path = str(tmp_path / "program.c42s")
+    Program(PROGRAM).run(INPUT, checkpoints = Checkpoints(path, interval = 5))
+
+    with pytest.raises(checkpoint.SnapshotError):
+        checkpoint.load_file(path, checkpoint.get_source_hash(PROGRAM + "\n"))
+
+@pytest.mark.parametrize("damage", [
+    pytest.param(lambda data: data[:20], id = "truncated header"),
+    pytest.param(lambda data: data[:-1], id = "truncated payload"),
+    pytest.param(lambda data: data[:-1] + bytes([data[-1] ^ 0xFF]), id = "damaged payload"),
+    pytest.param(lambda data: b"C42X" + data[4:], id = "magic"),
+])
+def test_damaged_snapshot_is_rejected(damage):
+    data = checkpoint.dump(make_snapshot(), SOURCE_HASH)
+
+    with pytest.raises(checkpoint.SnapshotError):
+        checkpoint.load(damage(data), SOURCE_HASH)
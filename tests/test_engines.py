@@ -0,0 +1,123 @@
+"""
+Differential tests of the engines: a program has to give the same output, exit reason and error
+with the optimizer turned off (-O0, the reference), with it (-O1), compiled, async, lazy and reachable-only.
+"""
+
+import random
+
+import pytest
+
+from cfttypes import EOFPolicy, Limits
+from interpreter import Interpreter
+from compiler import CompiledInterpreter
+from async_interpreter import AsyncInterpreter
+from output import CapturedOutput
+from program import Program
+
+
+# cells of the random programs by type, the main block creates them with these types
+INTEGERS, FLOATS, STRINGS = ("-1", "-2"), ("-3", "-4"), ("-5", "-6")
+CELLS = INTEGERS + FLOATS + STRINGS
+INPUT = ("5", "hello", "2.5", "-4")
+
+# commands which work with cells of one type: opcode -> types of the arguments
+TYPED: dict[str, list[tuple]] = {
+    "int":      [(op, INTEGERS, INTEGERS) for op in (5, 6, 7, 13, 14, 15, 16, 17, 18, 25, 26, 30, 31, 32, 37, 38, 39, 40)]
+                + [(op, INTEGERS) for op in (2, 9, 10, 22, 33)] + [(21, INTEGERS, STRINGS), (29, STRINGS, INTEGERS), (28, INTEGERS, STRINGS)],
+    "float":    [(op, FLOATS, FLOATS) for op in (5, 6, 7, 13, 14, 15, 16, 17, 18, 25, 26, 37, 38)]
+                + [(op, FLOATS) for op in (2, 9, 10, 22)],
+    "string":   [(op, STRINGS, STRINGS) for op in (5, 13, 14, 25, 26, 36)]
+                + [(op, STRINGS) for op in (2, 3, 19, 20, 22)] + [(27, STRINGS, INTEGERS)],
+}
+VALUES = {"int": ("0", "7", "-3", "12"), "float": ("2.5", "-0.5", "3"), "string": ("abc", "Hi\\n", "12", "x")}
+
+
+def make_line(generator: random.Random, calls: tuple[str, ...]) -> str:
+
+    """
+    Returns a random line of the cells -1..-6, a 23 calls one of the `calls` cells.
+    Most lines fit the types of their cells, the others end the program with an error
+    """
+
+    roll = generator.random()
+    if roll < 0.02:
+        return "42"
+    if roll < 0.03:
+        return "01"
+    if roll < 0.1 and calls:
+        return f"23 {generator.choice(calls)}"
+    if roll < 0.2:
+        return f"02 {generator.choice(CELLS)}"
+
+    # a line of any command with any cells: an error, a number where a name is expected, a cell which doesn't exist
+    if roll < 0.25:
+        name = lambda: generator.choice(CELLS + ("-20", "7"))
+        return generator.choice((
+            f"{generator.randint(1, 42):02} {name()} {name()}", f"{generator.choice((2, 9, 22)):02} {name()}",
+            f"41 {generator.choice(CELLS)} {generator.choice('0123')}", "99 -1", "05 -1",
+        ))
+
+    kind = generator.choice(tuple(TYPED))
+    if roll < 0.4:
+        return f"{generator.choice(('04', '24'))} {generator.choice(CELLS[:2] if kind == 'int' else FLOATS if kind == 'float' else STRINGS)} \"{generator.choice(VALUES[kind])}\""
+
+    opcode, *types = generator.choice(TYPED[kind])
+    return " ".join([f"{opcode:02}", *(generator.choice(cells) for cells in types)])
+
+def make_program(seed: int) -> str:
+
+    """
+    Returns a random program which always ends: the loops are counted by cells the other lines don't touch,
+    and the called blocks don't call back
+    """
+
+    generator = random.Random(seed)
+
+    def lines(count: int, calls: tuple[str, ...] = ()) -> list[str]:
+        return [make_line(generator, calls) for _ in range(count)]
+
+    main = [f"41 {name} 0" for name in INTEGERS] + [f"41 {name} 2" for name in FLOATS] + [f"41 {name} 1" for name in STRINGS]
+    main += ["41 -7 1", "41 -8 1", "41 -9 0", "41 -10 0", "41 -11 1"]
+    main += ['04 -7 "leaf"', '04 -8 "middle"', '04 -11 "loop"', f"04 -10 {generator.randint(1, 4)}"]
+    main += ['04 -1 "3"', '04 -2 "5"', '04 -3 "1.5"', '04 -5 "abc"', '04 -6 "Hi\\n"']
+    main += lines(8, ("-7", "-8")) + ["35 -11"] + lines(6, ("-7", "-8"))
+
+    loop = ["09 -9"] + lines(6, ("-7", "-8")) + ["17 -9 -10", "42"]
+
+    return "\n".join([
+        "#1 main", *main, "#0",
+        "#1 loop", *loop, "#0",
+        "#1 middle", *lines(5, ("-7",)), "#0",
+        "#1 leaf", *lines(4), "#0",
+    ]) + "\n"
+
+def run(program: Program) -> tuple:
+
+    """
+    Runs the program with the same input and seed, returns what it has printed and how it has ended.
+    Python errors of the commands (a division by zero) are a result too, all the engines have to raise them
+    """
+
+    output = CapturedOutput()
+    try:
+        result = program.run(INPUT, output, seed = 1, on_eof = EOFPolicy.EMPTY, limits = Limits(instructions = 20_000))
+    except Exception as error:
+        return output.getvalue(), "raised", type(error).__name__
+
+    error = (result.error.error_number, result.error.line_number) if result.error is not None else None
+    return output.getvalue(), result.reason, error
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_engines_agree(seed, tmp_path):
+    source = make_program(seed)
+    path = tmp_path / "program.cft"
+    path.write_text(source, encoding = "utf-8")
+
+    expected = run(Program(source, optimize = False))
+
+    assert run(Program(source)) == expected, "-O1"
+    assert run(Program(source, engine = CompiledInterpreter)) == expected, "compiled"
+    assert run(Program(source, engine = AsyncInterpreter)) == expected, "async"
+    assert run(Program.load(str(path), lazy = True)) == expected, "lazy"
+    assert run(Program.load(str(path), reachable_only = True)) == expected, "reachable only"
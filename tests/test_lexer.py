@@ -0,0 +1,105 @@
+"""
+The streaming lexer: one source gives the same blocks as text, bytes or a mapped file, lazy blocks are tokenized
+when they're first used, and blocks the program can't call are left out with `reachable_only`.
+"""
+
+import pytest
+
+import lexer
+
+from constants import INVALID_SYNTAX, UNDEFINED_COMMAND
+from program import Program
+
+
+# "unused" is never called and isn't even valid, "used" is defined twice and its last definition counts
+PROGRAM = """\
+$ a comment before the blocks
+#1 main
+41 -1 1
+04 -1 "used"   $ a comment after a line
+23 -1
+02 -1
+#0
+#1 used
+02 -2
+#0
+
+#1 unused
+77 -1
+41 -2
+#0
+#1 used
+02 -1
+#0
+"""
+
+
+def get_lines(blocks) -> dict:
+    return {name: [(line.opcode, line.args, line.line_number, line.text) for line in blocks[name].code] for name in blocks}
+
+def write_program(tmp_path) -> str:
+    path = tmp_path / "program.cft"
+    path.write_bytes(PROGRAM.encode("utf-8"))
+    return str(path)
+
+
+@pytest.mark.parametrize("line, tokens", [
+    ("41 -1 1", ["41", "-1", "1"]),
+    ('04 -1 "a  b"', ["04", "-1", "a  b"]),
+    ('04 -1 ""', ["04", "-1", '""']),
+    ('04 -1 a"b', ["04", "-1", 'a"b']),
+    ('04 -1 "open', ["04", "-1", '"open']),
+    ("\t23   -1 ", ["23", "-1"]),
+])
+def test_tokenize(line, tokens):
+    assert lexer.tokenize(line) == tokens
+
+def test_blocks_and_line_numbers():
+    blocks = lexer.parse(PROGRAM)
+
+    assert list(blocks) == ["main", "used", "unused"]
+    assert [(line.line_number, line.text) for line in blocks["main"].code][1] == (4, "04 -1 used")
+    assert [line.line_number for line in blocks["used"].code] == [17]
+    assert [line.opcode for line in blocks["unused"].code] == [UNDEFINED_COMMAND, INVALID_SYNTAX]
+
+def test_sources_give_the_same_blocks(tmp_path):
+    expected = get_lines(lexer.parse(PROGRAM))
+
+    assert get_lines(lexer.parse(PROGRAM.encode("utf-8"))) == expected
+    assert get_lines(lexer.parse(lexer.map_file(write_program(tmp_path)))) == expected
+
+    # other line breaks are the same as "\n", as in str.splitlines()
+    assert get_lines(lexer.parse(PROGRAM.replace("\n", "\r\n"))) == expected
+    assert get_lines(lexer.parse(PROGRAM.replace("\n", "\u2028").encode("utf-8"))) == expected
+
+def test_empty_file_is_mapped(tmp_path):
+    path = tmp_path / "empty.cft"
+    path.write_bytes(b"")
+
+    assert lexer.parse(lexer.map_file(str(path))) == {}
+
+def test_lazy_blocks_are_tokenized_when_used(tmp_path):
+    program = Program.load(write_program(tmp_path), lazy = True)
+    assert not any(program.blocks.is_loaded(name) for name in program.blocks)
+
+    result = program.run()
+
+    assert result.output == "usedused"
+    assert [name for name in program.blocks if program.blocks.is_loaded(name)] == ["main", "used"]
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_unreachable_blocks_are_left_out(tmp_path, lazy):
+    program = Program.load(write_program(tmp_path), lazy = lazy, reachable_only = True)
+
+    assert list(program.blocks) == ["main", "used"]
+    assert program.run().output == "usedused"
+
+def test_blocks_made_at_run_time_keep_every_block(tmp_path):
+    # the name of the called block is read from the input, so any block can be called
+    path = tmp_path / "program.cft"
+    path.write_text(PROGRAM.replace('04 -1 "used"', "03 -1"), encoding = "utf-8")
+
+    program = Program.load(str(path), reachable_only = True)
+
+    assert list(program.blocks) == ["main", "used", "unused"]
+    assert program.run(["used"]).output == "usedused"
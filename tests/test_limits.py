@@ -0,0 +1,131 @@
+"""
+Resource limits of a run: every limit stops the program with its CFTE error on every engine.
+"""
+
+import time
+
+import pytest
+
+from cfttypes import ExitReason, Limits
+from interpreter import Interpreter
+from compiler import CompiledInterpreter
+from async_interpreter import AsyncInterpreter
+from program import Program
+
+
+ENGINES = [
+    pytest.param(Interpreter, False, id = "-O0"),
+    pytest.param(Interpreter, True, id = "-O1"),
+    pytest.param(CompiledInterpreter, False, id = "compiled"),
+    pytest.param(AsyncInterpreter, True, id = "async"),
+]
+
+FOREVER = """\
+#1 main
+41 -1 1
+41 -2 0
+04 -1 "loop"
+35 -1
+#0
+#1 loop
+09 -2
+#0
+"""
+
+SLEEP = """\
+#1 main
+41 -1 2
+04 -1 30
+34 -1
+#0
+"""
+
+# the string doubles in every iteration
+DOUBLING = """\
+#1 main
+41 -1 1
+41 -2 1
+04 -1 "ab"
+04 -2 "loop"
+35 -2
+#0
+#1 loop
+05 -1 -1
+#0
+"""
+
+CELLS = """\
+#1 main
+41 -1 0
+41 -2 0
+41 -1 0
+41 -3 0
+#0
+"""
+
+# every call waits for the next one, the line after the call is never reached
+RECURSION = """\
+#1 main
+41 -1 1
+41 -2 0
+04 -1 "again"
+23 -1
+#0
+#1 again
+23 -1
+09 -2
+#0
+"""
+
+# 13 is false, so the 09 after it is skipped: 5 lines are executed, not 6
+SKIPPED_LINE = """\
+#1 main
+41 -1 0
+41 -2 0
+04 -2 1
+13 -1 -2
+09 -1
+02 -1
+#0
+"""
+
+
+def run(source: str, engine: type[Interpreter], optimize: bool, limits: Limits):
+    return Program(source, engine = engine, optimize = optimize).run(limits = limits)
+
+
+@pytest.mark.parametrize("engine, optimize", ENGINES)
+@pytest.mark.parametrize("source, limits, error_number", [
+    pytest.param(FOREVER, Limits(instructions = 10_000), "CFTE14", id = "instructions"),
+    pytest.param(FOREVER, Limits(seconds = 0.1, check_interval = 100), "CFTE15", id = "seconds"),
+    pytest.param(DOUBLING, Limits(string_length = 1000), "CFTE16", id = "string length"),
+    pytest.param(CELLS, Limits(cells = 2), "CFTE17", id = "cells"),
+    pytest.param(RECURSION, Limits(depth = 50), "CFTE18", id = "depth"),
+])
+def test_limit_stops_the_program(engine, optimize, source, limits, error_number):
+    result = run(source, engine, optimize, limits)
+
+    assert result.reason is ExitReason.LIMIT
+    assert result.error.error_number == error_number
+
+@pytest.mark.parametrize("engine, optimize", ENGINES)
+def test_sleep_is_cut_by_the_time_limit(engine, optimize):
+    start = time.perf_counter()
+    result = run(SLEEP, engine, optimize, Limits(seconds = 0.2))
+
+    assert result.error.error_number == "CFTE15"
+    assert time.perf_counter() - start < 5
+
+@pytest.mark.parametrize("engine, optimize", ENGINES)
+def test_program_under_the_limits_finishes(engine, optimize):
+    result = run(CELLS, engine, optimize, Limits(instructions = 4, cells = 3, depth = 1, string_length = 0))
+
+    assert result.reason is ExitReason.FINISHED
+
+@pytest.mark.parametrize("engine", [Interpreter, CompiledInterpreter, AsyncInterpreter])
+@pytest.mark.parametrize("optimize", [False, True])
+def test_skipped_lines_are_not_counted(engine, optimize):
+    program = Program(SKIPPED_LINE, engine = engine, optimize = optimize)
+
+    assert program.run(limits = Limits(instructions = 5)).reason is ExitReason.FINISHED
+    assert program.run(limits = Limits(instructions = 4)).error.error_number == "CFTE14"
@@ -0,0 +1,27 @@
+"""
+The entry point: `run FILENAME` and main.py without arguments run without importing click.
+"""
+
+import os, subprocess, sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs main.py as a script, then prints whether the run has imported click
+COMMAND = "import sys, runpy; sys.path.insert(0, 'src'); sys.argv = ['src/main.py', *sys.argv[1:]]; runpy.run_path('src/main.py', run_name = '__main__'); print('click' in sys.modules)"
+
+
+def run_main(*args: str) -> str:
+    process = subprocess.run([sys.executable, "-c", COMMAND, *args], cwd = ROOT, input = "", capture_output = True, text = True, timeout = 60)
+    return process.stdout
+
+
+def test_without_arguments_runs_the_default_example():
+    from constants import DEFAULT_PROGRAM
+
+    output = run_main()
+
+    # the example waits for input, so it ends with CFTE13 at its first 03 command
+    assert "CFTE13" in output and "Usage" not in output
+    assert output.rstrip().endswith("False")
+    assert run_main("run", DEFAULT_PROGRAM) == output
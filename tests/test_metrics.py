@@ -0,0 +1,103 @@
+"""
+Runtime metrics: every engine counts the same, the counters of many runs add up, and the exports of `--stats` and `--prometheus`.
+"""
+
+import json
+
+import pytest
+
+from interpreter import Interpreter
+from compiler import CompiledInterpreter
+from async_interpreter import AsyncInterpreter
+from metrics import Metrics, summary, to_prometheus, write_textfile
+from program import Program
+
+
+ENGINES = [
+    pytest.param(Interpreter, False, id = "-O0"),
+    pytest.param(Interpreter, True, id = "-O1"),
+    pytest.param(CompiledInterpreter, False, id = "compiled"),
+    pytest.param(AsyncInterpreter, True, id = "async"),
+]
+
+# 8 lines of the main block and 3 iterations of the loop, the 42 ends the third one: 15 lines
+LOOP = """\
+#1 main
+41 -1 0
+41 -2 1
+41 -3 0
+41 -4 1
+04 -2 "loop"
+04 -3 3
+04 -4 "ab"
+35 -2
+#0
+#1 loop
+09 -1
+17 -1 -3
+42
+#0
+"""
+
+# 13 is false, so the 09 after it is skipped: 5 lines are executed, not 6
+SKIPPED_LINE = """\
+#1 main
+41 -1 0
+41 -2 0
+04 -2 1
+13 -1 -2
+09 -1
+02 -1
+#0
+"""
+
+
+@pytest.mark.parametrize("engine, optimize", ENGINES)
+def test_engines_count_the_same(engine, optimize):
+    metrics = Metrics()
+    Program(LOOP, engine = engine, optimize = optimize).run(metrics = metrics)
+
+    assert (metrics.runs, metrics.instructions, metrics.blocks, metrics.loop_iterations) == (1, 15, 2, 3)
+    assert (metrics.peak_depth, metrics.peak_string_length) == (1, len("loop" + "ab"))
+    assert metrics.cells == {"int": 2, "float": 0, "string": 2}
+
+@pytest.mark.parametrize("engine, optimize", ENGINES)
+def test_skipped_lines_are_not_counted(engine, optimize):
+    # the metrics give the same count as the limit (see test_limits.py) and say so
+    metrics = Metrics()
+    Program(SKIPPED_LINE, engine = engine, optimize = optimize).run(metrics = metrics)
+    exported = to_prometheus(metrics).splitlines()
+
+    assert metrics.instructions == 5
+    assert "c42_instructions_total 5" in exported
+    assert "# HELP c42_instructions_total Lines executed, without the lines skipped by conditions." in exported
+
+def test_runs_add_up():
+    metrics = Metrics()
+    program = Program(LOOP)
+
+    program.run(metrics = metrics)
+    program.run(metrics = metrics)
+
+    assert (metrics.runs, metrics.instructions, metrics.loop_iterations) == (2, 30, 6)
+    assert metrics.cells == {"int": 2, "float": 0, "string": 2}
+
+def test_summary():
+    metrics = Metrics()
+    Program(LOOP).run(metrics = metrics)
+
+    values = json.loads(json.dumps(summary(metrics, reason = "FINISHED")))
+    assert list(values)[:3] == ["reason", "runs", "seconds"]
+    assert (values["reason"], values["instructions"], values["cells"]) == ("FINISHED", 15, {"int": 2, "float": 0, "string": 2})
+
+def test_prometheus_labels(tmp_path):
+    metrics = Metrics(runs = 3, input_seconds = 0.5)
+    path = tmp_path / "c42.prom"
+
+    write_textfile(str(path), metrics, {"worker": 'a "b"\\'})
+    exported = path.read_text(encoding = "utf-8").splitlines()
+
+    assert 'c42_runs_total{worker="a \\"b\\"\\\\"} 3' in exported
+    assert 'c42_blocked_seconds_total{worker="a \\"b\\"\\\\",command="03"} 0.5' in exported
+    assert "# TYPE c42_stack_depth_peak gauge" in exported
+    assert to_prometheus(metrics).splitlines()[2] == "c42_runs_total 3"
@@ -0,0 +1,68 @@
+"""
+Output sinks of 02 and 12, and the `\\n` sequences of 04 and 24 which are decoded once in the constant pool.
+"""
+
+import io, subprocess, sys
+
+from interpreter import Interpreter
+from output import CLEAR_SCREEN, BlockBufferedOutput, CapturedOutput, LineBufferedOutput
+from program import Program
+from transpiler import Transpiler
+
+
+# the length of the value counts the new line as one character, the input is printed as it is
+ESCAPES = """\
+#1 main
+41 -1 1
+41 -2 0
+41 -3 1
+04 -1 "a\\nb"
+24 -1 "\\n"
+21 -2 -1
+02 -1
+02 -2
+03 -3
+02 -3
+12
+#0
+"""
+INPUT = ["x\\ny"]
+EXPECTED = "a\nb\n4x\\ny" + CLEAR_SCREEN
+
+
+def test_constants_are_decoded_once():
+    program = Program(ESCAPES)
+    output = CapturedOutput()
+
+    program.run(INPUT, output)
+    assert output.getvalue() == EXPECTED
+    assert program.interpreter.constants["a\\nb"] == (None, None, "a\nb")
+
+def test_built_module_prints_the_same(tmp_path):
+    path = tmp_path / "program.py"
+    path.write_text(Transpiler(Interpreter.parse(ESCAPES)).transpile(), encoding = "utf-8")
+
+    process = subprocess.run([sys.executable, str(path)], input = "\n".join(INPUT) + "\n", capture_output = True, text = True, timeout = 60)
+    assert process.stdout.startswith(EXPECTED)
+
+def test_block_buffered_output():
+    stream = io.StringIO()
+    output = BlockBufferedOutput(stream, buffer_size = 8)
+
+    output.write("abc\n")
+    assert stream.getvalue() == ""
+    output.write("defgh")
+    assert stream.getvalue() == "abc\ndefgh"
+
+    output.write("i")
+    output.flush()
+    assert stream.getvalue() == "abc\ndefghi"
+
+def test_line_buffered_output():
+    stream = io.StringIO()
+    output = LineBufferedOutput(stream)
+
+    output.write("abc")
+    assert stream.getvalue() == ""
+    output.write("d\n")
+    assert stream.getvalue() == "abcd\n"
@@ -0,0 +1,94 @@
+"""
+The profiler: hits and time of every line, command and block, and the stacks of blocks the time is charged to.
+"""
+
+from profiler import ProfiledInterpreter
+from program import Program
+
+
+# the loop is started by the last line of main, it calls the body in its first two iterations
+LAST_LINE_LOOP = """\
+#1 main
+41 -1 0
+41 -2 0
+41 -3 1
+41 -4 1
+04 -2 3
+04 -3 "loop"
+04 -4 "body"
+35 -3
+#0
+#1 loop
+09 -1
+16 -1 -2
+23 -4
+42
+#0
+#1 body
+41 -5 0
+09 -5
+#0
+"""
+
+# the block calls itself as its last line until the counter reaches 50
+TAIL_RECURSION = """\
+#1 main
+41 -1 0
+41 -2 0
+41 -3 1
+04 -2 50
+04 -3 "count"
+23 -3
+#0
+#1 count
+09 -1
+14 -1 -2
+23 -3
+#0
+"""
+
+
+def test_hits_of_lines_and_commands():
+    program = Program(LAST_LINE_LOOP, engine = ProfiledInterpreter)
+    program.run()
+    profile = program.interpreter.profile
+
+    # the loop runs 3 times, the body is called in the first two iterations, the 42 ends the last one
+    assert {number: hits for number, (hits, _, _) in profile.lines.items()} == {
+        2: 1, 3: 1, 4: 1, 5: 1, 6: 1, 7: 1, 8: 1, 9: 1, 12: 3, 13: 3, 14: 2, 15: 1, 18: 2, 19: 2,
+    }
+    assert profile.lines[14][2] == "23 -4"
+    assert profile.opcodes[9][0] == 5 and profile.opcodes[41][0] == 6
+
+def test_reports():
+    program = Program(LAST_LINE_LOOP, engine = ProfiledInterpreter)
+    program.run()
+    profile = program.interpreter.profile
+
+    report = profile.report()
+    assert "Blocks:" in report and "Lines:" in report and "Commands:" in report
+    assert "23 CALL_BLOCK" in report
+
+    collapsed = profile.collapsed().splitlines()
+    assert [line.rsplit(" ", 1)[0] for line in collapsed] == ["main", "main;loop", "main;loop;body"]
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed)
+
+def test_last_line_call_is_charged_to_the_caller():
+    program = Program(LAST_LINE_LOOP, engine = ProfiledInterpreter)
+    program.run()
+    profile = program.interpreter.profile
+
+    assert set(profile.stacks) == {"main", "main;loop", "main;loop;body"}
+    assert profile.blocks == {"main": 1, "loop": 3, "body": 2}
+
+    times = profile.get_block_times()
+    assert times["main"][0] == sum(profile.stacks.values())
+    assert times["main"][0] >= times["loop"][0] >= times["body"][0]
+
+def test_tail_recursion_doesnt_grow_the_stack():
+    program = Program(TAIL_RECURSION, engine = ProfiledInterpreter)
+    program.run()
+    profile = program.interpreter.profile
+
+    assert set(profile.stacks) == {"main", "main;count"}
+    assert profile.blocks["count"] == 50
@@ -0,0 +1,105 @@
+"""
+Record and replay of runs (.c42r): a replay prints what the recorded run printed without its input, seed or sleeps,
+and traces of another program or damaged ones are rejected.
+"""
+
+import time
+
+import pytest
+
+import bytecode, replay
+
+from cfttypes import ExitReason, Limits
+from interpreter import Interpreter
+from compiler import CompiledInterpreter
+from async_interpreter import AsyncInterpreter
+from program import Program
+
+
+# reads two lines, prints random characters and sleeps, so a trace has all its parts
+PROGRAM = """\
+#1 main
+41 -1 0
+41 -2 0
+41 -3 1
+41 -4 1
+41 -5 1
+41 -6 2
+04 -2 6
+04 -3 "loop"
+04 -5 "abcdefgh"
+04 -6 "0.01"
+03 -4
+02 -4
+35 -3
+03 -4
+02 -4
+#0
+#1 loop
+09 -1
+36 -4 -5
+02 -4
+34 -6
+17 -1 -2
+42
+#0
+"""
+INPUT = ["first", "second"]
+
+
+def test_trace_replays_the_run(tmp_path):
+    path = str(tmp_path / "program.c42r")
+    source_hash = bytecode.get_source_hash(PROGRAM)
+
+    trace = replay.Trace()
+    recorded = Program(PROGRAM).run(INPUT, recording = trace)
+    replay.save(path, trace, source_hash)
+
+    loaded = replay.load_file(path, source_hash)
+    assert loaded == trace
+
+    # the replay has no input and another seed, everything comes from the trace
+    replayed = Program(PROGRAM).run(seed = 1, replaying = loaded)
+    assert (replayed.output, replayed.reason) == (recorded.output, recorded.reason)
+
+def test_replay_doesnt_sleep():
+    program = PROGRAM.replace('04 -6 "0.01"', '04 -6 "30"')
+
+    # the sleep is cut by the time limit when it's recorded, the replay stops at the same line without waiting
+    trace = replay.Trace()
+    recorded = Program(program).run(INPUT, limits = Limits(seconds = 0.2), recording = trace)
+    assert recorded.error.error_number == "CFTE15"
+
+    start = time.perf_counter()
+    source_hash = bytecode.get_source_hash(program)
+    replayed = Program(program).run(limits = Limits(seconds = 0.2), replaying = replay.load(replay.dump(trace, source_hash), source_hash))
+    assert time.perf_counter() - start < 0.2
+    assert (replayed.output, replayed.error) == (recorded.output, recorded.error)
+
+@pytest.mark.parametrize("engine", [Interpreter, CompiledInterpreter, AsyncInterpreter])
+def test_end_of_input_is_replayed(engine):
+    trace = replay.Trace()
+    recorded = Program(PROGRAM, engine = engine).run(INPUT[:1], recording = trace)
+    assert recorded.error.error_number == "CFTE13"
+    assert trace.lines == ["first", None]
+
+    replayed = Program(PROGRAM, engine = engine).run(["other", "lines"], replaying = trace)
+    assert (replayed.output, replayed.reason, replayed.error.error_number) == (recorded.output, ExitReason.ERROR, "CFTE13")
+
+def test_trace_of_another_program_is_rejected():
+    data = replay.dump(replay.Trace(["first"], [0.5], (3, tuple(range(625)), None)), bytecode.get_source_hash(PROGRAM))
+
+    with pytest.raises(replay.TraceError, match = "another program"):
+        replay.load(data, bytecode.get_source_hash(PROGRAM + "\n"))
+
+@pytest.mark.parametrize("damage", [
+    pytest.param(lambda data: data[:20], id = "truncated header"),
+    pytest.param(lambda data: data[:-1], id = "truncated payload"),
+    pytest.param(lambda data: b"C42X" + data[4:], id = "magic"),
+])
+def test_damaged_trace_is_rejected(damage):
+    source_hash = bytecode.get_source_hash(PROGRAM)
+    data = replay.dump(replay.Trace(["first", None], [0.5], (3, tuple(range(625)), None)), source_hash)
+
+    with pytest.raises(replay.TraceError):
+        replay.load(damage(data), source_hash)
@@ -0,0 +1,90 @@
+"""
+Limits of the server requests: a request can lower the limits of the server, but not raise them or turn them off.
+The cache of the server: a program is parsed and prepared once, its runs only make fresh cells.
+"""
+
+import asyncio
+
+import pytest
+
+import optimizer, verifier
+
+from cfttypes import ExitReason, Limits
+from server import ProgramCache, merge_limits
+
+
+COUNTER = """\
+#1 main
+41 -1 0
+41 -2 1
+04 -2 "count"
+23 -2
+02 -1
+#0
+#1 count
+09 -1
+09 -1
+#0
+"""
+
+
+@pytest.mark.parametrize("request_limits", [
+    {"instructions": -1},
+    {"seconds": -0.5},
+    {"seconds": float("nan")},
+    {"depth": True},
+    {"cells": "10"},
+    {"string_length": [1]},
+    {"check_interval": None},
+    {"check_interval": -4096},
+])
+def test_bad_limits_are_rejected(request_limits):
+    with pytest.raises(ValueError):
+        merge_limits(Limits(instructions = 1000), request_limits)
+
+def test_unknown_limit_is_rejected():
+    with pytest.raises(TypeError):
+        merge_limits(None, {"memory": 10})
+
+def test_limits_are_capped_by_the_server():
+    server = Limits(instructions = 1000, seconds = 2)
+
+    limits = merge_limits(server, {"instructions": 10_000, "seconds": 1, "cells": 5})
+    assert (limits.instructions, limits.seconds, limits.cells, limits.depth) == (1000, 1, 5, None)
+
+    # a limit left out of the request is the limit of the server
+    assert merge_limits(server, {}).instructions == 1000
+
+def test_limits_without_request():
+    server = Limits(instructions = 1000)
+
+    assert merge_limits(server, None) is server
+    assert merge_limits(None, None) is None
+    assert merge_limits(None, {"depth": 50}) == Limits(depth = 50)
+
+def test_cached_program_is_prepared_once(monkeypatch):
+    cache = ProgramCache(size = 2)
+    program, is_cached = cache.get(COUNTER)
+    assert not is_cached and program.prepared is not None
+
+    # a hit and its runs don't check or optimize the code again
+    monkeypatch.setattr(verifier, "infer_types", lambda *args: pytest.fail("checked again"))
+    monkeypatch.setattr(optimizer, "optimize", lambda *args: pytest.fail("optimized again"))
+
+    hit, is_cached = cache.get(COUNTER)
+    assert is_cached and hit is program
+
+    async def run_all():
+        return await asyncio.gather(*(hit.run_async(seed = 1) for _ in range(3)))
+
+    # every run has its own cells, so they all count from 0
+    for result in asyncio.run(run_all()):
+        assert (result.reason, result.output) == (ExitReason.FINISHED, "2")
+
+def test_cache_drops_the_least_recently_used():
+    cache = ProgramCache(size = 1)
+    cache.get(COUNTER)
+    cache.get(COUNTER + "\n")
+
+    assert cache.get(COUNTER)[1] is False
+
@@ -0,0 +1,112 @@
+"""
+Built modules: they are run as scripts, the way `build` leaves them, and print what the interpreter prints.
+"""
+
+import subprocess, sys
+
+import pytest
+
+from cfttypes import ExitReason
+from interpreter import Interpreter
+from compiler import CompiledInterpreter
+from async_interpreter import AsyncInterpreter
+from program import Program
+from transpiler import Transpiler
+
+
+# the block calls itself as its last line, 200000 times: deeper than the python stack of the module
+TAIL_RECURSION = """\
+#1 main
+41 -1 0
+41 -2 0
+41 -3 1
+04 -2 200000
+04 -3 "count"
+23 -3
+02 -1
+#0
+#1 count
+09 -1
+14 -1 -2
+23 -3
+#0
+"""
+
+# the same recursion with a line after the call, every call waits for the next one
+DEEP_RECURSION = TAIL_RECURSION.replace("14 -1 -2\n23 -3\n", "14 -1 -2\n23 -3\n09 -2\n")
+
+# the loop calls a block in its first iteration and starts a loop in the second one: every call ends the iteration,
+# the loop starts again at once and the called blocks run after it has ended, the last called first
+CALLS_IN_LOOP = """\
+#1 main
+41 -1 0
+41 -2 1
+41 -3 1
+41 -4 0
+41 -5 1
+41 -6 0
+41 -7 0
+04 -2 "loop"
+04 -3 "called"
+04 -4 3
+04 -5 "inner"
+04 -6 2
+35 -2
+#0
+#1 loop
+09 -1
+02 -1
+17 -1 -4
+42
+14 -1 -6
+23 -3
+35 -5
+02 -3
+#0
+#1 called
+02 -3
+#0
+#1 inner
+09 -7
+02 -7
+42
+#0
+"""
+CALLS_IN_LOOP_OUTPUT = "1231called"
+
+
+def run_built(source: str, tmp_path) -> str:
+
+    """
+    Builds the program into a module, runs it and returns what it has printed, a python traceback too
+    """
+
+    path = tmp_path / "program.py"
+    path.write_text(Transpiler(Interpreter.parse(source), "program.cft").transpile(), encoding = "utf-8")
+
+    process = subprocess.run([sys.executable, str(path)], capture_output = True, text = True, timeout = 120)
+    return process.stdout + process.stderr
+
+
+def test_tail_calls_dont_grow_the_stack(tmp_path):
+    output = run_built(TAIL_RECURSION, tmp_path)
+
+    assert "Traceback" not in output and "CFTE" not in output
+    assert output.startswith("200000")
+
+def test_deep_recursion_is_reported(tmp_path):
+    output = run_built(DEEP_RECURSION, tmp_path)
+
+    assert "Traceback" not in output
+    assert "CFTE18" in output
+
+@pytest.mark.parametrize("engine", [Interpreter, CompiledInterpreter, AsyncInterpreter])
+@pytest.mark.parametrize("optimize", [False, True])
+def test_calls_in_loop_run_after_it(engine, optimize):
+    result = Program(CALLS_IN_LOOP, engine = engine, optimize = optimize).run()
+
+    assert result.reason is ExitReason.FINISHED
+    assert result.output == CALLS_IN_LOOP_OUTPUT
+
+def test_built_calls_in_loop_run_after_it(tmp_path):
+    assert run_built(CALLS_IN_LOOP, tmp_path).startswith(CALLS_IN_LOOP_OUTPUT + "\n[Program Finished]")